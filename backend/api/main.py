@@ -2,6 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.database import create_tables
 from app.services.background_manager import initialize_background_services, start_background_services, shutdown_background_services
+import asyncio
 import logging
 import os
 from datetime import datetime
@@ -41,16 +42,38 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Cache", "X-Profile-Id"],
 )
 
+# Opt-in statement tracing, slow-log and request profiling; nothing is installed when off
+from app.services.request_profiler import request_profiler, ProfilingMiddleware
+if request_profiler.enabled:
+    from app.async_database import async_engine, async_replica_engine
+    request_profiler.instrument(async_engine.sync_engine)
+    if async_replica_engine is not None:
+        request_profiler.instrument(async_replica_engine.sync_engine)
+    app.add_middleware(ProfilingMiddleware)
+
+# Opt-in span tracing of API requests and the ingestion path
+from app.services.tracing import tracer, TracingMiddleware
+if tracer.enabled:
+    from app.database import engine
+    from app.async_database import async_engine, async_replica_engine
+    for traced_engine in [engine, async_engine, async_replica_engine]:
+        if traced_engine is not None:
+            tracer.instrument(getattr(traced_engine, 'sync_engine', traced_engine))
+    app.add_middleware(TracingMiddleware)
+
 # Import routers
-from api.routers import now, zone, forecast, alerts
+from api.routers import now, zone, forecast, alerts, live, dashboard
 
 # Include routers
 app.include_router(now.router, prefix="/api", tags=["current"])
 app.include_router(zone.router, prefix="/api/zone", tags=["zones"])
 app.include_router(forecast.router, prefix="/api/forecast", tags=["forecasting"])
 app.include_router(alerts.router, prefix="/api/alerts", tags=["alerts"])
+app.include_router(live.router, prefix="/api", tags=["live"])
+app.include_router(dashboard.router, prefix="/api", tags=["dashboard"])
 
 @app.on_event("startup")
 async def startup_event():
@@ -61,13 +84,32 @@ async def startup_event():
         create_tables()
         logger.info("Database tables created successfully")
         
-        # Initialize background services (but don't start them yet)
-        initialize_background_services()
-        logger.info("Background services configured successfully")
+        # Register compression policies on the time-series hypertables
+        try:
+            from app.services.data_lifecycle import data_lifecycle
+            data_lifecycle.apply_policies()
+        except Exception as e:
+            logger.warning(f"Data lifecycle policies not applied: {e}")
         
-        # Start background services after database is ready
-        start_background_services()
-        logger.info("Background services started successfully")
+        # Under the prefork server only one worker runs the collectors
+        if os.getenv("BACKGROUND_SERVICES_ENABLED", "true").lower() == "true":
+            # Initialize background services (but don't start them yet)
+            initialize_background_services()
+            logger.info("Background services configured successfully")
+            
+            # Start background services after database is ready
+            start_background_services()
+            logger.info("Background services started successfully")
+        else:
+            logger.info("Background services disabled in this process")
+        
+        # Every worker listens for live events, whichever worker's collectors published them
+        from app.services.live_updates import live_updates
+        live_updates.start_relay()
+        
+        # Load the deferred ML modules and emotion model without holding up serving
+        from app.services.warm_up import warm_up
+        warm_up.start()
         
         logger.info("API startup completed successfully")
     except Exception as e:
@@ -80,6 +122,15 @@ async def shutdown_event():
     logger.info("Shutting down City Pulse API...")
     try:
         shutdown_background_services()
+        
+        # Export spans still waiting for the next batch
+        tracer.flush()
+        
+        # Close the pooled async database connections
+        from app.async_database import async_engine, async_replica_engine
+        await async_engine.dispose()
+        if async_replica_engine is not None:
+            await async_replica_engine.dispose()
         logger.info("API shutdown completed successfully")
     except Exception as e:
         logger.error(f"Shutdown error: {e}")
@@ -97,6 +148,7 @@ async def root():
 async def health_check():
     """Health check endpoint"""
     from app.services.background_manager import background_manager
+    from app.services.warm_up import warm_up
     from app.database import engine
     from sqlalchemy import text
     
@@ -112,6 +164,7 @@ async def health_check():
             "status": "healthy" if bg_health["healthy"] else "degraded",
             "database": "healthy",
             "background_services": bg_health,
+            "warm_up": warm_up.get_status(),
             "timestamp": bg_health["timestamp"]
         }
     except Exception as e:
@@ -121,6 +174,67 @@ async def health_check():
             "timestamp": datetime.now(pytz.UTC).isoformat()
         }
 
+@app.get("/metrics/cache")
+async def cache_metrics():
+    """Response cache hit ratios for this worker"""
+    from app.services.response_cache import response_cache
+    
+    return response_cache.get_stats()
+
+@app.get("/metrics/database")
+async def database_metrics():
+    """Read routing (replica lag, fallbacks) and connection pool usage per target for this worker"""
+    from app.async_database import get_database_stats
+    
+    return get_database_stats()
+
+@app.get("/metrics/forecast")
+async def forecast_metrics():
+    """Model version, last closed hour and precompute counts for the forecast cache"""
+    from app.services.forecast_cache import forecast_cache
+    
+    # get_stats reads the ingestion watermark with the sync Redis client
+    return await asyncio.to_thread(forecast_cache.get_stats)
+
+@app.get("/metrics/alerts")
+async def alert_metrics():
+    """Streaming detector and Isolation Forest scoring counts for this process"""
+    from app.services.alert_stream import alert_stream
+    from app.services.anomaly_scoring import anomaly_scorer
+    
+    return {**alert_stream.get_stats(), 'scoring': anomaly_scorer.get_stats()}
+
+@app.get("/metrics/live")
+async def live_metrics():
+    """Live stream subscribers, sequence and dropped-client counts for this worker"""
+    from app.services.live_updates import live_updates
+    
+    return live_updates.get_stats()
+
+@app.get("/metrics/admission")
+async def admission_metrics():
+    """Admitted, queued and rejected requests per cost class and route for this worker"""
+    from app.services.admission_control import admission_control
+
+    return admission_control.get_stats()
+
+@app.get("/metrics/profiling")
+async def profiling_metrics():
+    """Traced, profiled and slow request counts for this worker"""
+    return request_profiler.get_stats()
+
+@app.get("/metrics/memory")
+async def memory_metrics():
+    """RSS, PSS and unique memory of this process, and of every prefork worker when run under api.prefork"""
+    from api.prefork import memory_report
+    
+    return memory_report()
+
+@app.get("/metrics/tracing")
+async def tracing_metrics():
+    """Exported, queued and dropped span counts for this process"""
+    return tracer.get_stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
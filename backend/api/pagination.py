@@ -0,0 +1,94 @@
+"""
+Keyset pagination for City Pulse application
+Pages are keyed on (created_at, id) so each page is one index range scan
+no matter how deep the client has scrolled
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+# Cursor directions: 'older' continues down the feed, 'newer' polls above it
+OLDER = 'older'
+NEWER = 'newer'
+
+class Cursor(NamedTuple):
+    """Position in a feed ordered by (created_at DESC, id DESC)"""
+    created_at: datetime
+    id: int
+    direction: str
+
+def encode_cursor(created_at: datetime, row_id: int, direction: str) -> str:
+    """Opaque, URL-safe token for a feed position"""
+    payload = json.dumps({'t': created_at.isoformat(), 'i': row_id, 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token: Optional[str]) -> Optional[Cursor]:
+    """Parse a token from ``encode_cursor``; raises a 400 if it is malformed"""
+    if not token:
+        return None
+    
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        cursor = Cursor(datetime.fromisoformat(payload['t']), int(payload['i']), payload['d'])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    
+    if cursor.direction not in (OLDER, NEWER):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return cursor
+
+def keyset_page(query, created_at_column, id_column, cursor: Optional[Cursor], since: Optional[datetime], limit: int):
+    """Restrict ``query`` to one page after ``cursor``, fetching one extra row to detect more"""
+    if since is not None:
+        query = query.filter(created_at_column > since)
+    
+    if cursor is not None and cursor.direction == NEWER:
+        # Walk up from the cursor in index order; rows are flipped back afterwards
+        return query.filter(
+            tuple_(created_at_column, id_column) > tuple_(cursor.created_at, cursor.id)
+        ).order_by(created_at_column.asc(), id_column.asc()).limit(limit + 1)
+    
+    if cursor is not None:
+        query = query.filter(
+            tuple_(created_at_column, id_column) < tuple_(cursor.created_at, cursor.id)
+        )
+    return query.order_by(created_at_column.desc(), id_column.desc()).limit(limit + 1)
+
+def page_links(
+    rows: List[Any],
+    limit: int,
+    cursor: Optional[Cursor],
+    key: Callable[[Any], Tuple[datetime, int]]
+) -> Tuple[List[Any], Dict[str, Any]]:
+    """Trim the extra row from a ``keyset_page`` result and build the cursors for it.
+    
+    Returns the rows newest first plus ``next_cursor`` (older rows, None at
+    the end of the feed), ``prev_cursor`` (rows newer than this page, always
+    set so clients can poll for new posts) and ``has_more``.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    polling = cursor is not None and cursor.direction == NEWER
+    if polling:
+        rows.reverse()
+    
+    if rows:
+        newest, oldest = key(rows[0]), key(rows[-1])
+        prev_cursor = encode_cursor(*newest, NEWER)
+        # A 'newer' page always has older rows below it: the cursor row itself
+        next_cursor = encode_cursor(*oldest, OLDER) if has_more or polling else None
+    else:
+        # Nothing new yet: hand the same position back for the next poll
+        prev_cursor = encode_cursor(cursor.created_at, cursor.id, NEWER) if polling else None
+        next_cursor = encode_cursor(cursor.created_at, cursor.id, OLDER) if polling else None
+    
+    return rows, {
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+        'has_more': has_more
+    }
@@ -0,0 +1,85 @@
+"""
+Post feed queries for City Pulse application
+Each page is one column-projected query: the keyset page is cut from
+emotion_analysis and joined to its posts, returning plain rows that are
+serialized directly
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, asc, desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import EmotionAnalysis, SocialPost
+from api.pagination import NEWER, Cursor, keyset_page, page_links
+
+EMOTIONS = ['joy', 'sadness', 'anger', 'fear', 'surprise', 'disgust', 'neutral']
+
+async def load_post_page(
+    db: AsyncSession,
+    cursor: Optional[Cursor],
+    since: Optional[datetime],
+    limit: int,
+    zone_id: Optional[int] = None
+) -> Tuple[List[Any], Dict[str, Any]]:
+    """Fetch one page of posts with their emotion analysis in a single round trip"""
+    page_query = select(
+        EmotionAnalysis.post_id,
+        EmotionAnalysis.zone_id,
+        EmotionAnalysis.created_at,
+        EmotionAnalysis.mood_index,
+        EmotionAnalysis.dominant_emotion,
+        *[getattr(EmotionAnalysis, emotion) for emotion in EMOTIONS]
+    ).where(
+        EmotionAnalysis.post_id.isnot(None)
+    )
+    
+    if zone_id is not None:
+        page_query = page_query.where(EmotionAnalysis.zone_id == zone_id)
+    
+    # The LIMIT keeps the page an index range scan on emotion_analysis; only
+    # those rows are then joined to their posts by primary key. The
+    # (post_id, created_at) foreign key guarantees every post exists.
+    page = keyset_page(
+        page_query, EmotionAnalysis.created_at, EmotionAnalysis.post_id, cursor, since, limit
+    ).subquery()
+    
+    order = asc if cursor is not None and cursor.direction == NEWER else desc
+    result = await db.execute(select(
+        page,
+        SocialPost.content,
+        SocialPost.source,
+        SocialPost.lat,
+        SocialPost.lon
+    ).join(
+        SocialPost,
+        and_(SocialPost.id == page.c.post_id, SocialPost.created_at == page.c.created_at)
+    ).order_by(
+        order(page.c.created_at), order(page.c.post_id)
+    ))
+    rows = result.all()
+    
+    return page_links(rows, limit, cursor, key=lambda row: (row.created_at, row.post_id))
+
+def serialize_post(row, include_zone: bool = True) -> Dict[str, Any]:
+    """Build the API representation of a ``load_post_page`` row"""
+    post_data = {
+        'id': row.post_id,
+        'content': row.content,
+        'source': row.source
+    }
+    if include_zone:
+        post_data['zone_id'] = row.zone_id
+    
+    post_data.update({
+        'lat': float(row.lat) if row.lat else None,
+        'lon': float(row.lon) if row.lon else None,
+        'created_at': row.created_at.isoformat(),
+        'emotion_analysis': {
+            'mood_index': float(row.mood_index),
+            'dominant_emotion': row.dominant_emotion,
+            **{emotion: float(getattr(row, emotion)) for emotion in EMOTIONS}
+        }
+    })
+    return post_data
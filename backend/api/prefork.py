@@ -0,0 +1,236 @@
+"""
+Prefork server for City Pulse application
+Imports the API once in a master process, loads the deferred ML modules,
+the emotion model and the zone lookups there, then forks the workers so
+they share that memory copy-on-write instead of each loading its own.
+The garbage collector is kept off in the master and everything it built
+is frozen before forking, so collections in the workers do not write to
+(and so copy) the shared pages. Only worker 0 runs the background
+collectors. The master restarts workers that die and periodically logs
+each process's unique memory.
+
+    python -m api.prefork --workers 4 --port 8000
+"""
+
+import argparse
+import gc
+import logging
+import os
+import random
+import signal
+import socket
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("city_pulse.prefork")
+
+# Workers that exit sooner than this after starting are restarted with a delay
+MIN_WORKER_LIFETIME_SECONDS = 5
+
+def memory_usage(pid) -> Optional[Dict[str, float]]:
+    """RSS, proportional (PSS), unique (USS) and shared memory of a process in MB"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    except OSError:
+        return None
+    return {
+        'rss_mb': round(fields.get('Rss', 0), 1),
+        'pss_mb': round(fields.get('Pss', 0), 1),
+        'uss_mb': round(fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0), 1),
+        'shared_mb': round(fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0), 1)
+    }
+
+def memory_report() -> Dict[str, Any]:
+    """Memory of this process and, under the prefork master, of the master and every worker"""
+    report = {
+        'pid': os.getpid(),
+        'worker_index': os.getenv("PREFORK_WORKER_INDEX"),
+        'memory': memory_usage(os.getpid())
+    }
+    if report['worker_index'] is not None:
+        master = os.getppid()
+        try:
+            with open(f"/proc/{master}/task/{master}/children") as f:
+                workers = [int(pid) for pid in f.read().split()]
+        except OSError:
+            workers = []
+        report['master'] = {'pid': master, 'memory': memory_usage(master)}
+        report['workers'] = [{'pid': pid, 'memory': memory_usage(pid)} for pid in workers]
+    return report
+
+class PreforkServer:
+    """Master process: preloads the app, binds the socket and supervises forked uvicorn workers"""
+    
+    def __init__(self, host: str, port: int, workers: int, preload: bool, log_level: str):
+        self.host = host
+        self.port = port
+        self.worker_count = workers
+        self.preload = preload
+        self.log_level = log_level
+        self.memory_report_interval = float(os.getenv("PREFORK_MEMORY_REPORT_SECONDS", "300"))
+        
+        self.app = None
+        self.socket = None
+        self.workers = {}
+        self.stopping = False
+    
+    def load_app(self):
+        """Import the API and load everything the workers should share"""
+        # Spare the tokenizers' thread pool from being forked mid-use
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+        
+        started = time.perf_counter()
+        from api.main import app
+        from app.services.warm_up import warm_up
+        # Runs in this process rather than a thread, so nothing is left running at fork
+        warm_up.run()
+        
+        # Connections opened while loading (the collectors' zone lookups) must not be inherited
+        from app.database import engine
+        engine.dispose()
+        
+        self.app = app
+        logger.info(f"Preloaded the app in {time.perf_counter() - started:.1f}s: {warm_up.get_status()['seconds']}")
+    
+    def bind(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(2048)
+        self.socket.set_inheritable(True)
+    
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = (index, time.monotonic())
+            return
+        
+        # Worker process
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            gc.enable()
+            random.seed()
+            os.environ["PREFORK_WORKER_INDEX"] = str(index)
+            if index != 0:
+                os.environ["BACKGROUND_SERVICES_ENABLED"] = "false"
+            self.run_worker()
+        except Exception:
+            logger.exception(f"Worker {index} failed")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+    
+    def run_worker(self):
+        import uvicorn
+        
+        if self.app is None:
+            from api.main import app
+            self.app = app
+        config = uvicorn.Config(self.app, log_level=self.log_level, lifespan="on")
+        uvicorn.Server(config).run(sockets=[self.socket])
+    
+    def log_memory(self):
+        rows = [('master', os.getpid())] + sorted(
+            ((f"worker {index}", pid) for pid, (index, _) in self.workers.items()), key=lambda row: row[0]
+        )
+        total_uss = 0.0
+        for name, pid in rows:
+            usage = memory_usage(pid)
+            if usage is None:
+                continue
+            total_uss += usage['uss_mb']
+            logger.info(
+                f"{name} (pid {pid}): rss {usage['rss_mb']}MB, pss {usage['pss_mb']}MB, "
+                f"unique {usage['uss_mb']}MB, shared {usage['shared_mb']}MB"
+            )
+        logger.info(f"Unique memory across {len(rows)} processes: {total_uss:.1f}MB")
+    
+    def stop(self, signum, frame):
+        self.stopping = True
+    
+    def run(self):
+        # Collections in the master leave freed holes in pages the workers would share
+        gc.disable()
+        if self.preload:
+            self.load_app()
+        self.bind()
+        
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        
+        # Move everything built so far out of the collector's reach; workers then never touch it
+        gc.freeze()
+        for index in range(self.worker_count):
+            self.spawn(index)
+        logger.info(f"Serving on http://{self.host}:{self.port} with {self.worker_count} workers (preload={self.preload})")
+        
+        next_report = time.monotonic() + self.memory_report_interval
+        while not self.stopping:
+            self.reap()
+            if self.memory_report_interval > 0 and time.monotonic() >= next_report:
+                self.log_memory()
+                next_report = time.monotonic() + self.memory_report_interval
+            time.sleep(0.5)
+        
+        self.shutdown()
+    
+    def reap(self):
+        """Restart workers that exited"""
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            index, started = self.workers.pop(pid)
+            if self.stopping:
+                continue
+            logger.warning(f"Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            if time.monotonic() - started < MIN_WORKER_LIFETIME_SECONDS:
+                time.sleep(1)
+            self.spawn(index)
+    
+    def shutdown(self, timeout: float = 30):
+        logger.info("Stopping workers...")
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        
+        deadline = time.monotonic() + timeout
+        while self.workers and time.monotonic() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                self.workers.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        
+        for pid in self.workers:
+            logger.warning(f"Worker pid {pid} did not stop in {timeout:.0f}s, killing it")
+            os.kill(pid, signal.SIGKILL)
+        self.socket.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API from preforked workers sharing preloaded memory")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--no-preload", dest="preload", action="store_false",
+                        help="import the app and load the model in each worker instead (for comparison)")
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "INFO").lower())
+    args = parser.parse_args()
+    
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper()),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    PreforkServer(args.host, args.port, args.workers, args.preload, args.log_level).run()
+
+if __name__ == "__main__":
+    main()
@@ -1,314 +1,225 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import CityZone, EmotionAnalysis, EnvironmentalData
-from sqlalchemy import func, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.async_database import get_async_read_db
+from app.models import Alert, CityZone, EmotionAnalysis, EnvironmentalData, ZoneAnomalyScore
+from app.services.alert_stream import MOOD_METRIC
+from app.services.response_cache import response_cache, SOCIAL, ENVIRONMENTAL
+from app.services.admission_control import admission_control, CHEAP
+from sqlalchemy import func, desc, select
 from datetime import datetime, timedelta
 import pytz
-from typing import List, Dict, Any
-import numpy as np
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
+from typing import List, Dict, Any, Optional
 
 router = APIRouter()
 
-class AnomalyDetector:
-    """Anomaly detection using Isolation Forest"""
+# Alerts are raised at ingest by app/services/alert_stream.py; these endpoints
+# read the ones seen in the window off the alerts (last_seen_at) indexes.
+
+def alert_record(alert: Alert, zone_name: str) -> Dict[str, Any]:
+    """API shape of a stored alert"""
+    record = {
+        'id': alert.id,
+        'zone_id': alert.zone_id,
+        'zone_name': zone_name,
+        'timestamp': alert.last_seen_at.isoformat(),
+        'first_seen': alert.first_seen_at.isoformat(),
+        'data_points': alert.occurrences,
+        'anomaly_type': alert.anomaly_type,
+        'severity': alert.severity,
+        'score': round(alert.score, 2) if alert.score is not None else None,
+        'baseline_mean': round(alert.baseline_mean, 2) if alert.baseline_mean is not None else None,
+        'baseline_std': round(alert.baseline_std, 2) if alert.baseline_std is not None else None
+    }
+    if alert.metric == MOOD_METRIC:
+        record['mood_index'] = round(alert.value, 2)
+    else:
+        record['data_type'] = alert.metric
+        record['value'] = round(alert.value, 2)
+    return record
+
+async def load_alerts(db: AsyncSession, start_time: datetime, mood: bool, zone_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Mood or environmental alerts last seen since ``start_time``, newest first"""
+    query = select(Alert, CityZone.name).join(CityZone, CityZone.id == Alert.zone_id).where(
+        Alert.last_seen_at >= start_time,
+        Alert.metric == MOOD_METRIC if mood else Alert.metric != MOOD_METRIC
+    )
     
-    def __init__(self):
-        self.scaler = StandardScaler()
-        self.model = IsolationForest(contamination=0.1, random_state=42)
+    if zone_id:
+        query = query.where(Alert.zone_id == zone_id)
+    
+    result = await db.execute(query.order_by(desc(Alert.last_seen_at)))
+    return [alert_record(alert, zone_name) for alert, zone_name in result.all()]
+
+async def _count_data_points(db: AsyncSession, model, start_time: datetime, zone_id: Optional[int] = None) -> int:
+    """Rows of ``model`` in the window; an index-only count"""
+    query = select(func.count()).select_from(model).where(model.created_at >= start_time)
+    if zone_id:
+        query = query.where(model.zone_id == zone_id)
+    return await db.scalar(query)
+
+def anomaly_report(anomalies: List[Dict[str, Any]], total_data_points: int, hours: int, now: datetime) -> Dict[str, Any]:
+    return {
+        'anomalies': anomalies,
+        'total_data_points': total_data_points,
+        'anomaly_count': len(anomalies),
+        'period_hours': hours,
+        'timestamp': now.isoformat()
+    }
+
+async def compute_mood_anomalies(db: AsyncSession, hours: int, zone_id: Optional[int] = None) -> Dict[str, Any]:
+    """Mood alerts seen in the last ``hours`` hours"""
+    now = datetime.now(pytz.UTC)
+    start_time = now - timedelta(hours=hours)
     
-    def detect_mood_anomalies(self, mood_data: List[float], threshold: float = 2.0) -> List[bool]:
-        """Detect anomalies in mood index data using z-score method"""
-        if len(mood_data) < 3:
-            return [False] * len(mood_data)
-        
-        # Calculate z-scores
-        mean_mood = np.mean(mood_data)
-        std_mood = np.std(mood_data)
-        
-        if std_mood == 0:
-            return [False] * len(mood_data)
-        
-        z_scores = [(mood - mean_mood) / std_mood for mood in mood_data]
-        
-        # Mark as anomaly if z-score exceeds threshold
-        anomalies = [abs(z_score) > threshold for z_score in z_scores]
-        
-        return anomalies
+    anomalies = await load_alerts(db, start_time, True, zone_id)
+    total_data_points = await _count_data_points(db, EmotionAnalysis, start_time, zone_id)
+    return anomaly_report(anomalies, total_data_points, hours, now)
+
+async def compute_environmental_anomalies(db: AsyncSession, hours: int, zone_id: Optional[int] = None) -> Dict[str, Any]:
+    """Environmental alerts seen in the last ``hours`` hours"""
+    now = datetime.now(pytz.UTC)
+    start_time = now - timedelta(hours=hours)
     
-    def detect_environmental_anomalies(self, env_data: List[float], data_type: str) -> List[bool]:
-        """Detect anomalies in environmental data"""
-        if len(env_data) < 3:
-            return [False] * len(env_data)
-        
-        # Define thresholds for different environmental parameters
-        thresholds = {
-            'air_quality': {
-                'pm25': (0, 150),      # μg/m³ - EPA standards
-                'pm10': (0, 150),      # μg/m³ - EPA standards
-                'o3': (0, 70),         # ppb - EPA 8-hour standard
-                'no2': (0, 100),       # ppb - EPA 1-hour standard
-                'co': (0, 9),          # ppm - EPA 8-hour standard
-                'so2': (0, 75)         # ppb - EPA 1-hour standard
-            },
-            'weather': {
-                'temperature': (-20, 45),  # °C - reasonable range
-                'humidity': (0, 100),      # % - valid range
-                'pressure': (900, 1100),   # hPa - reasonable range
-                'wind_speed': (0, 50),     # m/s - reasonable range
-                'visibility': (0, 50)      # km - reasonable range
-            },
-            'noise': {
-                'db_level': (30, 120)     # dB - reasonable range
-            }
-        }
-        
-        # Get thresholds for this data type
-        param_thresholds = thresholds.get(data_type, {})
-        if not param_thresholds:
-            return [False] * len(env_data)
-        
-        # For now, use simple range checking
-        # In a real implementation, you might use more sophisticated methods
-        anomalies = []
-        for value in env_data:
-            is_anomaly = False
-            for param, (min_val, max_val) in param_thresholds.items():
-                if value < min_val or value > max_val:
-                    is_anomaly = True
-                    break
-            anomalies.append(is_anomaly)
-        
-        return anomalies
+    anomalies = await load_alerts(db, start_time, False, zone_id)
+    total_data_points = await _count_data_points(db, EnvironmentalData, start_time, zone_id)
+    return anomaly_report(anomalies, total_data_points, hours, now)
 
-# Global anomaly detector instance
-anomaly_detector = AnomalyDetector()
+def summarize_anomalies(mood_anomalies: List[Dict[str, Any]], env_anomalies: List[Dict[str, Any]], hours: int) -> Dict[str, Any]:
+    """Alerts summary from the mood and environmental alerts in a window"""
+    # Calculate severity distribution
+    severity_counts = {
+        'low': 0,
+        'medium': 0,
+        'high': 0
+    }
+    
+    for anomaly in mood_anomalies + env_anomalies:
+        severity_counts[anomaly['severity']] += 1
+    
+    # Get zones with most anomalies
+    zone_anomaly_counts = {}
+    for anomaly in mood_anomalies + env_anomalies:
+        zone_name = anomaly['zone_name']
+        zone_anomaly_counts[zone_name] = zone_anomaly_counts.get(zone_name, 0) + 1
+    
+    # Sort zones by anomaly count
+    top_zones = sorted(zone_anomaly_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+    
+    return {
+        'summary': {
+            'total_anomalies': len(mood_anomalies) + len(env_anomalies),
+            'mood_anomalies': len(mood_anomalies),
+            'environmental_anomalies': len(env_anomalies),
+            'severity_distribution': severity_counts,
+            'top_anomaly_zones': top_zones
+        },
+        'period_hours': hours,
+        'timestamp': datetime.now(pytz.UTC).isoformat()
+    }
+
+async def compute_alerts_summary(db: AsyncSession, hours: int) -> Dict[str, Any]:
+    """Summary of the alerts seen in the last ``hours`` hours"""
+    start_time = datetime.now(pytz.UTC) - timedelta(hours=hours)
+    mood_anomalies = await load_alerts(db, start_time, True)
+    env_anomalies = await load_alerts(db, start_time, False)
+    return summarize_anomalies(mood_anomalies, env_anomalies, hours)
+
+async def compute_multivariate_anomalies(
+    db: AsyncSession,
+    hours: int,
+    zone_id: Optional[int] = None,
+    include_normal: bool = False
+) -> Dict[str, Any]:
+    """Zone-hours the anomaly_scoring job scored in the last ``hours`` hours, most anomalous first"""
+    now = datetime.now(pytz.UTC)
+    start_time = now - timedelta(hours=hours)
+    
+    query = select(ZoneAnomalyScore, CityZone.name).join(CityZone, CityZone.id == ZoneAnomalyScore.zone_id).where(
+        ZoneAnomalyScore.hour >= start_time
+    )
+    if zone_id:
+        query = query.where(ZoneAnomalyScore.zone_id == zone_id)
+    
+    result = await db.execute(query.order_by(desc(ZoneAnomalyScore.score)))
+    scored = result.all()
+    anomalies = [
+        {
+            'zone_id': row.zone_id,
+            'zone_name': zone_name,
+            'timestamp': row.hour.isoformat(),
+            'score': row.score,
+            'is_anomaly': row.is_anomaly,
+            'features': row.features,
+            'model_version': row.model_version,
+            'anomaly_type': 'multivariate_outlier'
+        }
+        for row, zone_name in scored
+        if include_normal or row.is_anomaly
+    ]
+    return {
+        'anomalies': anomalies,
+        'scored_hours': len(scored),
+        'anomaly_count': sum(row.is_anomaly for row, _ in scored),
+        'period_hours': hours,
+        'timestamp': now.isoformat()
+    }
 
 @router.get("/mood-anomalies")
+@response_cache.cached("alerts/mood-anomalies", ttl=60, datasets=[SOCIAL])
+@admission_control.admit("alerts/mood-anomalies", CHEAP)
 async def get_mood_anomalies(
     zone_id: int = None,
     hours: int = 24,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get mood index anomalies for zones"""
     try:
-        # Calculate time range
-        now = datetime.now(pytz.UTC)
-        start_time = now - timedelta(hours=hours)
-        
-        # Build query
-        query = db.query(EmotionAnalysis).filter(
-            EmotionAnalysis.created_at >= start_time
-        )
-        
-        if zone_id:
-            query = query.filter(EmotionAnalysis.zone_id == zone_id)
-        
-        emotion_data = query.order_by(EmotionAnalysis.created_at).all()
-        
-        if not emotion_data:
-            return {
-                'anomalies': [],
-                'total_data_points': 0,
-                'anomaly_count': 0,
-                'period_hours': hours
-            }
-        
-        # Group by zone and hour
-        zone_hourly_data = {}
-        for emotion in emotion_data:
-            zone_id = emotion.zone_id
-            hour_key = emotion.created_at.replace(minute=0, second=0, microsecond=0)
-            
-            if zone_id not in zone_hourly_data:
-                zone_hourly_data[zone_id] = {}
-            
-            if hour_key not in zone_hourly_data[zone_id]:
-                zone_hourly_data[zone_id][hour_key] = []
-            
-            zone_hourly_data[zone_id][hour_key].append(float(emotion.mood_index))
-        
-        # Detect anomalies for each zone
-        anomalies = []
-        total_points = 0
-        anomaly_count = 0
-        
-        for zone_id, hourly_data in zone_hourly_data.items():
-            zone = db.query(CityZone).filter(CityZone.id == zone_id).first()
-            if not zone:
-                continue
-            
-            for hour, mood_indices in sorted(hourly_data.items()):
-                total_points += len(mood_indices)
-                
-                # Calculate average mood for this hour
-                avg_mood = sum(mood_indices) / len(mood_indices)
-                
-                # Detect anomalies
-                anomaly_flags = anomaly_detector.detect_mood_anomalies(mood_indices)
-                is_anomaly = any(anomaly_flags)
-                
-                if is_anomaly:
-                    anomaly_count += 1
-                    anomalies.append({
-                        'zone_id': zone_id,
-                        'zone_name': zone.name,
-                        'timestamp': hour.isoformat(),
-                        'mood_index': round(avg_mood, 2),
-                        'data_points': len(mood_indices),
-                        'anomaly_type': 'mood_spike',
-                        'severity': 'medium' if len([f for f in anomaly_flags if f]) > len(anomaly_flags) * 0.5 else 'low'
-                    })
-        
-        return {
-            'anomalies': anomalies,
-            'total_data_points': total_points,
-            'anomaly_count': anomaly_count,
-            'period_hours': hours,
-            'timestamp': now.isoformat()
-        }
-        
+        return await compute_mood_anomalies(db, hours, zone_id)
+    
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error detecting mood anomalies: {str(e)}")
 
 @router.get("/environmental-anomalies")
+@response_cache.cached("alerts/environmental-anomalies", ttl=60, datasets=[ENVIRONMENTAL])
+@admission_control.admit("alerts/environmental-anomalies", CHEAP)
 async def get_environmental_anomalies(
     zone_id: int = None,
     hours: int = 24,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get environmental data anomalies"""
     try:
-        # Calculate time range
-        now = datetime.now(pytz.UTC)
-        start_time = now - timedelta(hours=hours)
-        
-        # Build query
-        query = db.query(EnvironmentalData).filter(
-            EnvironmentalData.created_at >= start_time
-        )
-        
-        if zone_id:
-            query = query.filter(EnvironmentalData.zone_id == zone_id)
-        
-        env_data = query.order_by(EnvironmentalData.created_at).all()
-        
-        if not env_data:
-            return {
-                'anomalies': [],
-                'total_data_points': 0,
-                'anomaly_count': 0,
-                'period_hours': hours
-            }
-        
-        # Group by zone, data type, and hour
-        grouped_data = {}
-        for data_point in env_data:
-            zone_id = data_point.zone_id
-            data_type = data_point.data_type
-            hour_key = data_point.created_at.replace(minute=0, second=0, microsecond=0)
-            
-            if zone_id not in grouped_data:
-                grouped_data[zone_id] = {}
-            
-            if data_type not in grouped_data[zone_id]:
-                grouped_data[zone_id][data_type] = {}
-            
-            if hour_key not in grouped_data[zone_id][data_type]:
-                grouped_data[zone_id][data_type][hour_key] = []
-            
-            grouped_data[zone_id][data_type][hour_key].append(float(data_point.value))
-        
-        # Detect anomalies
-        anomalies = []
-        total_points = 0
-        anomaly_count = 0
-        
-        for zone_id, data_types in grouped_data.items():
-            zone = db.query(CityZone).filter(CityZone.id == zone_id).first()
-            if not zone:
-                continue
-            
-            for data_type, hourly_data in data_types.items():
-                for hour, values in sorted(hourly_data.items()):
-                    total_points += len(values)
-                    
-                    # Calculate average value for this hour
-                    avg_value = sum(values) / len(values)
-                    
-                    # Detect anomalies
-                    anomaly_flags = anomaly_detector.detect_environmental_anomalies(values, data_type)
-                    is_anomaly = any(anomaly_flags)
-                    
-                    if is_anomaly:
-                        anomaly_count += 1
-                        anomalies.append({
-                            'zone_id': zone_id,
-                            'zone_name': zone.name,
-                            'data_type': data_type,
-                            'timestamp': hour.isoformat(),
-                            'average_value': round(avg_value, 2),
-                            'data_points': len(values),
-                            'anomaly_type': 'environmental_threshold_exceeded',
-                            'severity': 'high' if len([f for f in anomaly_flags if f]) > len(anomaly_flags) * 0.7 else 'medium'
-                        })
-        
-        return {
-            'anomalies': anomalies,
-            'total_data_points': total_points,
-            'anomaly_count': anomaly_count,
-            'period_hours': hours,
-            'timestamp': now.isoformat()
-        }
-        
+        return await compute_environmental_anomalies(db, hours, zone_id)
+    
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error detecting environmental anomalies: {str(e)}")
 
 @router.get("/summary")
+@response_cache.cached("alerts/summary", ttl=60, datasets=[SOCIAL, ENVIRONMENTAL])
+@admission_control.admit("alerts/summary", CHEAP)
 async def get_alerts_summary(
     hours: int = 24,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get summary of all alerts and anomalies"""
     try:
-        # Get mood anomalies
-        mood_anomalies = await get_mood_anomalies(hours=hours, db=db)
-        
-        # Get environmental anomalies
-        env_anomalies = await get_environmental_anomalies(hours=hours, db=db)
-        
-        # Calculate severity distribution
-        severity_counts = {
-            'low': 0,
-            'medium': 0,
-            'high': 0
-        }
-        
-        for anomaly in mood_anomalies['anomalies'] + env_anomalies['anomalies']:
-            severity_counts[anomaly['severity']] += 1
-        
-        # Get zones with most anomalies
-        zone_anomaly_counts = {}
-        for anomaly in mood_anomalies['anomalies'] + env_anomalies['anomalies']:
-            zone_name = anomaly['zone_name']
-            zone_anomaly_counts[zone_name] = zone_anomaly_counts.get(zone_name, 0) + 1
-        
-        # Sort zones by anomaly count
-        top_zones = sorted(zone_anomaly_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-        
-        return {
-            'summary': {
-                'total_anomalies': mood_anomalies['anomaly_count'] + env_anomalies['anomaly_count'],
-                'mood_anomalies': mood_anomalies['anomaly_count'],
-                'environmental_anomalies': env_anomalies['anomaly_count'],
-                'severity_distribution': severity_counts,
-                'top_anomaly_zones': top_zones
-            },
-            'period_hours': hours,
-            'timestamp': datetime.now(pytz.UTC).isoformat()
-        }
-        
+        return await compute_alerts_summary(db, hours)
+    
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting alerts summary: {str(e)}")
+
+@router.get("/multivariate-anomalies")
+@response_cache.cached("alerts/multivariate-anomalies", ttl=60, datasets=[SOCIAL, ENVIRONMENTAL])
+@admission_control.admit("alerts/multivariate-anomalies", CHEAP)
+async def get_multivariate_anomalies(
+    zone_id: int = None,
+    hours: int = 24,
+    include_normal: bool = False,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Get zone-hours whose mood and environment together are unusual, from the stored Isolation Forest scores"""
+    try:
+        return await compute_multivariate_anomalies(db, hours, zone_id, include_normal)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting multivariate anomalies: {str(e)}")
@@ -0,0 +1,99 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.async_database import get_async_read_db
+from app.models import CityZone, EmotionAnalysis, EnvironmentalData
+from app.services.response_cache import response_cache, SOCIAL, ENVIRONMENTAL
+from app.services.admission_control import admission_control, HEAVY
+from sqlalchemy import select
+from datetime import datetime, timedelta
+import pytz
+from typing import List, Optional
+from api.post_feed import load_post_page, serialize_post
+from api.routers.now import build_city_pulse, build_environmental_overview
+from api.routers.alerts import compute_alerts_summary
+
+router = APIRouter()
+
+SECTIONS = ['now', 'posts', 'environment', 'alerts']
+
+def parse_sections(sections: Optional[str]) -> List[str]:
+    """Validate a comma-separated section list; all sections when omitted"""
+    if not sections:
+        return SECTIONS
+    requested = [section.strip() for section in sections.split(',') if section.strip()]
+    unknown = sorted(set(requested) - set(SECTIONS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown dashboard sections: {', '.join(unknown)}")
+    return [section for section in SECTIONS if section in requested]
+
+@router.get("/dashboard")
+@response_cache.cached("dashboard", ttl=15, datasets=[SOCIAL, ENVIRONMENTAL], etag=True)
+@admission_control.admit("dashboard", HEAVY)
+async def get_dashboard(
+    sections: Optional[str] = None,
+    limit: int = 20,
+    hours: int = 24,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Get the main page in one request: now, posts, environment and alerts sections.
+    
+    Each section matches the body of its own endpoint (``/now``, ``/recent-posts``,
+    ``/environmental-overview``, ``/alerts/summary``). They are computed in one
+    session from a single scan of each table over the last hour, plus the stored
+    alerts; ``sections`` selects a comma-separated subset.
+    """
+    selected = parse_sections(sections)
+    try:
+        now = datetime.now(pytz.UTC)
+        one_hour_ago = now - timedelta(hours=1)
+        
+        bundle = {}
+        
+        if 'now' in selected:
+            zones = (await db.scalars(select(CityZone))).all()
+            emotion_rows = (await db.execute(select(
+                EmotionAnalysis.zone_id,
+                EmotionAnalysis.created_at,
+                EmotionAnalysis.mood_index,
+                EmotionAnalysis.dominant_emotion
+            ).where(
+                EmotionAnalysis.created_at >= one_hour_ago
+            ))).all()
+        
+        if 'environment' in selected:
+            env_rows = (await db.execute(select(
+                EnvironmentalData.zone_id,
+                EnvironmentalData.data_type,
+                EnvironmentalData.created_at,
+                EnvironmentalData.value
+            ).where(
+                EnvironmentalData.created_at >= one_hour_ago
+            ))).all()
+        
+        if 'now' in selected:
+            bundle['now'] = build_city_pulse(zones, emotion_rows, now)
+        
+        if 'posts' in selected:
+            recent_posts, links = await load_post_page(db, None, None, limit)
+            posts_data = [serialize_post(row) for row in recent_posts]
+            bundle['posts'] = {
+                'posts': posts_data,
+                'count': len(posts_data),
+                **links,
+                'timestamp': now.isoformat()
+            }
+        
+        if 'environment' in selected:
+            bundle['environment'] = build_environmental_overview(env_rows, now)
+        
+        if 'alerts' in selected:
+            bundle['alerts'] = await compute_alerts_summary(db, hours)
+        
+        return {
+            'sections': selected,
+            **bundle,
+            'timestamp': now.isoformat()
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting dashboard: {str(e)}")
@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Header
+from fastapi.responses import StreamingResponse
+from app.services.live_updates import live_updates, format_sse
+from typing import Optional
+import asyncio
+
+router = APIRouter()
+
+# Comment line sent when idle so proxies keep the connection open
+KEEPALIVE_SECONDS = 15
+
+async def _event_stream(resume_from: Optional[int]):
+    """Replay missed events, then forward live ones until the client leaves or falls behind"""
+    subscriber, backlog = live_updates.subscribe(resume_from)
+    try:
+        # Reconnect delay for EventSource clients
+        yield b"retry: 2000\n\n"
+        last_seq = resume_from
+        for event in backlog:
+            last_seq = event.seq
+            yield event.chunk
+        
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            
+            if event is None:
+                # Slow consumer: the client reconnects with Last-Event-ID and resumes
+                yield format_sse('dropped', {'resume_from': last_seq})
+                break
+            last_seq = event.seq
+            yield event.chunk
+    finally:
+        live_updates.unsubscribe(subscriber)
+
+@router.get("/live")
+async def stream_live_updates(
+    since: Optional[int] = None,
+    last_event_id: Optional[str] = Header(None)
+):
+    """Stream city pulse deltas (posts, zone moods, readings, alerts) as Server-Sent Events"""
+    resume_from = since
+    if resume_from is None and last_event_id and last_event_id.isdigit():
+        resume_from = int(last_event_id)
+    
+    return StreamingResponse(
+        _event_stream(resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,124 +1,144 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.async_database import get_async_read_db
 from app.models import CityZone, EmotionAnalysis, EnvironmentalData
-from sqlalchemy import func, desc
+from app.services.response_cache import response_cache, SOCIAL, ENVIRONMENTAL
+from app.services.admission_control import admission_control, CHEAP
+from sqlalchemy import func, desc, select
 from datetime import datetime, timedelta
 import pytz
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from api.pagination import decode_cursor
+from api.post_feed import load_post_page, serialize_post
 
 router = APIRouter()
 
+def build_city_pulse(zones: List[CityZone], recent_emotions: List[Any], now: datetime) -> Dict[str, Any]:
+    """City pulse overview from the zones and their last hour of (zone_id, mood_index, dominant_emotion) rows"""
+    emotions_by_zone = {}
+    for emotion in recent_emotions:
+        emotions_by_zone.setdefault(emotion.zone_id, []).append(emotion)
+    
+    # Get current mood index for each zone
+    zone_moods = []
+    for zone in zones:
+        zone_emotions = emotions_by_zone.get(zone.id, [])
+        
+        if zone_emotions:
+            # Calculate average mood index
+            avg_mood = sum(float(e.mood_index) for e in zone_emotions) / len(zone_emotions)
+            post_count = len(zone_emotions)
+            
+            # Get dominant emotions
+            emotion_counts = {}
+            for emotion in zone_emotions:
+                dominant = emotion.dominant_emotion
+                emotion_counts[dominant] = emotion_counts.get(dominant, 0) + 1
+            
+            dominant_emotion = max(emotion_counts.items(), key=lambda x: x[1])[0] if emotion_counts else 'neutral'
+            
+            zone_moods.append({
+                'zone_id': zone.id,
+                'zone_name': zone.name,
+                'center_lat': float(zone.center_lat),
+                'center_lon': float(zone.center_lon),
+                'current_mood_index': round(avg_mood, 2),
+                'post_count': post_count,
+                'dominant_emotion': dominant_emotion,
+                'last_updated': now.isoformat()
+            })
+        else:
+            # No recent data, use neutral values
+            zone_moods.append({
+                'zone_id': zone.id,
+                'zone_name': zone.name,
+                'center_lat': float(zone.center_lat),
+                'center_lon': float(zone.center_lon),
+                'current_mood_index': 50.0,
+                'post_count': 0,
+                'dominant_emotion': 'neutral',
+                'last_updated': now.isoformat()
+            })
+    
+    # Calculate city-wide mood index
+    total_mood = sum(zone['current_mood_index'] for zone in zone_moods)
+    city_mood_index = total_mood / len(zone_moods) if zone_moods else 50.0
+    
+    return {
+        'city_mood_index': round(city_mood_index, 2),
+        'total_zones': len(zones),
+        'zones': zone_moods,
+        'timestamp': now.isoformat()
+    }
+
+def build_environmental_overview(recent_env_data: List[Any], now: datetime) -> Dict[str, Any]:
+    """Environmental overview from the last hour of (data_type, value) rows"""
+    # Group by data type and calculate averages
+    env_summary = {}
+    for data_point in recent_env_data:
+        data_type = data_point.data_type
+        if data_type not in env_summary:
+            env_summary[data_type] = []
+        env_summary[data_type].append(float(data_point.value))
+    
+    # Calculate averages
+    env_overview = {}
+    for data_type, values in env_summary.items():
+        env_overview[data_type] = {
+            'average_value': round(sum(values) / len(values), 2),
+            'count': len(values),
+            'last_updated': now.isoformat()
+        }
+    
+    return {
+        'environmental_data': env_overview,
+        'timestamp': now.isoformat()
+    }
+
 @router.get("/now")
-async def get_current_city_pulse(db: Session = Depends(get_db)):
+@response_cache.cached("now", ttl=15, datasets=[SOCIAL], etag=True)
+@admission_control.admit("now", CHEAP)
+async def get_current_city_pulse(db: AsyncSession = Depends(get_async_read_db)):
     """Get current city pulse overview"""
     try:
         # Get current timestamp
         now = datetime.now(pytz.UTC)
         one_hour_ago = now - timedelta(hours=1)
         
-        # Get current mood index for each zone
-        zone_moods = []
-        zones = db.query(CityZone).all()
+        zones = (await db.scalars(select(CityZone))).all()
         
-        for zone in zones:
-            # Get recent emotion analysis for this zone
-            recent_emotions = db.query(EmotionAnalysis).filter(
-                EmotionAnalysis.zone_id == zone.id,
-                EmotionAnalysis.created_at >= one_hour_ago
-            ).all()
-            
-            if recent_emotions:
-                # Calculate average mood index
-                avg_mood = sum(float(e.mood_index) for e in recent_emotions) / len(recent_emotions)
-                post_count = len(recent_emotions)
-                
-                # Get dominant emotions
-                emotion_counts = {}
-                for emotion in recent_emotions:
-                    dominant = emotion.dominant_emotion
-                    emotion_counts[dominant] = emotion_counts.get(dominant, 0) + 1
-                
-                dominant_emotion = max(emotion_counts.items(), key=lambda x: x[1])[0] if emotion_counts else 'neutral'
-                
-                zone_moods.append({
-                    'zone_id': zone.id,
-                    'zone_name': zone.name,
-                    'center_lat': float(zone.center_lat),
-                    'center_lon': float(zone.center_lon),
-                    'current_mood_index': round(avg_mood, 2),
-                    'post_count': post_count,
-                    'dominant_emotion': dominant_emotion,
-                    'last_updated': now.isoformat()
-                })
-            else:
-                # No recent data, use neutral values
-                zone_moods.append({
-                    'zone_id': zone.id,
-                    'zone_name': zone.name,
-                    'center_lat': float(zone.center_lat),
-                    'center_lon': float(zone.center_lon),
-                    'current_mood_index': 50.0,
-                    'post_count': 0,
-                    'dominant_emotion': 'neutral',
-                    'last_updated': now.isoformat()
-                })
+        # Last hour of emotion analysis for every zone in one query
+        recent_emotions = (await db.execute(select(
+            EmotionAnalysis.zone_id,
+            EmotionAnalysis.mood_index,
+            EmotionAnalysis.dominant_emotion
+        ).where(
+            EmotionAnalysis.created_at >= one_hour_ago
+        ))).all()
         
-        # Calculate city-wide mood index
-        total_mood = sum(zone['current_mood_index'] for zone in zone_moods)
-        city_mood_index = total_mood / len(zone_moods) if zone_moods else 50.0
-        
-        return {
-            'city_mood_index': round(city_mood_index, 2),
-            'total_zones': len(zones),
-            'zones': zone_moods,
-            'timestamp': now.isoformat()
-        }
+        return build_city_pulse(zones, recent_emotions, now)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting city pulse: {str(e)}")
 
 @router.get("/recent-posts")
+@admission_control.admit("recent-posts", CHEAP)
 async def get_recent_social_posts(
     limit: int = 20,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """Get recent social media posts with emotion analysis"""
+    """Get recent social media posts with emotion analysis, one keyset page at a time"""
+    page_cursor = decode_cursor(cursor)
     try:
-        # Get recent posts with emotion analysis
-        recent_posts = db.query(EmotionAnalysis).join(
-            EmotionAnalysis.post
-        ).order_by(
-            desc(EmotionAnalysis.created_at)
-        ).limit(limit).all()
-        
-        posts_data = []
-        for analysis in recent_posts:
-            post_data = {
-                'id': analysis.post.id,
-                'content': analysis.post.content,
-                'source': analysis.post.source,
-                'zone_id': analysis.zone_id,
-                'lat': float(analysis.post.lat) if analysis.post.lat else None,
-                'lon': float(analysis.post.lon) if analysis.post.lon else None,
-                'created_at': analysis.post.created_at.isoformat(),
-                'emotion_analysis': {
-                    'mood_index': float(analysis.mood_index),
-                    'dominant_emotion': analysis.dominant_emotion,
-                    'joy': float(analysis.joy),
-                    'sadness': float(analysis.sadness),
-                    'anger': float(analysis.anger),
-                    'fear': float(analysis.fear),
-                    'surprise': float(analysis.surprise),
-                    'disgust': float(analysis.disgust),
-                    'neutral': float(analysis.neutral)
-                }
-            }
-            posts_data.append(post_data)
+        recent_posts, links = await load_post_page(db, page_cursor, since, limit)
+        posts_data = [serialize_post(row) for row in recent_posts]
         
         return {
             'posts': posts_data,
             'count': len(posts_data),
+            **links,
             'timestamp': datetime.now(pytz.UTC).isoformat()
         }
         
@@ -126,38 +146,23 @@ async def get_recent_social_posts(
         raise HTTPException(status_code=500, detail=f"Error getting recent posts: {str(e)}")
 
 @router.get("/environmental-overview")
-async def get_environmental_overview(db: Session = Depends(get_db)):
+@response_cache.cached("environmental-overview", ttl=30, datasets=[ENVIRONMENTAL], etag=True)
+@admission_control.admit("environmental-overview", CHEAP)
+async def get_environmental_overview(db: AsyncSession = Depends(get_async_read_db)):
     """Get current environmental data overview"""
     try:
         now = datetime.now(pytz.UTC)
         one_hour_ago = now - timedelta(hours=1)
         
         # Get recent environmental data
-        recent_env_data = db.query(EnvironmentalData).filter(
+        recent_env_data = (await db.execute(select(
+            EnvironmentalData.data_type,
+            EnvironmentalData.value
+        ).where(
             EnvironmentalData.created_at >= one_hour_ago
-        ).all()
-        
-        # Group by data type and calculate averages
-        env_summary = {}
-        for data_point in recent_env_data:
-            data_type = data_point.data_type
-            if data_type not in env_summary:
-                env_summary[data_type] = []
-            env_summary[data_type].append(float(data_point.value))
+        ))).all()
         
-        # Calculate averages
-        env_overview = {}
-        for data_type, values in env_summary.items():
-            env_overview[data_type] = {
-                'average_value': round(sum(values) / len(values), 2),
-                'count': len(values),
-                'last_updated': now.isoformat()
-            }
-        
-        return {
-            'environmental_data': env_overview,
-            'timestamp': now.isoformat()
-        }
+        return build_environmental_overview(recent_env_data, now)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting environmental overview: {str(e)}")
@@ -1,19 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.async_database import get_async_read_db
 from app.models import CityZone, EmotionAnalysis, EnvironmentalData
-from sqlalchemy import func, desc
+from app.services.response_cache import response_cache, SOCIAL, ENVIRONMENTAL
+from app.services.admission_control import admission_control, CHEAP, HEAVY
+from sqlalchemy import func, desc, select
 from datetime import datetime, timedelta
 import pytz
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from api.pagination import decode_cursor
+from api.post_feed import load_post_page, serialize_post
 
 router = APIRouter()
 
 @router.get("/{zone_id}")
-async def get_zone_details(zone_id: int, db: Session = Depends(get_db)):
+@response_cache.cached("zone", ttl=30, datasets=[SOCIAL, ENVIRONMENTAL], etag=True)
+@admission_control.admit("zone", CHEAP)
+async def get_zone_details(zone_id: int, db: AsyncSession = Depends(get_async_read_db)):
     """Get detailed information about a specific zone"""
     try:
-        zone = db.query(CityZone).filter(CityZone.id == zone_id).first()
+        zone = await db.scalar(select(CityZone).where(CityZone.id == zone_id))
         if not zone:
             raise HTTPException(status_code=404, detail="Zone not found")
         
@@ -22,10 +28,10 @@ async def get_zone_details(zone_id: int, db: Session = Depends(get_db)):
         one_hour_ago = now - timedelta(hours=1)
         
         # Get recent emotion analysis for this zone
-        recent_emotions = db.query(EmotionAnalysis).filter(
+        recent_emotions = (await db.scalars(select(EmotionAnalysis).where(
             EmotionAnalysis.zone_id == zone_id,
             EmotionAnalysis.created_at >= one_hour_ago
-        ).all()
+        ))).all()
         
         # Calculate zone statistics
         if recent_emotions:
@@ -60,10 +66,10 @@ async def get_zone_details(zone_id: int, db: Session = Depends(get_db)):
             dominant_emotion = 'neutral'
         
         # Get recent environmental data
-        recent_env_data = db.query(EnvironmentalData).filter(
+        recent_env_data = (await db.scalars(select(EnvironmentalData).where(
             EnvironmentalData.zone_id == zone_id,
             EnvironmentalData.created_at >= one_hour_ago
-        ).all()
+        ))).all()
         
         # Group environmental data by type
         env_summary = {}
@@ -104,14 +110,15 @@ async def get_zone_details(zone_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Error getting zone details: {str(e)}")
 
 @router.get("/{zone_id}/series")
+@admission_control.admit("zone/series", HEAVY)
 async def get_zone_time_series(
     zone_id: int,
     hours: int = 24,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get time series data for a specific zone"""
     try:
-        zone = db.query(CityZone).filter(CityZone.id == zone_id).first()
+        zone = await db.scalar(select(CityZone).where(CityZone.id == zone_id))
         if not zone:
             raise HTTPException(status_code=404, detail="Zone not found")
         
@@ -120,10 +127,10 @@ async def get_zone_time_series(
         start_time = now - timedelta(hours=hours)
         
         # Get emotion analysis data over time
-        emotion_data = db.query(EmotionAnalysis).filter(
+        emotion_data = (await db.scalars(select(EmotionAnalysis).where(
             EmotionAnalysis.zone_id == zone_id,
             EmotionAnalysis.created_at >= start_time
-        ).order_by(EmotionAnalysis.created_at).all()
+        ).order_by(EmotionAnalysis.created_at))).all()
         
         # Group by hour and calculate averages
         hourly_data = {}
@@ -167,54 +174,30 @@ async def get_zone_time_series(
         raise HTTPException(status_code=500, detail=f"Error getting zone time series: {str(e)}")
 
 @router.get("/{zone_id}/posts")
+@admission_control.admit("zone/posts", CHEAP)
 async def get_zone_posts(
     zone_id: int,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """Get recent social media posts for a specific zone"""
+    """Get social media posts for a specific zone, one keyset page at a time"""
+    page_cursor = decode_cursor(cursor)
     try:
-        zone = db.query(CityZone).filter(CityZone.id == zone_id).first()
+        zone = await db.scalar(select(CityZone).where(CityZone.id == zone_id))
         if not zone:
             raise HTTPException(status_code=404, detail="Zone not found")
         
-        # Get recent posts with emotion analysis for this zone
-        recent_posts = db.query(EmotionAnalysis).filter(
-            EmotionAnalysis.zone_id == zone_id
-        ).join(
-            EmotionAnalysis.post
-        ).order_by(
-            desc(EmotionAnalysis.created_at)
-        ).limit(limit).all()
-        
-        posts_data = []
-        for analysis in recent_posts:
-            post_data = {
-                'id': analysis.post.id,
-                'content': analysis.post.content,
-                'source': analysis.post.source,
-                'lat': float(analysis.post.lat) if analysis.post.lat else None,
-                'lon': float(analysis.post.lon) if analysis.post.lon else None,
-                'created_at': analysis.post.created_at.isoformat(),
-                'emotion_analysis': {
-                    'mood_index': float(analysis.mood_index),
-                    'dominant_emotion': analysis.dominant_emotion,
-                    'joy': float(analysis.joy),
-                    'sadness': float(analysis.sadness),
-                    'anger': float(analysis.anger),
-                    'fear': float(analysis.fear),
-                    'surprise': float(analysis.surprise),
-                    'disgust': float(analysis.disgust),
-                    'neutral': float(analysis.neutral)
-                }
-            }
-            posts_data.append(post_data)
+        recent_posts, links = await load_post_page(db, page_cursor, since, limit, zone_id=zone_id)
+        posts_data = [serialize_post(row, include_zone=False) for row in recent_posts]
         
         return {
             'zone_id': zone_id,
             'zone_name': zone.name,
             'posts': posts_data,
             'count': len(posts_data),
+            **links,
             'timestamp': datetime.now(pytz.UTC).isoformat()
         }
         
@@ -0,0 +1,111 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from app.database import (
+    DATABASE_URL, DATABASE_REPLICA_URL, PRIMARY_LSN_QUERY, REPLICA_LAG_QUERY, REPLICA_CAUGHT_UP_QUERY,
+    engine, read_router, pool_status
+)
+from contextlib import asynccontextmanager
+import asyncio
+import os
+
+# An unreachable replica must not hold up the request that probes it
+REPLICA_LAG_CHECK_TIMEOUT_SECONDS = 2.0
+
+def _create_async_engine(url: str):
+    """Async engine for a postgresql:// URL, reached through the asyncpg driver"""
+    return create_async_engine(
+        make_url(url).set(drivername="postgresql+asyncpg"),
+        echo=False,  # Set to True for SQL debugging
+        pool_pre_ping=True,
+        pool_recycle=300,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+    )
+
+# Create async engine; requests beyond the pool wait for a free connection
+async_engine = _create_async_engine(DATABASE_URL)
+
+# Create async session factory; rows stay readable after commit without a refresh
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Read replica engine and session factory, when DATABASE_REPLICA_URL is set
+async_replica_engine = _create_async_engine(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else None
+AsyncReplicaSessionLocal = (
+    async_sessionmaker(async_replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    if async_replica_engine is not None else None
+)
+
+# Dependency to get an async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def primary_lsn() -> str:
+    """The primary's current WAL position"""
+    async with async_engine.connect() as conn:
+        return (await conn.execute(PRIMARY_LSN_QUERY)).scalar()
+
+async def check_replica_lag():
+    """Measure the replica's replay lag behind the primary for the read routing policy"""
+    async def measure():
+        position = await primary_lsn()
+        async with async_replica_engine.connect() as conn:
+            return (await conn.execute(REPLICA_LAG_QUERY, {'primary_lsn': position})).scalar()
+    
+    try:
+        lag_seconds = await asyncio.wait_for(measure(), timeout=REPLICA_LAG_CHECK_TIMEOUT_SECONDS)
+        if lag_seconds is None:
+            raise RuntimeError("standby has not replayed any transaction yet")
+        read_router.record_lag(float(lag_seconds))
+    except asyncio.TimeoutError:
+        read_router.record_lag(None, TimeoutError(f"no answer within {REPLICA_LAG_CHECK_TIMEOUT_SECONDS:.0f}s"))
+    except Exception as e:
+        read_router.record_lag(None, e)
+
+# Dependency to get an async session for read-only work: the replica while it
+# is caught up, otherwise the primary
+async def get_async_read_db():
+    if read_router.claim_lag_check():
+        await check_replica_lag()
+    
+    session_factory = AsyncReplicaSessionLocal if read_router.choose() == 'replica' else AsyncSessionLocal
+    async with session_factory() as db:
+        yield db
+
+@asynccontextmanager
+async def consistent_read(db: AsyncSession):
+    """``db``, or a primary session if ``db`` is on a replica that has not yet replayed
+    everything committed on the primary.
+    
+    Cached responses are keyed by data versions the collectors bump after each
+    commit on the primary. Filling one from a replica that is still behind
+    would cache, and ETag, pre-commit data under the new versions.
+    """
+    if async_replica_engine is None or db.bind is not async_replica_engine:
+        yield db
+        return
+    
+    try:
+        caught_up = (await db.execute(REPLICA_CAUGHT_UP_QUERY, {'primary_lsn': await primary_lsn()})).scalar()
+    except Exception:
+        caught_up = False
+    if caught_up:
+        yield db
+        return
+    
+    read_router.record_stale_fallback()
+    async with AsyncSessionLocal() as primary:
+        yield primary
+
+def get_database_stats():
+    """Read routing decisions and connection pool usage per target"""
+    pools = {
+        'primary': pool_status(engine),
+        'async_primary': pool_status(async_engine.sync_engine)
+    }
+    if async_replica_engine is not None:
+        pools['async_replica'] = pool_status(async_replica_engine.sync_engine)
+    return {
+        'routing': read_router.get_stats(),
+        'pools': pools
+    }
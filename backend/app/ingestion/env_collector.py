@@ -11,6 +11,10 @@ from typing import List, Dict, Optional
 from sqlalchemy.orm import Session
 from app.models import EnvironmentalData, CityZone
 from app.database import get_db
+from app.services.response_cache import response_cache, ENVIRONMENTAL
+from app.services.live_updates import live_updates
+from app.services.alert_stream import alert_stream
+from app.services.tracing import tracer
 # PostGIS functions removed - using WKT text instead
 from decimal import Decimal
 import pytz
@@ -137,8 +141,26 @@ class MockEnvironmentalCollector:
                 
                 db.add(env_data)
             
-            db.commit()
+            with tracer.span("db.commit", readings=len(data_points)):
+                db.commit()
             logger.info(f"Stored {len(data_points)} environmental data points to database")
+            
+            with tracer.span("ingest.alerts"):
+                # Score the new readings against their zones' baselines before readers are told about them
+                alerts = alert_stream.observe_readings(db, [
+                    (data_point['zone_id'], data_point['data_type'], data_point['created_at'], round(data_point['value'], 2))
+                    for data_point in data_points
+                ])
+            
+            with tracer.span("ingest.publish"):
+                # Invalidate cached responses that read these zones
+                response_cache.publish_invalidation(ENVIRONMENTAL, [data_point['zone_id'] for data_point in data_points])
+                # Push the new readings to live stream subscribers
+                live_updates.publish_environmental([
+                    {k: data_point[k] for k in ('zone_id', 'data_type', 'value', 'unit', 'created_at')}
+                    for data_point in data_points
+                ])
+                live_updates.publish_alerts(alerts)
             return True
             
         except Exception as e:
@@ -152,16 +174,19 @@ class MockEnvironmentalCollector:
         
         while True:
             try:
-                # Collect environmental data
-                data_points = await self.collect_and_process()
+                with tracer.span("ingest.environment") as cycle:
+                    # Collect environmental data
+                    data_points = await self.collect_and_process()
                 
-                if data_points:
-                    # Store to database
-                    success = await self.store_to_database(data_points)
-                    if success:
-                        logger.info(f"Environmental collection cycle completed successfully")
-                    else:
-                        logger.error("Environmental collection cycle failed to store data")
+                    if data_points:
+                        # Store to database
+                        with tracer.span("ingest.store", readings=len(data_points)):
+                            success = await self.store_to_database(data_points)
+                        cycle.set_attribute('stored', success)
+                        if success:
+                            logger.info(f"Environmental collection cycle completed successfully")
+                        else:
+                            logger.error("Environmental collection cycle failed to store data")
                 
                 # Wait for next cycle
                 await asyncio.sleep(interval_seconds)
@@ -1,12 +1,18 @@
 import asyncio
 import random
 import logging
+import time
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from sqlalchemy.orm import Session
 from app.models import SocialPost, EmotionAnalysis, CityZone
 from app.ml.emotion_service import emotion_service
 from app.database import get_db
+from app.services.response_cache import response_cache, SOCIAL
+from app.services.live_updates import live_updates
+from app.services.forecast_cache import forecast_cache
+from app.services.alert_stream import alert_stream
+from app.services.tracing import tracer
 import pytz
 
 logger = logging.getLogger(__name__)
@@ -77,18 +83,23 @@ class MockSocialCollector:
         """Collect mock posts and process them through emotion analysis"""
         try:
             # Generate mock posts
-            posts = [self.generate_mock_post() for _ in range(batch_size)]
+            with tracer.span("ingest.collect", posts=batch_size):
+                posts = [self.generate_mock_post() for _ in range(batch_size)]
+            collected_ns = time.time_ns()
             
             # Process emotions
             texts = [post['content'] for post in posts]
-            emotion_results = emotion_service.batch_analyze_emotions(texts)
+            with tracer.span("ingest.emotion", texts=len(texts)):
+                emotion_results = emotion_service.batch_analyze_emotions(texts)
+            analyzed_ns = time.time_ns()
             
-            # Combine posts with emotion results
+            # Combine posts with emotion results; timings follow each post until it is visible
             processed_posts = []
             for post, emotion in zip(posts, emotion_results):
                 processed_post = {
                     'social_post': post,
-                    'emotion_analysis': emotion
+                    'emotion_analysis': emotion,
+                    'timings': {'collected_ns': collected_ns, 'analyzed_ns': analyzed_ns}
                 }
                 processed_posts.append(processed_post)
             
@@ -103,6 +114,7 @@ class MockSocialCollector:
         """Store processed posts and emotion analysis to database"""
         try:
             db = next(get_db())
+            live_posts = []
             
             for item in processed_posts:
                 # Create social post
@@ -121,7 +133,10 @@ class MockSocialCollector:
                     social_post.location = f"POINT({item['social_post']['lon']} {item['social_post']['lat']})"
                 
                 db.add(social_post)
-                db.flush()  # Get the ID
+                with tracer.span("db.flush"):
+                    db.flush()  # Get the ID
+                item['post_id'] = social_post.id
+                item['timings']['flushed_ns'] = time.time_ns()
                 
                 # Create emotion analysis
                 emotion_analysis = EmotionAnalysis(
@@ -140,9 +155,44 @@ class MockSocialCollector:
                 )
                 
                 db.add(emotion_analysis)
+                
+                live_posts.append({
+                    'id': social_post.id,
+                    **{k: item['social_post'][k] for k in ('content', 'source', 'zone_id', 'lat', 'lon', 'created_at')},
+                    'emotion_analysis': {
+                        'mood_index': float(item['emotion_analysis']['mood_index']),
+                        'dominant_emotion': item['emotion_analysis']['dominant_emotion'],
+                        **{e: float(item['emotion_analysis'][e]) for e in ('joy', 'sadness', 'anger', 'fear', 'surprise', 'disgust', 'neutral')}
+                    }
+                })
             
-            db.commit()
+            with tracer.span("db.commit", posts=len(processed_posts)):
+                db.commit()
             logger.info(f"Stored {len(processed_posts)} posts to database")
+            
+            # Committed posts are visible to API readers; record how long each took to get here
+            visible_ns = time.time_ns()
+            for item, live_post in zip(processed_posts, live_posts):
+                item['timings']['visible_ns'] = visible_ns
+                live_post['ingest_latency_ms'] = round((visible_ns - item['timings']['collected_ns']) / 1e6, 1)
+            
+            with tracer.span("ingest.alerts"):
+                # Score the new moods against their zones' baselines before readers are told about them
+                alerts = alert_stream.observe_posts(db, [
+                    (item['social_post']['zone_id'], item['social_post']['created_at'], float(item['emotion_analysis']['mood_index']))
+                    for item in processed_posts
+                ])
+            
+            with tracer.span("ingest.publish"):
+                # Invalidate cached responses that read these zones
+                response_cache.publish_invalidation(SOCIAL, [item['social_post']['zone_id'] for item in processed_posts])
+                # Advance the forecast watermark; posts for already closed hours invalidate those forecasts
+                forecast_cache.record_ingest([
+                    (item['social_post']['zone_id'], item['social_post']['created_at']) for item in processed_posts
+                ])
+                # Push the new posts to live stream subscribers
+                live_updates.publish_posts(live_posts)
+                live_updates.publish_alerts(alerts)
             return True
             
         except Exception as e:
@@ -150,22 +200,45 @@ class MockSocialCollector:
             db.rollback()
             return False
     
+    def _trace_posts(self, processed_posts: List[Dict]):
+        """One span per stored post, from collection until it became visible"""
+        for item in processed_posts:
+            timings = item['timings']
+            if 'visible_ns' not in timings:
+                continue
+            collected_ns = timings['collected_ns']
+            attributes = {
+                'post.id': item['post_id'],
+                'post.source': item['social_post']['source'],
+                'ingest.analyzed_ms': (timings['analyzed_ns'] - collected_ns) / 1e6,
+                'ingest.flushed_ms': (timings['flushed_ns'] - collected_ns) / 1e6,
+                'ingest.visible_ms': (timings['visible_ns'] - collected_ns) / 1e6
+            }
+            if item['social_post']['zone_id'] is not None:
+                attributes['zone.id'] = item['social_post']['zone_id']
+            tracer.start_span("ingest.post", start_ns=collected_ns, **attributes).end(timings['visible_ns'])
+    
     async def run_collection_cycle(self, interval_seconds: int = 10):
         """Run continuous collection cycle"""
         logger.info(f"Starting social media collection cycle (interval: {interval_seconds}s)")
         
         while True:
             try:
-                # Collect and process posts
-                processed_posts = await self.collect_and_process()
+                with tracer.span("ingest.social") as cycle:
+                    # Collect and process posts
+                    processed_posts = await self.collect_and_process()
                 
-                if processed_posts:
-                    # Store to database
-                    success = await self.store_to_database(processed_posts)
-                    if success:
-                        logger.info(f"Collection cycle completed successfully")
-                    else:
-                        logger.error("Collection cycle failed to store data")
+                    if processed_posts:
+                        # Store to database
+                        with tracer.span("ingest.store", posts=len(processed_posts)):
+                            success = await self.store_to_database(processed_posts)
+                        cycle.set_attribute('stored', success)
+                        if success:
+                            if tracer.enabled:
+                                self._trace_posts(processed_posts)
+                            logger.info(f"Collection cycle completed successfully")
+                        else:
+                            logger.error("Collection cycle failed to store data")
                 
                 # Wait for next cycle
                 await asyncio.sleep(interval_seconds)
@@ -0,0 +1,220 @@
+"""
+Anomaly detection for City Pulse application
+Per-hour z-score checks on mood indices and range checks on environmental
+readings, per value or vectorized over grouped pandas frames. The range
+thresholds are shared with the streaming detector in
+app/services/alert_stream.py.
+Multivariate scoring describes each zone-hour by its mood statistics and
+the mean of every environmental data type, and scores it with an
+Isolation Forest trained on a sliding window of recent zone-hours; the
+anomaly_scoring job (app/services/anomaly_scoring.py) trains, persists
+and applies it.
+"""
+
+import os
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple, TYPE_CHECKING
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from app.models import EmotionAnalysis, EnvironmentalData
+
+# pandas and scikit-learn are imported on first use to keep API startup fast
+if TYPE_CHECKING:
+    import pandas as pd
+
+class AnomalyDetector:
+    """Mood z-score checks, environmental range checks and the zone-hour Isolation Forest"""
+    
+    # Valid (low, high) range for each ingested data_type, in the units the collector stores
+    ENV_THRESHOLDS = {
+        'air_quality': (0, 150),      # AQI - above 150 is unhealthy for everyone (EPA)
+        'temperature': (-20, 45),     # °C - reasonable range
+        'humidity': (0, 100),         # % - valid range
+        'noise_level': (30, 85),      # dB - 85 dB is the occupational exposure limit (NIOSH)
+        'wind_speed': (0, 30),        # m/s - storm force above this
+        'precipitation': (0, 50),     # mm/h - violent rain above this
+        'uv_index': (0, 11),          # index - extreme above 11
+        'pressure': (900, 1100)       # hPa - reasonable range
+    }
+    
+    def __init__(self):
+        self.contamination = float(os.getenv("ANOMALY_CONTAMINATION", "0.02"))
+        self.n_estimators = int(os.getenv("ANOMALY_ESTIMATORS", "100"))
+        self.scaler = None
+        self.model = None
+        # Feature names, imputation medians and training window of the fitted model
+        self.model_info: Optional[Dict[str, Any]] = None
+    
+    def fit_isolation_forest(self, features: np.ndarray, feature_names: List[str], trained_until: datetime) -> Dict[str, Any]:
+        """Fit the scaler and Isolation Forest to zone-hour feature rows and make them current"""
+        from sklearn.ensemble import IsolationForest
+        from sklearn.preprocessing import StandardScaler
+        
+        # Missing values (no posts, or no reading of a type, that hour) take the column median
+        medians = np.nan_to_num(np.nanmedian(features, axis=0)) if len(features) else np.zeros(len(feature_names))
+        X = np.where(np.isnan(features), medians, features)
+        scaler = StandardScaler().fit(X)
+        model = IsolationForest(
+            n_estimators=self.n_estimators, contamination=self.contamination, random_state=42
+        ).fit(scaler.transform(X))
+        
+        info = {
+            'version': f"isolation-forest-{trained_until.strftime('%Y%m%dT%H%M')}",
+            'feature_names': list(feature_names),
+            'medians': medians.tolist(),
+            'trained_until': trained_until,
+            'training_rows': len(X)
+        }
+        self.scaler, self.model, self.model_info = scaler, model, info
+        return info
+    
+    def score_isolation_forest(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Anomaly scores (higher is more anomalous) and anomaly flags for feature rows, in one batch"""
+        X = np.where(np.isnan(features), np.array(self.model_info['medians']), features)
+        scores = -self.model.score_samples(self.scaler.transform(X))
+        # Same cut as IsolationForest.predict: the contamination quantile of the training scores
+        return scores, scores > -self.model.offset_
+    
+    def save_model(self, path: str):
+        import joblib
+        
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Written aside and renamed so a crash never leaves a partial model behind
+        joblib.dump((self.scaler, self.model, self.model_info), path + '.tmp')
+        os.replace(path + '.tmp', path)
+    
+    def load_model(self, path: str) -> bool:
+        """Make the model saved at ``path`` current; False if there is none"""
+        import joblib
+        
+        if not os.path.exists(path):
+            return False
+        self.scaler, self.model, self.model_info = joblib.load(path)
+        return True
+    
+    def detect_mood_anomalies(self, mood_data: List[float], threshold: float = 2.0) -> List[bool]:
+        """Detect anomalies in mood index data using z-score method"""
+        if len(mood_data) < 3:
+            return [False] * len(mood_data)
+        
+        # Calculate z-scores
+        mean_mood = np.mean(mood_data)
+        std_mood = np.std(mood_data)
+        
+        if std_mood == 0:
+            return [False] * len(mood_data)
+        
+        z_scores = [(mood - mean_mood) / std_mood for mood in mood_data]
+        
+        # Mark as anomaly if z-score exceeds threshold
+        anomalies = [abs(z_score) > threshold for z_score in z_scores]
+        
+        return anomalies
+    
+    def detect_environmental_anomalies(self, env_data: List[float], data_type: str) -> List[bool]:
+        """Detect anomalies in environmental data"""
+        if len(env_data) < 3:
+            return [False] * len(env_data)
+        
+        # Get thresholds for this data type
+        if data_type not in self.ENV_THRESHOLDS:
+            return [False] * len(env_data)
+        min_val, max_val = self.ENV_THRESHOLDS[data_type]
+        
+        return [value < min_val or value > max_val for value in env_data]
+    
+    def flag_mood_groups(self, frame: 'pd.DataFrame', group_keys: List[str], threshold: float = 2.0) -> 'pd.Series':
+        """Vectorized z-score flags for every group in ``frame`` at once.
+        
+        Equivalent to calling ``detect_mood_anomalies`` on each group's
+        ``mood_index`` values, but computed with one groupby transform.
+        """
+        grouped = frame.groupby(group_keys, sort=False)['mood_index']
+        mean = grouped.transform('mean')
+        std = grouped.transform('std', ddof=0)
+        count = grouped.transform('size')
+        
+        z_scores = (frame['mood_index'] - mean).abs() / std.where(std > 0)
+        return (count >= 3) & (z_scores > threshold).fillna(False)
+    
+    def env_bounds(self) -> Dict[str, Tuple[float, float]]:
+        """Valid (low, high) range per ingested data type"""
+        return dict(self.ENV_THRESHOLDS)
+    
+    def flag_environmental_groups(self, frame: 'pd.DataFrame', group_keys: List[str]) -> 'pd.Series':
+        """Vectorized range flags for every group in ``frame`` at once.
+        
+        A value is out of range if it falls outside the valid range for its
+        data type; types without a range are never flagged.
+        """
+        bounds = self.env_bounds()
+        lower = frame['data_type'].map({k: v[0] for k, v in bounds.items()})
+        upper = frame['data_type'].map({k: v[1] for k, v in bounds.items()})
+        count = frame.groupby(group_keys, sort=False)['value'].transform('size')
+        
+        out_of_range = (frame['value'] < lower) | (frame['value'] > upper)
+        return (count >= 3) & lower.notna() & out_of_range
+
+# Mood statistics at the start of every feature row; one mean per environmental data type follows
+MOOD_FEATURES = ['mood_mean', 'mood_std', 'mood_min', 'mood_max', 'post_count']
+
+def hourly_features(
+    db: Session,
+    since: datetime,
+    until: datetime,
+    data_types: Optional[List[str]] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]:
+    """Feature rows for every zone-hour with posts or readings in [since, until), from two grouped queries.
+    
+    Environmental columns cover ``data_types`` (every type seen in the window if omitted).
+    Returns (zone_ids, hour starts in epoch seconds, features, feature names), sorted by
+    zone then hour; statistics a zone-hour has no data for are NaN.
+    """
+    mood_hour = func.date_trunc('hour', EmotionAnalysis.created_at)
+    mood_rows = db.execute(select(
+        EmotionAnalysis.zone_id, func.extract('epoch', mood_hour),
+        func.avg(EmotionAnalysis.mood_index), func.stddev_pop(EmotionAnalysis.mood_index),
+        func.min(EmotionAnalysis.mood_index), func.max(EmotionAnalysis.mood_index), func.count()
+    ).where(
+        EmotionAnalysis.zone_id.isnot(None),
+        EmotionAnalysis.created_at >= since,
+        EmotionAnalysis.created_at < until
+    ).group_by(EmotionAnalysis.zone_id, mood_hour)).all()
+    
+    env_hour = func.date_trunc('hour', EnvironmentalData.created_at)
+    env_query = select(
+        EnvironmentalData.zone_id, func.extract('epoch', env_hour), EnvironmentalData.data_type,
+        func.avg(EnvironmentalData.value)
+    ).where(
+        EnvironmentalData.zone_id.isnot(None),
+        EnvironmentalData.created_at >= since,
+        EnvironmentalData.created_at < until
+    )
+    if data_types is not None:
+        env_query = env_query.where(EnvironmentalData.data_type.in_(data_types))
+    env_rows = db.execute(env_query.group_by(EnvironmentalData.zone_id, env_hour, EnvironmentalData.data_type)).all()
+    
+    if data_types is None:
+        data_types = sorted({row[2] for row in env_rows})
+    feature_names = MOOD_FEATURES + data_types
+    if not mood_rows and not env_rows:
+        return np.empty(0, dtype=int), np.empty(0), np.empty((0, len(feature_names))), feature_names
+    
+    mood = np.array([row[:2] + tuple(float(v) if v is not None else np.nan for v in row[2:]) for row in mood_rows], dtype=float).reshape(-1, 7)
+    env_keys = np.array([row[:2] for row in env_rows], dtype=float).reshape(-1, 2)
+    env_columns = np.array([data_types.index(row[2]) for row in env_rows], dtype=int)
+    env_values = np.array([row[3] for row in env_rows], dtype=float)
+    
+    # One row per distinct (zone, hour), ordered by zone then hour
+    keys, rows = np.unique(np.concatenate([mood[:, :2], env_keys]), axis=0, return_inverse=True)
+    rows = rows.reshape(-1)
+    features = np.full((len(keys), len(feature_names)), np.nan)
+    features[:, MOOD_FEATURES.index('post_count')] = 0
+    features[rows[:len(mood)], :len(MOOD_FEATURES)] = mood[:, 2:]
+    features[rows[len(mood):], len(MOOD_FEATURES) + env_columns] = env_values
+    return keys[:, 0].astype(int), keys[:, 1], features, feature_names
+
+# Global anomaly detector instance
+anomaly_detector = AnomalyDetector()
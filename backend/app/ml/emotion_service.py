@@ -1,10 +1,10 @@
-import torch
-from transformers import pipeline
 import logging
+import threading
 from typing import Dict, List, Tuple
 import numpy as np
 from decimal import Decimal
 import os
+from app.services.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
@@ -13,26 +13,56 @@ class EmotionDetectionService:
         self.model_name = "j-hartmann/emotion-english-distilroberta-base"
         self.emotion_labels = ['joy', 'sadness', 'anger', 'fear', 'surprise', 'disgust', 'neutral']
         self.pipeline = None
-        self._load_model()
+        self.device = None
+        # The model is loaded on first use (or by the startup warm-up), so
+        # importing this module does not pull in torch and transformers
+        self._load_lock = threading.Lock()
+    
+    def ensure_loaded(self):
+        """Load the model if it is not loaded yet; safe to call from any thread"""
+        if self.pipeline is None:
+            with self._load_lock:
+                if self.pipeline is None:
+                    self._load_model()
     
     def _load_model(self):
         """Load the emotion detection model"""
         try:
+            import torch
+            from transformers import pipeline
+            
             # Check if CUDA is available
             device = 0 if torch.cuda.is_available() else -1
             logger.info(f"Loading emotion model on device: {device}")
             
-            self.pipeline = pipeline(
+            emotion_pipeline = pipeline(
                 "text-classification",
                 model=self.model_name,
                 device=device,
                 return_all_scores=True
             )
             logger.info("Emotion model loaded successfully")
+            
+            if tracer.enabled:
+                self._trace_pipeline_stages(emotion_pipeline)
+            self.device = 'cuda' if device == 0 else 'cpu'
+            self.pipeline = emotion_pipeline
         except Exception as e:
             logger.error(f"Failed to load emotion model: {e}")
             raise
     
+    def _trace_pipeline_stages(self, emotion_pipeline):
+        """Time the pipeline's tokenization, forward pass and postprocessing as spans"""
+        def traced(stage, span_name):
+            def run_stage(*args, **kwargs):
+                with tracer.span(span_name):
+                    return stage(*args, **kwargs)
+            return run_stage
+        
+        # Pipeline.run_single calls these through the instance, so wrapping them here times every call
+        for method, span_name in [('preprocess', 'emotion.tokenize'), ('forward', 'emotion.inference'), ('postprocess', 'emotion.postprocess')]:
+            setattr(emotion_pipeline, method, traced(getattr(emotion_pipeline, method), span_name))
+    
     def analyze_emotion(self, text: str) -> Dict:
         """
         Analyze emotion in text and return detailed results
@@ -47,8 +77,11 @@ class EmotionDetectionService:
             if not text or len(text.strip()) == 0:
                 raise ValueError("Text cannot be empty")
             
+            self.ensure_loaded()
+            
             # Get emotion predictions
-            results = self.pipeline(text)
+            with tracer.span("emotion.analyze", **{'text.length': len(text)}):
+                results = self.pipeline(text)
             
             # Extract scores for each emotion
             emotion_scores = {}
@@ -103,6 +136,9 @@ class EmotionDetectionService:
         Returns:
             List[Dict]: List of emotion analysis results
         """
+        # A model that cannot load fails the batch rather than every text falling back to neutral
+        self.ensure_loaded()
+        
         results = []
         for text in texts:
             try:
@@ -131,7 +167,7 @@ class EmotionDetectionService:
         return {
             'model_name': self.model_name,
             'emotion_labels': self.emotion_labels,
-            'device': 'cuda' if torch.cuda.is_available() else 'cpu',
+            'device': self.device,
             'loaded': self.pipeline is not None
         }
 
@@ -0,0 +1,411 @@
+"""
+Mood forecasting for City Pulse application
+Fits a linear trend-and-lag model to a zone's hourly mood averages and
+extrapolates it. Forecasts are fitted on closed hours only, so they change
+when an hour closes or late data lands in a closed hour, not with every
+post; app/services/forecast_cache.py caches them on that basis.
+The city forecast fits every zone at once: one grouped query loads all
+zones' hourly series and BatchForecaster solves the same model for all
+of them, and predicts all horizons, as NumPy array operations.
+The functions here take a sync Session; API requests run them through
+``AsyncSession.run_sync`` and background jobs pass a plain session.
+"""
+
+from fastapi import HTTPException
+from sqlalchemy import select, func, cast, Numeric
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+import pytz
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+
+from app.models import CityZone, EmotionAnalysis
+
+# Part of every cached forecast's key; bump when the model or its inputs change
+MODEL_VERSION = "linear-lag-1"
+
+# Closed hours of history each forecast is fitted on
+HISTORY = timedelta(days=7)
+
+class SimpleForecaster:
+    """Simple forecasting using linear regression on recent trends"""
+    
+    def prepare_features(self, time_series_data: List[Dict]) -> tuple:
+        """Prepare features for forecasting"""
+        if len(time_series_data) < 3:
+            return None, None
+        
+        # Extract mood indices and create time features
+        mood_indices = [point['mood_index'] for point in time_series_data]
+        timestamps = [datetime.fromisoformat(point['timestamp'].replace('Z', '+00:00')) for point in time_series_data]
+        
+        # Create time-based features
+        base_time = timestamps[0]
+        time_features = []
+        for ts in timestamps:
+            hours_since_base = (ts - base_time).total_seconds() / 3600
+            time_features.append([hours_since_base])
+        
+        # Create lag features (previous values)
+        lag_features = []
+        for i in range(len(mood_indices)):
+            if i == 0:
+                lag_features.append([mood_indices[0]])
+            else:
+                lag_features.append([mood_indices[i-1]])
+        
+        # Combine features
+        X = np.hstack([time_features, lag_features])
+        y = np.array(mood_indices)
+        
+        return X, y
+    
+    def fit(self, time_series_data: List[Dict]) -> Optional[tuple]:
+        """Fit the scaler and regression to a series; None if it is too short"""
+        X, y = self.prepare_features(time_series_data)
+        if X is None or len(X) < 3:
+            return None
+        
+        # Fitted per call: requests and the precompute job forecast concurrently.
+        # Imported here so API startup does not load scikit-learn
+        from sklearn.linear_model import LinearRegression
+        from sklearn.preprocessing import StandardScaler
+        scaler = StandardScaler()
+        model = LinearRegression()
+        
+        # Scale features
+        X_scaled = scaler.fit_transform(X)
+        
+        # Train model
+        model.fit(X_scaled, y)
+        return scaler, model
+    
+    def predict(self, fitted: tuple, time_series_data: List[Dict], hours_ahead: int = 24) -> List[Dict]:
+        """Forecast the N hours after a series from its ``fit``"""
+        scaler, model = fitted
+        
+        # Generate future time points
+        last_timestamp = datetime.fromisoformat(time_series_data[-1]['timestamp'].replace('Z', '+00:00'))
+        base_timestamp = datetime.fromisoformat(time_series_data[0]['timestamp'].replace('Z', '+00:00'))
+        
+        forecasts = []
+        for hour in range(1, hours_ahead + 1):
+            future_time = last_timestamp + timedelta(hours=hour)
+            hours_since_base = (future_time - base_timestamp).total_seconds() / 3600
+            
+            # Create feature vector for this future time
+            last_mood = time_series_data[-1]['mood_index']
+            future_X = np.array([[hours_since_base, last_mood]])
+            future_X_scaled = scaler.transform(future_X)
+            
+            # Predict
+            predicted_mood = model.predict(future_X_scaled)[0]
+            
+            # Ensure prediction is within valid range
+            predicted_mood = max(0, min(100, predicted_mood))
+            
+            forecasts.append({
+                'timestamp': future_time.isoformat(),
+                'predicted_mood_index': round(predicted_mood, 2),
+                'confidence': 0.7  # Simple confidence score
+            })
+        
+        return forecasts
+    
+    def forecast(self, time_series_data: List[Dict], hours_ahead: int = 24) -> List[Dict]:
+        """Generate forecast for the next N hours"""
+        try:
+            fitted = self.fit(time_series_data)
+            if fitted is None:
+                # Not enough data, return simple trend
+                return self._simple_trend_forecast(time_series_data, hours_ahead)
+            return self.predict(fitted, time_series_data, hours_ahead)
+        
+        except Exception as e:
+            # Fallback to simple trend
+            return self._simple_trend_forecast(time_series_data, hours_ahead)
+    
+    def _simple_trend_forecast(self, time_series_data: List[Dict], hours_ahead: int) -> List[Dict]:
+        """Simple trend-based forecast when ML model fails"""
+        if len(time_series_data) < 2:
+            return []
+        
+        # Calculate simple trend
+        recent_moods = [point['mood_index'] for point in time_series_data[-3:]]
+        if len(recent_moods) >= 2:
+            trend = (recent_moods[-1] - recent_moods[0]) / (len(recent_moods) - 1)
+        else:
+            trend = 0
+        
+        # Generate forecasts
+        last_timestamp = datetime.fromisoformat(time_series_data[-1]['timestamp'].replace('Z', '+00:00'))
+        last_mood = time_series_data[-1]['mood_index']
+        
+        forecasts = []
+        for hour in range(1, hours_ahead + 1):
+            future_time = last_timestamp + timedelta(hours=hour)
+            predicted_mood = last_mood + (trend * hour)
+            predicted_mood = max(0, min(100, predicted_mood))
+            
+            forecasts.append({
+                'timestamp': future_time.isoformat(),
+                'predicted_mood_index': round(predicted_mood, 2),
+                'confidence': 0.5  # Lower confidence for simple trend
+            })
+        
+        return forecasts
+
+class BatchForecaster:
+    """SimpleForecaster's model fitted for many zones at once.
+    
+    Each zone's least-squares fit of mood on hours since its first point and
+    the previous point's mood (plus an intercept) is solved in closed form from
+    its centred 2x2 normal equations, for all zones in one stacked solve.
+    Zones with two points get the simple trend, with one point no forecast.
+    """
+    
+    def fit(self, zone_ids: np.ndarray, hours: np.ndarray, moods: np.ndarray) -> Dict[str, np.ndarray]:
+        """Fit every zone from flat arrays sorted by zone, then hour.
+        
+        ``hours`` are the hours' start times in epoch seconds, ``moods`` their average mood indices.
+        """
+        zones, starts, counts = np.unique(zone_ids, return_index=True, return_counts=True)
+        ends = starts + counts - 1
+        
+        # Lay the series out as zones x points, padded past each zone's end
+        row = np.repeat(np.arange(len(zones)), counts)
+        col = np.arange(len(zone_ids)) - np.repeat(starts, counts)
+        lags = np.concatenate([moods[:1], moods[:-1]])
+        lags[starts] = moods[starts]
+        
+        shape = (len(zones), counts.max())
+        mask = np.zeros(shape)
+        mask[row, col] = 1
+        X = np.zeros(shape + (2,))
+        X[row, col, 0] = (hours - hours[starts][row]) / 3600
+        X[row, col, 1] = lags
+        y = np.zeros(shape)
+        y[row, col] = moods
+        
+        # Centre on each zone's means so the intercept drops out of the solve
+        n = counts.astype(float)
+        X_mean = X.sum(axis=1) / n[:, None]
+        y_mean = y.sum(axis=1) / n
+        Xc = (X - X_mean[:, None, :]) * mask[..., None]
+        yc = (y - y_mean[:, None]) * mask
+        XtX = np.einsum('znk,znl->zkl', Xc, Xc)
+        Xty = np.einsum('znk,zn->zk', Xc, yc)
+        # pinv keeps zones with a constant feature (e.g. a flat series) solvable
+        coef = np.einsum('zkl,zl->zk', np.linalg.pinv(XtX), Xty)
+        
+        # Simple trend over the last (up to) three points
+        first_recent = np.maximum(starts, ends - 2)
+        last_mood = moods[ends]
+        return {
+            'zones': zones,
+            'counts': counts,
+            'last_hour': hours[ends],
+            'last_t': X[np.arange(len(zones)), counts - 1, 0],
+            'last_mood': last_mood,
+            'intercept': y_mean - (coef * X_mean).sum(axis=1),
+            'coef': coef,
+            'trend': (last_mood - moods[first_recent]) / np.maximum(ends - first_recent, 1)
+        }
+    
+    def predict(self, fitted: Dict[str, np.ndarray], hours_ahead: int = 24) -> Dict[int, List[Dict]]:
+        """Forecast the N hours after each zone's last point from a ``fit``"""
+        counts, last_mood = fitted['counts'], fitted['last_mood']
+        
+        # Future points keep the last observed mood as their lag
+        steps = np.arange(1, hours_ahead + 1)
+        coef = fitted['coef']
+        modelled = fitted['intercept'][:, None] + coef[:, :1] * (fitted['last_t'][:, None] + steps) + (coef[:, 1] * last_mood)[:, None]
+        trended = last_mood[:, None] + fitted['trend'][:, None] * steps
+        
+        predictions = np.round(np.clip(np.where((counts >= 3)[:, None], modelled, trended), 0, 100), 2).tolist()
+        confidences = np.where(counts >= 3, 0.7, 0.5).tolist()
+        
+        timestamps = {}
+        forecasts = {}
+        for i, (zone_id, last_hour) in enumerate(zip(fitted['zones'].tolist(), fitted['last_hour'].tolist())):
+            if counts[i] < 2:
+                forecasts[zone_id] = []
+                continue
+            if last_hour not in timestamps:
+                timestamps[last_hour] = [
+                    datetime.fromtimestamp(last_hour + 3600 * step, pytz.UTC).isoformat() for step in steps.tolist()
+                ]
+            forecasts[zone_id] = [
+                {'timestamp': timestamp, 'predicted_mood_index': predicted, 'confidence': confidences[i]}
+                for timestamp, predicted in zip(timestamps[last_hour], predictions[i])
+            ]
+        return forecasts
+    
+    def forecast(self, zone_ids: np.ndarray, hours: np.ndarray, moods: np.ndarray, hours_ahead: int = 24) -> Dict[int, List[Dict]]:
+        """Forecast every zone from flat arrays sorted by zone, then hour"""
+        if len(zone_ids) == 0:
+            return {}
+        return self.predict(self.fit(zone_ids, hours, moods), hours_ahead)
+
+# Global forecaster instances
+forecaster = SimpleForecaster()
+batch_forecaster = BatchForecaster()
+
+def hourly_series(db: Session, zone_id: int, closed_until: datetime) -> List[Dict]:
+    """Hourly mood averages for a zone over the closed hours of history before ``closed_until``"""
+    rows = db.execute(select(EmotionAnalysis.created_at, EmotionAnalysis.mood_index).where(
+        EmotionAnalysis.zone_id == zone_id,
+        EmotionAnalysis.created_at >= closed_until - HISTORY,
+        EmotionAnalysis.created_at < closed_until
+    ).order_by(EmotionAnalysis.created_at)).all()
+    
+    # Group by hour and calculate averages
+    hourly_data = {}
+    for created_at, mood_index in rows:
+        hour_key = created_at.replace(minute=0, second=0, microsecond=0)
+        if hour_key not in hourly_data:
+            hourly_data[hour_key] = []
+        hourly_data[hour_key].append(float(mood_index))
+    
+    # Convert to time series format
+    time_series = []
+    for hour, mood_indices in sorted(hourly_data.items()):
+        avg_mood = sum(mood_indices) / len(mood_indices)
+        time_series.append({
+            'timestamp': hour.isoformat(),
+            'mood_index': round(avg_mood, 2)
+        })
+    return time_series
+
+def hourly_arrays(
+    db: Session,
+    closed_until: datetime,
+    since: Optional[datetime] = None,
+    zone_ids: Optional[List[int]] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Every zone's hourly mood averages before ``closed_until`` in one grouped query.
+    
+    Covers HISTORY unless ``since`` is given, and every zone unless ``zone_ids`` are.
+    Returns flat (zone_ids, hour starts in epoch seconds, moods) arrays sorted by zone, then hour.
+    """
+    hour = func.date_trunc('hour', EmotionAnalysis.created_at)
+    query = select(
+        EmotionAnalysis.zone_id,
+        func.extract('epoch', hour),
+        # avg() of the compact REAL column is double precision, which round() can't take a scale for
+        func.round(cast(func.avg(EmotionAnalysis.mood_index), Numeric), 2)
+    ).where(
+        EmotionAnalysis.zone_id.isnot(None),
+        EmotionAnalysis.created_at >= (since or closed_until - HISTORY),
+        EmotionAnalysis.created_at < closed_until
+    )
+    if zone_ids is not None:
+        query = query.where(EmotionAnalysis.zone_id.in_(zone_ids))
+    rows = db.execute(query.group_by(EmotionAnalysis.zone_id, hour).order_by(EmotionAnalysis.zone_id, hour)).all()
+    
+    if not rows:
+        return np.empty(0, dtype=int), np.empty(0), np.empty(0)
+    zone_ids, hours, moods = zip(*rows)
+    return np.array(zone_ids), np.array(hours, dtype=float), np.array(moods, dtype=float)
+
+def zone_forecast(db: Session, zone_id: int, hours_ahead: int, closed_until: datetime) -> Dict[str, Any]:
+    """Forecast one zone from the hours closed before ``closed_until``"""
+    zone = db.scalar(select(CityZone).where(CityZone.id == zone_id))
+    if not zone:
+        raise HTTPException(status_code=404, detail="Zone not found")
+    
+    time_series = hourly_series(db, zone_id, closed_until)
+    if not time_series:
+        raise HTTPException(status_code=400, detail="Insufficient data for forecasting")
+    
+    return {
+        'zone_id': zone_id,
+        'zone_name': zone.name,
+        'historical_data_points': len(time_series),
+        'forecast_hours': hours_ahead,
+        'forecast': forecaster.forecast(time_series, hours_ahead),
+        'model_version': MODEL_VERSION,
+        'inputs_until': closed_until.isoformat(),
+        'generated_at': datetime.now(pytz.UTC).isoformat()
+    }
+
+def city_response(
+    zone_forecasts: Dict[int, List[Dict]],
+    total_zones: int,
+    hours_ahead: int,
+    model_version: str,
+    closed_until: datetime,
+    generated_at: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """The city forecast response for per-zone forecasts, with the city average per hour"""
+    city_forecast = []
+    
+    for zone_id, zone_forecast in zone_forecasts.items():
+        # Add to city forecast
+        for i, forecast_point in enumerate(zone_forecast):
+            if i >= len(city_forecast):
+                city_forecast.append({
+                    'timestamp': forecast_point['timestamp'],
+                    'zone_moods': {},
+                    'city_average': 0.0
+                })
+            
+            city_forecast[i]['zone_moods'][zone_id] = forecast_point['predicted_mood_index']
+    
+    # Calculate city averages
+    for forecast_point in city_forecast:
+        if forecast_point['zone_moods']:
+            avg_mood = sum(forecast_point['zone_moods'].values()) / len(forecast_point['zone_moods'])
+            forecast_point['city_average'] = round(avg_mood, 2)
+    
+    return {
+        'forecast_hours': hours_ahead,
+        'total_zones': total_zones,
+        'zones_with_data': len(zone_forecasts),
+        'city_forecast': city_forecast,
+        'zone_forecasts': zone_forecasts,
+        'model_version': model_version,
+        'inputs_until': closed_until.isoformat(),
+        'generated_at': (generated_at or datetime.now(pytz.UTC)).isoformat()
+    }
+
+def count_zones(db: Session) -> int:
+    total_zones = db.scalar(select(func.count(CityZone.id)))
+    if not total_zones:
+        raise HTTPException(status_code=404, detail="No zones found")
+    return total_zones
+
+def city_forecast(db: Session, hours_ahead: int, closed_until: datetime) -> Dict[str, Any]:
+    """Forecast every zone and the city average from the hours closed before ``closed_until``"""
+    total_zones = count_zones(db)
+    # Forecast all zones with history in one fit
+    zone_forecasts = batch_forecaster.forecast(*hourly_arrays(db, closed_until), hours_ahead)
+    return city_response(zone_forecasts, total_zones, hours_ahead, MODEL_VERSION, closed_until)
+
+def input_signatures(db: Session, closed_until: datetime) -> Dict[int, str]:
+    """Per-zone fingerprint of the posts a forecast at ``closed_until`` is fitted on.
+    
+    It changes when an hour with posts closes, late posts land or old posts leave the window.
+    """
+    rows = db.execute(select(
+        EmotionAnalysis.zone_id,
+        func.count(),
+        func.sum(EmotionAnalysis.mood_index),
+        func.min(EmotionAnalysis.created_at),
+        func.max(EmotionAnalysis.created_at)
+    ).where(
+        EmotionAnalysis.zone_id.isnot(None),
+        EmotionAnalysis.created_at >= closed_until - HISTORY,
+        EmotionAnalysis.created_at < closed_until
+    ).group_by(EmotionAnalysis.zone_id)).all()
+    return {
+        zone_id: f"{count}:{total}:{first.timestamp()}:{last.timestamp()}"
+        for zone_id, count, total, first, last in rows
+    }
+
+def forecast_zones(db: Session, zone_ids: List[int], hours_ahead: int, closed_until: datetime) -> Dict[int, Tuple[List[Dict], int]]:
+    """Forecasts of ``zone_ids`` fitted together, each with the number of hours it was fitted on"""
+    zones, hours, moods = hourly_arrays(db, closed_until, zone_ids=zone_ids)
+    forecasts = batch_forecaster.forecast(zones, hours, moods, hours_ahead)
+    input_hours = dict(zip(*[values.tolist() for values in np.unique(zones, return_counts=True)]))
+    return {zone_id: (forecast, input_hours[zone_id]) for zone_id, forecast in forecasts.items()}
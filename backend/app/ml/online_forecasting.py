@@ -0,0 +1,203 @@
+"""
+Online mood forecasting for City Pulse application
+Keeps a damped-trend Holt-Winters model with daily seasonality per zone.
+Its state (level, trend and one seasonal term per hour of the day) is
+updated in O(1) as each hour closes and persisted in zone_forecast_states,
+so a forecast is read off the state instead of refitting on history.
+Forecasts start at the hour after the last one folded in, like the
+linear model's start after its last hour with posts.
+The forecast_precompute job folds closed hours in and saves the state;
+requests fold in any closed hours the job has not reached yet without
+saving them. Posts that land in an hour after it was folded in are not
+applied.
+"""
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from datetime import datetime
+import pytz
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+
+from app.ml.forecasting import HISTORY, hourly_arrays, city_response, count_zones
+from app.models import CityZone, ZoneForecastState
+
+# Part of every cached forecast's key and of the persisted state's key
+MODEL_VERSION = "holt-winters-daily-1"
+
+# Smoothing of the level, trend and seasonal terms, and damping of the trend
+ALPHA = 0.3
+BETA = 0.05
+GAMMA = 0.2
+PHI = 0.98
+
+SEASON_HOURS = 24
+
+def damped_steps(steps):
+    """PHI + PHI**2 + ... + PHI**steps, the trend's weight ``steps`` hours ahead"""
+    return PHI * (1 - PHI ** steps) / (1 - PHI)
+
+class HoltWintersState:
+    """One zone's model state; each closed hour is folded in with ``update``"""
+    
+    __slots__ = ('level', 'trend', 'seasonal', 'hours_seen', 'last_hour')
+    
+    def __init__(self, level: float, trend: float, seasonal: List[float], hours_seen: int, last_hour: float):
+        self.level = level
+        self.trend = trend
+        self.seasonal = seasonal
+        self.hours_seen = hours_seen
+        self.last_hour = last_hour  # Start of the last hour folded in, epoch seconds
+    
+    @classmethod
+    def start(cls, hour: float, mood: float) -> 'HoltWintersState':
+        return cls(mood, 0.0, [0.0] * SEASON_HOURS, 1, hour)
+    
+    @classmethod
+    def from_row(cls, row: ZoneForecastState) -> 'HoltWintersState':
+        return cls(row.level, row.trend, list(row.seasonal), row.hours_seen, row.last_hour.timestamp())
+    
+    def to_row(self, zone_id: int) -> Dict[str, Any]:
+        return {
+            'zone_id': zone_id,
+            'model_version': MODEL_VERSION,
+            'level': self.level,
+            'trend': self.trend,
+            'seasonal': self.seasonal,
+            'hours_seen': self.hours_seen,
+            'last_hour': datetime.fromtimestamp(self.last_hour, pytz.UTC),
+            'updated_at': datetime.now(pytz.UTC)
+        }
+    
+    def update(self, hour: float, mood: float):
+        """Fold in the average mood of the hour starting at ``hour``; hours without posts are skipped over"""
+        steps = round((hour - self.last_hour) / 3600)
+        if steps <= 0:
+            return
+        slot = int(hour // 3600) % SEASON_HOURS
+        level = ALPHA * (mood - self.seasonal[slot]) + (1 - ALPHA) * (self.level + damped_steps(steps) * self.trend)
+        self.trend = BETA * (level - self.level) / steps + (1 - BETA) * PHI ** steps * self.trend
+        self.seasonal[slot] = GAMMA * (mood - level) + (1 - GAMMA) * self.seasonal[slot]
+        self.level = level
+        self.hours_seen += 1
+        self.last_hour = hour
+
+def fold_closed_hours(db: Session, closed_until: datetime, zone_id: Optional[int] = None) -> Tuple[Dict[int, HoltWintersState], List[int]]:
+    """Persisted states brought up to ``closed_until``, and the zones whose state changed.
+    
+    Zones without a state yet start from HISTORY; the others read only the hours after their last one.
+    """
+    query = select(ZoneForecastState).where(ZoneForecastState.model_version == MODEL_VERSION)
+    zone_query = select(CityZone.id)
+    if zone_id is not None:
+        query = query.where(ZoneForecastState.zone_id == zone_id)
+        zone_query = zone_query.where(CityZone.id == zone_id)
+    states = {row.zone_id: HoltWintersState.from_row(row) for row in db.scalars(query)}
+    
+    batches = []
+    if states:
+        since = datetime.fromtimestamp(min(state.last_hour for state in states.values()) + 3600, pytz.UTC)
+        batches.append(hourly_arrays(db, closed_until, max(since, closed_until - HISTORY), list(states)))
+    new_zone_ids = [zone for zone in db.scalars(zone_query) if zone not in states]
+    if new_zone_ids:
+        batches.append(hourly_arrays(db, closed_until, zone_ids=new_zone_ids))
+    
+    changed = set()
+    for zone_ids, hours, moods in batches:
+        for zone, hour, mood in zip(zone_ids.tolist(), hours.tolist(), moods.tolist()):
+            state = states.get(zone)
+            if state is None:
+                states[zone] = HoltWintersState.start(hour, mood)
+            elif hour > state.last_hour:
+                state.update(hour, mood)
+            else:
+                continue
+            changed.add(zone)
+    return states, sorted(changed)
+
+def update_states(db: Session, closed_until: datetime) -> int:
+    """Fold the hours closed before ``closed_until`` into the persisted states; returns the zones updated"""
+    states, changed = fold_closed_hours(db, closed_until)
+    if changed:
+        statement = insert(ZoneForecastState).values([states[zone_id].to_row(zone_id) for zone_id in changed])
+        db.execute(statement.on_conflict_do_update(
+            index_elements=['zone_id', 'model_version'],
+            set_={column: statement.excluded[column] for column in
+                  ('level', 'trend', 'seasonal', 'hours_seen', 'last_hour', 'updated_at')}
+        ))
+        db.commit()
+    return len(changed)
+
+def predict(states: List[HoltWintersState], hours_ahead: int) -> List[List[Dict]]:
+    """Each state's forecast for the ``hours_ahead`` hours after the last hour it folded in"""
+    steps = np.arange(1, hours_ahead + 1)
+    level = np.array([state.level for state in states])
+    trend = np.array([state.trend for state in states])
+    seasonal = np.array([state.seasonal for state in states]).reshape(len(states), SEASON_HOURS)
+    last_hour = np.array([state.last_hour for state in states])
+    
+    targets = last_hour[:, None] + 3600 * steps
+    slots = (targets // 3600).astype(int) % SEASON_HOURS
+    predictions = level[:, None] + damped_steps(steps) * trend[:, None] + np.take_along_axis(seasonal, slots, axis=1)
+    predictions = np.round(np.clip(predictions, 0, 100), 2).tolist()
+    
+    timestamps = {}
+    forecasts = []
+    for state, state_predictions in zip(states, predictions):
+        if state.last_hour not in timestamps:
+            timestamps[state.last_hour] = [
+                datetime.fromtimestamp(state.last_hour + 3600 * step, pytz.UTC).isoformat() for step in steps.tolist()
+            ]
+        forecasts.append([
+            {'timestamp': timestamp, 'predicted_mood_index': predicted, 'confidence': confidence(state)}
+            for timestamp, predicted in zip(timestamps[state.last_hour], state_predictions)
+        ])
+    return forecasts
+
+def confidence(state: HoltWintersState) -> float:
+    # The seasonal terms are mostly unset until a full day has been seen
+    return 0.7 if state.hours_seen >= SEASON_HOURS else 0.5
+
+def zone_forecast(db: Session, zone_id: int, hours_ahead: int, closed_until: datetime) -> Dict[str, Any]:
+    """Forecast one zone from its state as of ``closed_until``"""
+    zone = db.scalar(select(CityZone).where(CityZone.id == zone_id))
+    if not zone:
+        raise HTTPException(status_code=404, detail="Zone not found")
+    
+    states, _ = fold_closed_hours(db, closed_until, zone_id)
+    state = states.get(zone_id)
+    if state is None:
+        raise HTTPException(status_code=400, detail="Insufficient data for forecasting")
+    
+    return {
+        'zone_id': zone_id,
+        'zone_name': zone.name,
+        'historical_data_points': state.hours_seen,
+        'forecast_hours': hours_ahead,
+        'forecast': predict([state], hours_ahead)[0],
+        'model_version': MODEL_VERSION,
+        'inputs_until': closed_until.isoformat(),
+        'generated_at': datetime.now(pytz.UTC).isoformat()
+    }
+
+def city_forecast(db: Session, hours_ahead: int, closed_until: datetime) -> Dict[str, Any]:
+    """Forecast every zone and the city average from the states as of ``closed_until``"""
+    total_zones = count_zones(db)
+    states, _ = fold_closed_hours(db, closed_until)
+    zone_ids = sorted(states)
+    zone_forecasts = dict(zip(zone_ids, predict([states[zone_id] for zone_id in zone_ids], hours_ahead)))
+    return city_response(zone_forecasts, total_zones, hours_ahead, MODEL_VERSION, closed_until)
+
+def input_signatures(db: Session, closed_until: datetime) -> Dict[int, str]:
+    """Per-zone fingerprint of the state a forecast at ``closed_until`` is read from"""
+    states, _ = fold_closed_hours(db, closed_until)
+    return {zone_id: f"{state.hours_seen}:{state.last_hour}" for zone_id, state in states.items()}
+
+def forecast_zones(db: Session, zone_ids: List[int], hours_ahead: int, closed_until: datetime) -> Dict[int, Tuple[List[Dict], int]]:
+    """Forecasts of ``zone_ids``, each with the number of hours folded into its state"""
+    states, _ = fold_closed_hours(db, closed_until)
+    zone_ids = [zone_id for zone_id in zone_ids if zone_id in states]
+    forecasts = predict([states[zone_id] for zone_id in zone_ids], hours_ahead)
+    return {zone_id: (forecast, states[zone_id].hours_seen) for zone_id, forecast in zip(zone_ids, forecasts)}
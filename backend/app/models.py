@@ -1,12 +1,24 @@
-from sqlalchemy import Column, Integer, String, Text, DECIMAL, DateTime, ForeignKey, Index
+from sqlalchemy import Column, BigInteger, Integer, String, Text, Boolean, DECIMAL, Float, DateTime, ForeignKey, ForeignKeyConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import TIMESTAMP
+from sqlalchemy.dialects.postgresql import TIMESTAMP, REAL, ARRAY, JSONB
 from datetime import datetime
 import pytz
+import os
 
 Base = declarative_base()
 
+# Compact storage keeps emotion scores and environmental values as 4-byte REAL
+# instead of NUMERIC (see sql/migrations/001_compact_storage.sql). Either way
+# these columns are read back as plain floats, never Decimal.
+COMPACT_STORAGE = os.getenv("COMPACT_STORAGE", "false").lower() == "true"
+
+def measurement_type(precision: int, scale: int):
+    """Column type for a float measurement under the configured storage layout"""
+    if COMPACT_STORAGE:
+        return REAL()
+    return DECIMAL(precision, scale, asdecimal=False)
+
 class CityZone(Base):
     __tablename__ = 'city_zones'
     
@@ -22,18 +34,22 @@ class CityZone(Base):
     emotion_analyses = relationship("EmotionAnalysis", back_populates="zone")
     environmental_data = relationship("EnvironmentalData", back_populates="zone")
     mood_aggregations = relationship("ZoneMoodAggregation", back_populates="zone")
+    environmental_aggregations = relationship("EnvironmentalAggregation", back_populates="zone")
 
 class SocialPost(Base):
     __tablename__ = 'social_posts'
+    # Range-partitioned by day on created_at (partitions are managed by
+    # app/services/data_lifecycle.py), so created_at is part of the key
+    __table_args__ = {'postgresql_partition_by': 'RANGE (created_at)'}
     
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     zone_id = Column(Integer, ForeignKey('city_zones.id'))
     content = Column(Text, nullable=False)
     source = Column(String(50), nullable=False)
     lat = Column(DECIMAL(10, 8))
     lon = Column(DECIMAL(11, 8))
     location = Column(Text)  # Store as WKT text
-    created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(pytz.UTC))
+    created_at = Column(TIMESTAMP(timezone=True), primary_key=True, default=lambda: datetime.now(pytz.UTC))
     
     # Relationships
     zone = relationship("CityZone", back_populates="social_posts")
@@ -41,19 +57,24 @@ class SocialPost(Base):
 
 class EmotionAnalysis(Base):
     __tablename__ = 'emotion_analysis'
+    # An analysis shares its post's created_at, which completes the
+    # reference into the partitioned social_posts key
+    __table_args__ = (
+        ForeignKeyConstraint(['post_id', 'created_at'], ['social_posts.id', 'social_posts.created_at']),
+    )
     
     id = Column(Integer, primary_key=True)
-    post_id = Column(Integer, ForeignKey('social_posts.id'))
+    post_id = Column(Integer)
     zone_id = Column(Integer, ForeignKey('city_zones.id'))
-    joy = Column(DECIMAL(5, 4), nullable=False)
-    sadness = Column(DECIMAL(5, 4), nullable=False)
-    anger = Column(DECIMAL(5, 4), nullable=False)
-    fear = Column(DECIMAL(5, 4), nullable=False)
-    surprise = Column(DECIMAL(5, 4), nullable=False)
-    disgust = Column(DECIMAL(5, 4), nullable=False)
-    neutral = Column(DECIMAL(5, 4), nullable=False)
+    joy = Column(measurement_type(5, 4), nullable=False)
+    sadness = Column(measurement_type(5, 4), nullable=False)
+    anger = Column(measurement_type(5, 4), nullable=False)
+    fear = Column(measurement_type(5, 4), nullable=False)
+    surprise = Column(measurement_type(5, 4), nullable=False)
+    disgust = Column(measurement_type(5, 4), nullable=False)
+    neutral = Column(measurement_type(5, 4), nullable=False)
     dominant_emotion = Column(String(20), nullable=False)
-    mood_index = Column(DECIMAL(5, 2), nullable=False)
+    mood_index = Column(measurement_type(5, 2), nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(pytz.UTC))
     
     # Relationships
@@ -66,7 +87,7 @@ class EnvironmentalData(Base):
     id = Column(Integer, primary_key=True)
     zone_id = Column(Integer, ForeignKey('city_zones.id'))
     data_type = Column(String(50), nullable=False)
-    value = Column(DECIMAL(10, 4), nullable=False)
+    value = Column(measurement_type(10, 4), nullable=False)
     unit = Column(String(20), nullable=False)
     source = Column(String(50), nullable=False)
     lat = Column(DECIMAL(10, 8))
@@ -100,19 +121,147 @@ class ZoneMoodAggregation(Base):
     # Relationships
     zone = relationship("CityZone", back_populates="mood_aggregations")
 
+class EnvironmentalAggregation(Base):
+    __tablename__ = 'environmental_aggregations'
+    
+    id = Column(Integer, primary_key=True)
+    zone_id = Column(Integer, ForeignKey('city_zones.id'))
+    data_type = Column(String(50), nullable=False)
+    value_avg = Column(DECIMAL(10, 4), nullable=False)
+    value_min = Column(DECIMAL(10, 4), nullable=False)
+    value_max = Column(DECIMAL(10, 4), nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    aggregation_period = Column(String(20), nullable=False)
+    period_start = Column(TIMESTAMP(timezone=True), nullable=False)
+    period_end = Column(TIMESTAMP(timezone=True), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(pytz.UTC))
+    
+    # Relationships
+    zone = relationship("CityZone", back_populates="environmental_aggregations")
+
+# Per-zone state of an online forecasting model, updated as each hour closes
+class ZoneForecastState(Base):
+    __tablename__ = 'zone_forecast_states'
+    
+    zone_id = Column(Integer, ForeignKey('city_zones.id'), primary_key=True)
+    model_version = Column(String(50), primary_key=True)
+    level = Column(Float, nullable=False)
+    trend = Column(Float, nullable=False)
+    seasonal = Column(ARRAY(Float), nullable=False)  # One term per hour of the day (UTC)
+    hours_seen = Column(Integer, nullable=False)
+    last_hour = Column(TIMESTAMP(timezone=True), nullable=False)  # Start of the last hour folded in
+    updated_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(pytz.UTC))
+
+# A zone's forecast as (re)made at a closed hour; kept as history
+class ZoneForecast(Base):
+    __tablename__ = 'zone_forecasts'
+    
+    zone_id = Column(Integer, ForeignKey('city_zones.id'), primary_key=True)
+    model_version = Column(String(50), primary_key=True)
+    inputs_until = Column(TIMESTAMP(timezone=True), primary_key=True)  # End of the closed hours it was made from
+    input_hours = Column(Integer, nullable=False)
+    inputs_signature = Column(String(100), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(pytz.UTC))
+    
+    # Relationships
+    points = relationship("ZoneForecastPoint", back_populates="forecast", order_by="ZoneForecastPoint.horizon")
+
+class ZoneForecastPoint(Base):
+    __tablename__ = 'zone_forecast_points'
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ['zone_id', 'model_version', 'inputs_until'],
+            ['zone_forecasts.zone_id', 'zone_forecasts.model_version', 'zone_forecasts.inputs_until'],
+            ondelete='CASCADE'
+        ),
+    )
+    
+    zone_id = Column(Integer, primary_key=True)
+    model_version = Column(String(50), primary_key=True)
+    inputs_until = Column(TIMESTAMP(timezone=True), primary_key=True)
+    horizon = Column(Integer, primary_key=True)  # Hours after the zone's last input hour
+    target_hour = Column(TIMESTAMP(timezone=True), nullable=False)
+    predicted_mood_index = Column(DECIMAL(5, 2, asdecimal=False), nullable=False)
+    confidence = Column(DECIMAL(3, 2, asdecimal=False), nullable=False)
+    
+    # Relationships
+    forecast = relationship("ZoneForecast", back_populates="points")
+
+# One row per model and closed hour the forecast job has covered
+class ForecastRun(Base):
+    __tablename__ = 'forecast_runs'
+    
+    model_version = Column(String(50), primary_key=True)
+    inputs_until = Column(TIMESTAMP(timezone=True), primary_key=True)
+    zones_forecast = Column(Integer, nullable=False)
+    zones_unchanged = Column(Integer, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(pytz.UTC))
+
+# An anomaly raised by the streaming detector at ingest; repeat triggers within
+# the cooldown extend it instead of adding rows
+class Alert(Base):
+    __tablename__ = 'alerts'
+    
+    id = Column(BigInteger, primary_key=True)
+    zone_id = Column(Integer, ForeignKey('city_zones.id'), nullable=False)
+    metric = Column(String(50), nullable=False)  # 'mood_index' or an environmental data type
+    anomaly_type = Column(String(50), nullable=False)
+    severity = Column(String(10), nullable=False)
+    value = Column(Float, nullable=False)  # Value of the strongest trigger
+    score = Column(Float)  # Its z-score against the baseline, if it had one
+    baseline_mean = Column(Float)
+    baseline_std = Column(Float)
+    occurrences = Column(Integer, nullable=False, default=1)
+    first_seen_at = Column(TIMESTAMP(timezone=True), nullable=False)  # Data time of the first trigger
+    last_seen_at = Column(TIMESTAMP(timezone=True), nullable=False)  # Data time of the latest trigger
+    created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(pytz.UTC))
+    updated_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(pytz.UTC))
+    
+    # Relationships
+    zone = relationship("CityZone")
+
+# A closed zone-hour's multivariate anomaly score from the anomaly_scoring job
+class ZoneAnomalyScore(Base):
+    __tablename__ = 'zone_anomaly_scores'
+    
+    zone_id = Column(Integer, ForeignKey('city_zones.id'), primary_key=True)
+    hour = Column(TIMESTAMP(timezone=True), primary_key=True)  # Start of the hour scored
+    score = Column(Float, nullable=False)  # Higher is more anomalous
+    is_anomaly = Column(Boolean, nullable=False)
+    features = Column(JSONB, nullable=False)  # Feature values the hour was scored on, by name
+    model_version = Column(String(50), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), default=lambda: datetime.now(pytz.UTC))
+
 # Create indexes
-Index('idx_social_posts_location', SocialPost.location)
+# Hot queries filter on zone_id plus a created_at range, or on a created_at
+# range alone; the INCLUDE columns let those run as index-only scans.
+# post_id completes the (created_at, post_id) keyset the post feeds page on.
 Index('idx_social_posts_zone_id', SocialPost.zone_id)
 Index('idx_social_posts_created_at', SocialPost.created_at)
 
-Index('idx_emotion_analysis_zone_id', EmotionAnalysis.zone_id)
-Index('idx_emotion_analysis_created_at', EmotionAnalysis.created_at)
-Index('idx_emotion_analysis_mood_index', EmotionAnalysis.mood_index)
+Index('idx_emotion_analysis_zone_created', EmotionAnalysis.zone_id, EmotionAnalysis.created_at.desc(), EmotionAnalysis.post_id.desc(),
+      postgresql_include=['mood_index', 'dominant_emotion'])
+Index('idx_emotion_analysis_created_covering', EmotionAnalysis.created_at, EmotionAnalysis.post_id,
+      postgresql_include=['zone_id', 'mood_index'])
+Index('idx_emotion_analysis_post_id', EmotionAnalysis.post_id)
 
-Index('idx_environmental_data_zone_id', EnvironmentalData.zone_id)
-Index('idx_environmental_data_created_at', EnvironmentalData.created_at)
-Index('idx_environmental_data_type', EnvironmentalData.data_type)
+Index('idx_environmental_data_zone_created', EnvironmentalData.zone_id, EnvironmentalData.created_at.desc(),
+      postgresql_include=['data_type', 'value', 'unit'])
+Index('idx_environmental_data_created_covering', EnvironmentalData.created_at,
+      postgresql_include=['zone_id', 'data_type', 'value'])
 
 Index('idx_zone_mood_aggregations_zone_id', ZoneMoodAggregation.zone_id)
 Index('idx_zone_mood_aggregations_period', ZoneMoodAggregation.aggregation_period)
 Index('idx_zone_mood_aggregations_period_start', ZoneMoodAggregation.period_start)
+
+Index('idx_environmental_aggregations_zone_id', EnvironmentalAggregation.zone_id)
+Index('idx_environmental_aggregations_period_start', EnvironmentalAggregation.period_start)
+
+# Accuracy tracking joins forecast points to the actual hour they predicted
+Index('idx_zone_forecast_points_model_target', ZoneForecastPoint.model_version, ZoneForecastPoint.target_hour)
+
+# The alerts endpoints read the alerts seen in a window, city-wide or per zone
+Index('idx_alerts_last_seen', Alert.last_seen_at.desc())
+Index('idx_alerts_zone_last_seen', Alert.zone_id, Alert.last_seen_at.desc())
+
+Index('idx_zone_anomaly_scores_hour', ZoneAnomalyScore.hour.desc())
@@ -0,0 +1,184 @@
+"""
+Admission control for City Pulse application
+Bounds how many requests of each cost class run at once so heavy analytics
+cannot take every database connection from cheap endpoints. Requests over
+the limit wait in a bounded queue for a short deadline; when the queue is
+full or the deadline passes they get an immediate 503 with Retry-After.
+"""
+
+import asyncio
+import functools
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Cost classes endpoints declare
+CHEAP = 'cheap'
+HEAVY = 'heavy'
+
+# Defaults per class: (concurrent requests, queued requests, max queue wait in seconds)
+CLASS_DEFAULTS = {
+    CHEAP: (24, 128, 0.5),
+    HEAVY: (2, 16, 2.0),
+}
+
+class Overloaded(Exception):
+    """Raised when a gate cannot admit a request; ``reason`` is 'queue_full' or 'timeout'"""
+    
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class Gate:
+    """Concurrency limit with a bounded FIFO wait queue"""
+    
+    def __init__(self, limit: int, queue_size: int):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = None
+    
+    async def acquire(self, deadline: float):
+        """Take a slot, waiting until ``deadline`` (monotonic) at most"""
+        if self._semaphore is None:
+            # Created lazily so it belongs to the serving event loop
+            self._semaphore = asyncio.Semaphore(self.limit)
+        
+        if self.waiting == 0 and not self._semaphore.locked():
+            await self._semaphore.acquire()
+        elif self.waiting >= self.queue_size:
+            raise Overloaded('queue_full')
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                raise Overloaded('timeout')
+            finally:
+                self.waiting -= 1
+        self.active += 1
+    
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+class AdmissionController:
+    """Per-class and per-route concurrency limits with fast rejection under overload"""
+    
+    def __init__(self):
+        self.enabled = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true"
+        
+        self.classes = {}
+        for cost_class, (limit, queue_size, max_wait) in CLASS_DEFAULTS.items():
+            prefix = f"ADMISSION_{cost_class.upper()}"
+            self.classes[cost_class] = {
+                'gate': Gate(int(os.getenv(f"{prefix}_LIMIT", limit)), int(os.getenv(f"{prefix}_QUEUE", queue_size))),
+                'max_wait': float(os.getenv(f"{prefix}_MAX_WAIT_SECONDS", max_wait)),
+                # Smoothed service time, used to suggest when to retry
+                'service_seconds': None
+            }
+        
+        self._routes = {}
+        self._stats = {}
+    
+    def _record(self, route: str, cost_class: str, outcome: str):
+        counters = self._stats.setdefault(route, {
+            'cost_class': cost_class, 'admitted': 0, 'rejected_queue_full': 0, 'rejected_timeout': 0
+        })
+        counters[outcome] += 1
+    
+    def _retry_after(self, cost_class: str) -> int:
+        """Seconds until a slot is likely free: queued work spread over the class's slots"""
+        settings = self.classes[cost_class]
+        gate = settings['gate']
+        service_seconds = settings['service_seconds'] or settings['max_wait']
+        return max(1, math.ceil(service_seconds * (gate.waiting + 1) / gate.limit))
+    
+    def _observe(self, cost_class: str, elapsed: float):
+        settings = self.classes[cost_class]
+        previous = settings['service_seconds']
+        settings['service_seconds'] = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+    
+    def admit(self, route: str, cost_class: str, limit: Optional[int] = None):
+        """Decorator running an endpoint under its cost class's limit, and ``limit`` for the route itself.
+        
+        Requests that cannot start within the class's wait deadline are
+        answered with 503 and Retry-After without touching the database.
+        """
+        settings = self.classes[cost_class]
+        if limit is not None:
+            self._routes[route] = Gate(limit, settings['gate'].queue_size)
+        
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(**kwargs):
+                if not self.enabled:
+                    return await func(**kwargs)
+                
+                # The route gate first, so one flooded route queues behind itself
+                gates = [gate for gate in (self._routes.get(route), settings['gate']) if gate is not None]
+                deadline = time.monotonic() + settings['max_wait']
+                acquired = []
+                try:
+                    for gate in gates:
+                        await gate.acquire(deadline)
+                        acquired.append(gate)
+                except Overloaded as e:
+                    for gate in acquired:
+                        gate.release()
+                    self._record(route, cost_class, f"rejected_{e.reason}")
+                    raise HTTPException(
+                        status_code=503,
+                        detail=f"Server busy ({cost_class} requests saturated), retry shortly",
+                        headers={"Retry-After": str(self._retry_after(cost_class))}
+                    )
+                
+                self._record(route, cost_class, 'admitted')
+                started = time.monotonic()
+                try:
+                    return await func(**kwargs)
+                finally:
+                    self._observe(cost_class, time.monotonic() - started)
+                    for gate in acquired:
+                        gate.release()
+            return wrapper
+        return decorator
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Current load and admitted/rejected counts per class and route for this worker"""
+        classes = {}
+        for cost_class, settings in self.classes.items():
+            gate = settings['gate']
+            routes = [counters for counters in self._stats.values() if counters['cost_class'] == cost_class]
+            classes[cost_class] = {
+                'limit': gate.limit,
+                'queue_size': gate.queue_size,
+                'max_wait_seconds': settings['max_wait'],
+                'active': gate.active,
+                'waiting': gate.waiting,
+                'admitted': sum(c['admitted'] for c in routes),
+                'rejected': sum(c['rejected_queue_full'] + c['rejected_timeout'] for c in routes)
+            }
+        
+        routes = {}
+        for route, counters in self._stats.items():
+            routes[route] = dict(counters)
+            gate = self._routes.get(route)
+            if gate is not None:
+                routes[route].update({'limit': gate.limit, 'active': gate.active, 'waiting': gate.waiting})
+        
+        return {
+            'enabled': self.enabled,
+            'classes': classes,
+            'routes': routes
+        }
+
+# Global admission controller instance
+admission_control = AdmissionController()
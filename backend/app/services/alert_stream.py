@@ -0,0 +1,238 @@
+"""
+Streaming anomaly alerts for City Pulse application
+The collectors pass every committed post's mood index and every
+environmental reading through the detector right after their commit.
+It keeps an exponentially weighted running mean and variance per zone and
+metric (the mood index, or an environmental data type), scores each value
+against that baseline before folding it in, and raises an alert when the
+score passes ALERT_Z_SCORE or a reading leaves its valid range. Alerts
+are written to the alerts table, which the alerts endpoints read.
+A trigger within ALERT_COOLDOWN_SECONDS of the last one for the same
+zone, metric and alert type extends that alert (occurrence count, last
+seen time, peak score and severity) instead of adding a row.
+Baselines are kept in memory and seeded from the last
+ALERT_BASELINE_HOURS of data on first use.
+"""
+
+import logging
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytz
+from sqlalchemy import select, func, insert, update
+from sqlalchemy.orm import Session
+
+from app.ml.anomaly_detection import anomaly_detector
+from app.models import Alert, EmotionAnalysis, EnvironmentalData
+
+logger = logging.getLogger(__name__)
+
+MOOD_METRIC = 'mood_index'
+
+SEVERITIES = ['low', 'medium', 'high']
+
+class RunningStats:
+    """Exponentially weighted mean and variance, updated in O(1) per value (Welford-style)"""
+    
+    __slots__ = ('mean', 'variance', 'count')
+    
+    def __init__(self, mean: float = 0.0, variance: float = 0.0, count: int = 0):
+        self.mean = mean
+        self.variance = variance
+        self.count = count
+    
+    def score(self, value: float) -> Optional[float]:
+        """z-score of ``value`` against the current baseline; None while it is flat"""
+        if self.variance <= 0:
+            return None
+        return (value - self.mean) / math.sqrt(self.variance)
+    
+    def update(self, value: float, alpha: float):
+        if self.count == 0:
+            self.mean = value
+        else:
+            diff = value - self.mean
+            increment = alpha * diff
+            self.mean += increment
+            self.variance = (1 - alpha) * (self.variance + diff * increment)
+        self.count += 1
+
+class AlertStream:
+    """Scores ingested values against running per-zone baselines and records alerts"""
+    
+    def __init__(self):
+        self.z_score = float(os.getenv("ALERT_Z_SCORE", "3.0"))
+        self.alpha = float(os.getenv("ALERT_EWMA_ALPHA", "0.05"))
+        self.min_samples = int(os.getenv("ALERT_MIN_SAMPLES", "20"))
+        self.cooldown = timedelta(seconds=float(os.getenv("ALERT_COOLDOWN_SECONDS", "900")))
+        self.baseline_hours = int(os.getenv("ALERT_BASELINE_HOURS", "24"))
+        self.bounds = anomaly_detector.env_bounds()
+        
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._baselines: Dict[Tuple[int, str], RunningStats] = {}
+        # Latest alert per (zone_id, metric, anomaly_type), as last written
+        self._open: Dict[Tuple[int, str, str], Dict[str, Any]] = {}
+        self.stats = {'observed': 0, 'alerts_raised': 0, 'alerts_extended': 0, 'errors': 0}
+    
+    def _load(self, db: Session):
+        """Seed baselines from recent data and pick up alerts still in their cooldown"""
+        since = datetime.now(pytz.UTC) - timedelta(hours=self.baseline_hours)
+        mood_rows = db.execute(select(
+            EmotionAnalysis.zone_id, func.avg(EmotionAnalysis.mood_index),
+            func.var_pop(EmotionAnalysis.mood_index), func.count()
+        ).where(
+            EmotionAnalysis.zone_id.isnot(None),
+            EmotionAnalysis.created_at >= since
+        ).group_by(EmotionAnalysis.zone_id)).all()
+        env_rows = db.execute(select(
+            EnvironmentalData.zone_id, EnvironmentalData.data_type, func.avg(EnvironmentalData.value),
+            func.var_pop(EnvironmentalData.value), func.count()
+        ).where(
+            EnvironmentalData.zone_id.isnot(None),
+            EnvironmentalData.created_at >= since
+        ).group_by(EnvironmentalData.zone_id, EnvironmentalData.data_type)).all()
+        
+        for zone_id, mean, variance, count in mood_rows:
+            self._baselines[(zone_id, MOOD_METRIC)] = RunningStats(float(mean), float(variance or 0), count)
+        for zone_id, data_type, mean, variance, count in env_rows:
+            self._baselines[(zone_id, data_type)] = RunningStats(float(mean), float(variance or 0), count)
+        
+        latest = select(Alert.zone_id, Alert.metric, Alert.anomaly_type, func.max(Alert.id).label('id')).where(
+            Alert.last_seen_at >= datetime.now(pytz.UTC) - self.cooldown
+        ).group_by(Alert.zone_id, Alert.metric, Alert.anomaly_type).subquery()
+        for alert in db.scalars(select(Alert).join(latest, Alert.id == latest.c.id)):
+            self._open[(alert.zone_id, alert.metric, alert.anomaly_type)] = self._as_dict(alert)
+        self._loaded = True
+    
+    @staticmethod
+    def _as_dict(alert: Alert) -> Dict[str, Any]:
+        return {column: getattr(alert, column) for column in (
+            'id', 'zone_id', 'metric', 'anomaly_type', 'severity', 'value', 'score',
+            'baseline_mean', 'baseline_std', 'occurrences', 'first_seen_at', 'last_seen_at'
+        )}
+    
+    def _severity(self, score: Optional[float]) -> str:
+        if score is None:
+            return 'medium'
+        if abs(score) >= 2 * self.z_score:
+            return 'high'
+        if abs(score) >= 1.5 * self.z_score:
+            return 'medium'
+        return 'low'
+    
+    def _check(self, zone_id: int, metric: str, value: float) -> List[Tuple[str, Optional[float], Optional[float], Optional[float]]]:
+        """Fold ``value`` into its baseline; returns the (anomaly_type, score, baseline mean, baseline std) triggers it raised"""
+        baseline = self._baselines.setdefault((zone_id, metric), RunningStats())
+        score = baseline.score(value) if baseline.count >= self.min_samples else None
+        mean, std = (baseline.mean, math.sqrt(baseline.variance)) if baseline.count else (None, None)
+        baseline.update(value, self.alpha)
+        
+        triggers = []
+        if score is not None and abs(score) > self.z_score:
+            triggers.append(('mood_spike' if metric == MOOD_METRIC else 'environmental_spike', score, mean, std))
+        if metric in self.bounds:
+            low, high = self.bounds[metric]
+            if value < low or value > high:
+                triggers.append(('environmental_threshold_exceeded', score, mean, std))
+        return triggers
+    
+    def _observe(self, db: Session, observations: List[Tuple[Optional[int], str, datetime, float]]) -> List[Dict[str, Any]]:
+        """Score (zone_id, metric, created_at, value) observations in time order and write the alerts they raise"""
+        with self._lock:
+            try:
+                if not self._loaded:
+                    self._load(db)
+                
+                now = datetime.now(pytz.UTC)
+                raised, extended = [], {}
+                for zone_id, metric, created_at, value in sorted(
+                    (observation for observation in observations if observation[0] is not None), key=lambda o: o[2]
+                ):
+                    self.stats['observed'] += 1
+                    for anomaly_type, score, mean, std in self._check(zone_id, metric, float(value)):
+                        key = (zone_id, metric, anomaly_type)
+                        alert = self._open.get(key)
+                        severity = self._severity(score)
+                        if anomaly_type == 'environmental_threshold_exceeded':
+                            # Out of the valid range is at least medium however usual it is for the zone
+                            severity = max(severity, 'medium', key=SEVERITIES.index)
+                        if alert is not None and alert['first_seen_at'] - self.cooldown <= created_at <= alert['last_seen_at'] + self.cooldown:
+                            alert['occurrences'] += 1
+                            alert['last_seen_at'] = max(alert['last_seen_at'], created_at)
+                            alert['severity'] = max(alert['severity'], severity, key=SEVERITIES.index)
+                            if score is not None and (alert['score'] is None or abs(score) > abs(alert['score'])):
+                                alert.update(value=float(value), score=score, baseline_mean=mean, baseline_std=std)
+                            if alert.get('id') is not None:
+                                extended[alert['id']] = alert
+                            continue
+                        
+                        alert = {
+                            'zone_id': zone_id,
+                            'metric': metric,
+                            'anomaly_type': anomaly_type,
+                            'severity': severity,
+                            'value': float(value),
+                            'score': score,
+                            'baseline_mean': mean,
+                            'baseline_std': std,
+                            'occurrences': 1,
+                            'first_seen_at': created_at,
+                            'last_seen_at': created_at
+                        }
+                        self._open[key] = alert
+                        raised.append(alert)
+                
+                # Alerts raised in this batch are written with their final counts, so they never need an update
+                for alert in raised:
+                    alert['id'] = db.scalar(insert(Alert).values(
+                        **{column: value for column, value in alert.items() if column != 'id'},
+                        created_at=now, updated_at=now
+                    ).returning(Alert.id))
+                for alert_id, alert in extended.items():
+                    db.execute(update(Alert).where(Alert.id == alert_id).values(
+                        severity=alert['severity'], value=alert['value'], score=alert['score'],
+                        baseline_mean=alert['baseline_mean'], baseline_std=alert['baseline_std'],
+                        occurrences=alert['occurrences'], last_seen_at=alert['last_seen_at'], updated_at=now
+                    ))
+                if raised or extended:
+                    db.commit()
+                
+                self.stats['alerts_raised'] += len(raised)
+                self.stats['alerts_extended'] += len(extended)
+                return [dict(alert) for alert in raised + list(extended.values())]
+            
+            except Exception as e:
+                # Alerting never fails an ingest; the open alerts are reloaded from the table
+                db.rollback()
+                self._open.clear()
+                self._loaded = False
+                self.stats['errors'] += 1
+                logger.error(f"Error recording alerts: {e}")
+                return []
+    
+    def observe_posts(self, db: Session, rows: List[Tuple[Optional[int], datetime, float]]) -> List[Dict[str, Any]]:
+        """Score committed (zone_id, created_at, mood_index) rows; returns the alerts raised or extended"""
+        return self._observe(db, [(zone_id, MOOD_METRIC, created_at, mood) for zone_id, created_at, mood in rows])
+    
+    def observe_readings(self, db: Session, rows: List[Tuple[Optional[int], str, datetime, float]]) -> List[Dict[str, Any]]:
+        """Score committed (zone_id, data_type, created_at, value) rows; returns the alerts raised or extended"""
+        return self._observe(db, rows)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cooling_since = datetime.now(pytz.UTC) - self.cooldown
+            return {
+                'z_score': self.z_score,
+                'ewma_alpha': self.alpha,
+                'cooldown_seconds': self.cooldown.total_seconds(),
+                'baselines': len(self._baselines),
+                'alerts_in_cooldown': sum(alert['last_seen_at'] >= cooling_since for alert in self._open.values()),
+                **self.stats
+            }
+
+# Global alert stream instance
+alert_stream = AlertStream()
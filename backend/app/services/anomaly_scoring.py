@@ -0,0 +1,136 @@
+"""
+Multivariate anomaly scoring for City Pulse application
+A background job scores each zone-hour once it closes (by the forecast
+cache's closed-hour rule) with the Isolation Forest in
+app/ml/anomaly_detection.py, over that hour's mood statistics and the mean
+of every environmental data type. All zones' new hours are built from
+two grouped queries and scored in one batch, and the scores are stored in
+zone_anomaly_scores, so reading them is an indexed lookup. The model is
+retrained every ANOMALY_RETRAIN_HOURS on the last ANOMALY_TRAINING_DAYS
+of zone-hours and saved to ANOMALY_MODEL_PATH, which is loaded again
+after a restart. Hours are not rescored after a retrain or late data.
+"""
+
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+import numpy as np
+import pytz
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+
+from app.database import SessionLocal
+from app.ml.anomaly_detection import anomaly_detector, hourly_features, MOOD_FEATURES
+from app.models import ZoneAnomalyScore
+from app.services.forecast_cache import forecast_cache
+
+logger = logging.getLogger(__name__)
+
+# Fewer zone-hours than this in the training window leave the model untrained
+MIN_TRAINING_ROWS = 48
+
+class AnomalyScorer:
+    """Trains the Isolation Forest on a sliding window and stores scores for newly closed hours"""
+    
+    def __init__(self):
+        self.training_days = int(os.getenv("ANOMALY_TRAINING_DAYS", "7"))
+        self.retrain_interval = timedelta(hours=float(os.getenv("ANOMALY_RETRAIN_HOURS", "24")))
+        self.backfill_hours = int(os.getenv("ANOMALY_BACKFILL_HOURS", "24"))
+        self.model_path = os.getenv(
+            "ANOMALY_MODEL_PATH", os.path.join(os.getenv("MODEL_CACHE_DIR", "models"), "isolation_forest.joblib")
+        )
+        self._load_attempted = False
+        self.stats = {'runs': 0, 'trainings': 0, 'hours_scored': 0, 'anomalies': 0,
+                      'last_training_seconds': None, 'last_scoring_seconds': None}
+    
+    def train(self, db, closed_until: datetime) -> bool:
+        """Fit the model to the training window before ``closed_until`` and save it"""
+        start = time.perf_counter()
+        _, _, features, feature_names = hourly_features(db, closed_until - timedelta(days=self.training_days), closed_until)
+        if len(features) < MIN_TRAINING_ROWS:
+            logger.info(f"Only {len(features)} zone-hours to train the anomaly model on; waiting for more")
+            return False
+        
+        info = anomaly_detector.fit_isolation_forest(features, feature_names, closed_until)
+        anomaly_detector.save_model(self.model_path)
+        self.stats['trainings'] += 1
+        self.stats['last_training_seconds'] = round(time.perf_counter() - start, 3)
+        logger.info(f"Trained {info['version']} on {info['training_rows']} zone-hours with {len(feature_names)} features")
+        return True
+    
+    def score(self, db, since: datetime, closed_until: datetime) -> int:
+        """Score and store every zone-hour in [since, closed_until); returns the number scored"""
+        start = time.perf_counter()
+        info = anomaly_detector.model_info
+        # Built over the environmental types the model was trained on
+        zone_ids, hours, features, feature_names = hourly_features(db, since, closed_until, info['feature_names'][len(MOOD_FEATURES):])
+        if not len(features):
+            return 0
+        
+        scores, flags = anomaly_detector.score_isolation_forest(features)
+        rows = [
+            {
+                'zone_id': zone_id,
+                'hour': datetime.fromtimestamp(hour, pytz.UTC),
+                'score': round(score, 4),
+                'is_anomaly': flag,
+                'features': {name: round(value, 4) for name, value in zip(feature_names, row) if not np.isnan(value)},
+                'model_version': info['version']
+            }
+            for zone_id, hour, score, flag, row in zip(
+                zone_ids.tolist(), hours.tolist(), scores.tolist(), flags.tolist(), features.tolist()
+            )
+        ]
+        statement = insert(ZoneAnomalyScore).values(rows)
+        db.execute(statement.on_conflict_do_nothing(index_elements=['zone_id', 'hour']))
+        db.commit()
+        
+        self.stats['hours_scored'] += len(rows)
+        self.stats['anomalies'] += int(flags.sum())
+        self.stats['last_scoring_seconds'] = round(time.perf_counter() - start, 3)
+        return len(rows)
+    
+    def run(self):
+        """Retrain when the model is due, then score the hours closed since the last run"""
+        closed_until = forecast_cache.closed_until()
+        db = SessionLocal()
+        try:
+            if not self._load_attempted:
+                self._load_attempted = True
+                if anomaly_detector.load_model(self.model_path):
+                    logger.info(f"Loaded anomaly model {anomaly_detector.model_info['version']} from {self.model_path}")
+            
+            info = anomaly_detector.model_info
+            if info is None or info['trained_until'] <= closed_until - self.retrain_interval:
+                if not self.train(db, closed_until) and info is None:
+                    return
+            
+            last_hour = db.scalar(select(func.max(ZoneAnomalyScore.hour)))
+            since = closed_until - timedelta(hours=self.backfill_hours)
+            if last_hour is not None:
+                since = max(since, last_hour + timedelta(hours=1))
+            if since < closed_until:
+                scored = self.score(db, since, closed_until)
+                if scored:
+                    logger.info(f"Scored {scored} zone-hours up to {closed_until.isoformat()}")
+        finally:
+            db.close()
+        self.stats['runs'] += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        info = anomaly_detector.model_info
+        return {
+            'model_version': info['version'] if info else None,
+            'trained_until': info['trained_until'].isoformat() if info else None,
+            'training_rows': info['training_rows'] if info else None,
+            'features': info['feature_names'] if info else None,
+            'training_days': self.training_days,
+            'retrain_hours': self.retrain_interval.total_seconds() / 3600,
+            **self.stats
+        }
+
+# Global anomaly scorer instance
+anomaly_scorer = AnomalyScorer()
@@ -5,6 +5,7 @@ Manages data collection, processing, and maintenance tasks
 
 import asyncio
 import logging
+import os
 import threading
 from typing import List, Optional
 from datetime import datetime, timedelta
@@ -12,6 +13,9 @@ import pytz
 
 from app.ingestion.social_collector import social_collector
 from app.ingestion.env_collector import env_collector
+from app.services.data_lifecycle import data_lifecycle
+from app.services.forecast_cache import forecast_cache
+from app.services.anomaly_scoring import anomaly_scorer
 
 logger = logging.getLogger(__name__)
 
@@ -185,6 +189,27 @@ def initialize_background_services():
             name="env_collector"
         )
         
+        # Add data lifecycle maintenance (rollups, retention, space report)
+        background_manager.add_service(
+            data_lifecycle.run_maintenance,
+            interval_seconds=3600,  # 1 hour
+            name="data_lifecycle"
+        )
+        
+        # Fill the forecast cache as soon as each hour closes
+        background_manager.add_service(
+            forecast_cache.precompute,
+            interval_seconds=int(os.getenv("FORECAST_PRECOMPUTE_INTERVAL_SECONDS", "30")),
+            name="forecast_precompute"
+        )
+        
+        # Score closed zone-hours with the Isolation Forest, retraining it when due
+        background_manager.add_service(
+            anomaly_scorer.run,
+            interval_seconds=int(os.getenv("ANOMALY_SCORING_INTERVAL_SECONDS", "300")),
+            name="anomaly_scoring"
+        )
+        
         # Don't start services immediately - wait for database to be ready
         logger.info("Background services configured but not started yet")
         logger.info("Services will start after database initialization")
@@ -0,0 +1,380 @@
+"""
+Data lifecycle management for City Pulse application
+Applies compression policies, rolls raw rows up into hourly aggregations,
+enforces retention and reports the space reclaimed by each run
+"""
+
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import pytz
+
+from sqlalchemy import text
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+# The longest raw window any API handler reads (forecasting uses 7 days).
+# Compressing chunks inside that window would push hot queries onto
+# compressed data, so compression always starts after it.
+HOT_WINDOW_DAYS = 7
+
+class DataLifecycleManager:
+    """Bounds the growth of the time-series tables"""
+    
+    # Raw time-series tables and how their compressed chunks are segmented
+    COMPRESSED_TABLES = {
+        'emotion_analysis': 'zone_id',
+        'environmental_data': 'zone_id, data_type',
+    }
+    
+    # Rollup tables kept longer than the raw rows they summarize
+    ROLLUP_TABLES = ['zone_mood_aggregations', 'environmental_aggregations']
+    
+    # Stored forecasts (their points go with them) and forecast job runs
+    FORECAST_TABLES = ['zone_forecasts', 'forecast_runs']
+    
+    # Alerts raised by the streaming detector and stored anomaly scores
+    ALERT_TABLES = ['alerts', 'zone_anomaly_scores']
+    
+    def __init__(self):
+        self.compress_after_days = int(os.getenv("COMPRESS_AFTER_DAYS", "8"))
+        self.raw_retention_days = int(os.getenv("RAW_RETENTION_DAYS", "30"))
+        self.rollup_retention_days = int(os.getenv("ROLLUP_RETENTION_DAYS", "365"))
+        self.post_content_retention_days = int(os.getenv("POST_CONTENT_RETENTION_DAYS", "14"))
+        self.forecast_retention_days = int(os.getenv("FORECAST_RETENTION_DAYS", "90"))
+        self.alert_retention_days = int(os.getenv("ALERT_RETENTION_DAYS", "90"))
+        self.post_partitions_ahead = int(os.getenv("POST_PARTITIONS_AHEAD_DAYS", "7"))
+        self.batch_size = int(os.getenv("LIFECYCLE_BATCH_SIZE", "5000"))
+        self.last_report: Optional[Dict] = None
+        
+        if self.compress_after_days <= HOT_WINDOW_DAYS:
+            logger.warning(
+                f"COMPRESS_AFTER_DAYS={self.compress_after_days} overlaps the {HOT_WINDOW_DAYS}-day "
+                f"hot query window; raising it to {HOT_WINDOW_DAYS + 1}"
+            )
+            self.compress_after_days = HOT_WINDOW_DAYS + 1
+        
+        if self.raw_retention_days <= self.compress_after_days:
+            logger.warning("RAW_RETENTION_DAYS is not longer than COMPRESS_AFTER_DAYS; chunks will be dropped before they are compressed")
+    
+    def _has_timescale(self, conn) -> bool:
+        return conn.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'timescaledb')"
+        )).scalar()
+    
+    def _hypertables(self, conn) -> List[str]:
+        """Names of the tables that are TimescaleDB hypertables"""
+        if not self._has_timescale(conn):
+            return []
+        rows = conn.execute(text(
+            "SELECT hypertable_name FROM timescaledb_information.hypertables"
+        )).fetchall()
+        return [row[0] for row in rows]
+    
+    def _is_partitioned(self, conn, table: str) -> bool:
+        """Whether ``table`` is a natively partitioned table"""
+        return bool(conn.execute(text(
+            "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"
+        ), {'table': table}).scalar())
+    
+    def _post_partitions(self, conn) -> List[str]:
+        """Names of the partitions currently attached to social_posts"""
+        rows = conn.execute(text("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass('social_posts')
+        """)).fetchall()
+        return [row[0] for row in rows]
+    
+    def _table_sizes(self, conn, tables: List[str]) -> Dict[str, int]:
+        """On-disk size in bytes of each table including indexes and TOAST"""
+        hypertables = set(self._hypertables(conn))
+        sizes = {}
+        for table in tables:
+            if table in hypertables:
+                # pg_total_relation_size() only sees the empty parent of a hypertable
+                query = "SELECT COALESCE(hypertable_size(CAST(:table AS regclass)), 0)"
+            elif self._is_partitioned(conn, table):
+                query = """
+                    SELECT COALESCE(SUM(pg_total_relation_size(inhrelid)), 0)
+                    FROM pg_inherits WHERE inhparent = CAST(:table AS regclass)
+                """
+            else:
+                query = "SELECT COALESCE(pg_total_relation_size(CAST(:table AS regclass)), 0)"
+            sizes[table] = int(conn.execute(text(query), {'table': table}).scalar())
+        return sizes
+    
+    def ensure_post_partitions(self) -> int:
+        """Create the daily social_posts partitions from yesterday up to POST_PARTITIONS_AHEAD_DAYS ahead"""
+        with engine.begin() as conn:
+            if not self._is_partitioned(conn, 'social_posts'):
+                logger.warning("social_posts is not partitioned; run sql/migrations/003_partition_social_posts.sql")
+                return 0
+            # Catches rows outside every daily range so inserts never fail
+            conn.execute(text("CREATE TABLE IF NOT EXISTS social_posts_default PARTITION OF social_posts DEFAULT"))
+            existing = set(self._post_partitions(conn))
+        
+        today = datetime.now(pytz.UTC).date()
+        created = 0
+        for offset in range(-1, self.post_partitions_ahead + 1):
+            day = today + timedelta(days=offset)
+            name = f"social_posts_p{day:%Y%m%d}"
+            if name in existing:
+                continue
+            
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(
+                        f"CREATE TABLE {name} PARTITION OF social_posts "
+                        f"FOR VALUES FROM ('{day} 00:00:00+00') TO ('{day + timedelta(days=1)} 00:00:00+00')"
+                    ))
+                created += 1
+            except Exception as e:
+                # Fails if social_posts_default already holds rows for that day
+                logger.warning(f"Could not create partition {name}: {e}")
+        
+        if created:
+            logger.info(f"Created {created} social_posts partitions")
+        return created
+    
+    def apply_policies(self):
+        """Enable native compression on the raw hypertables and register compression policies"""
+        with engine.connect() as conn:
+            hypertables = set(self._hypertables(conn))
+        
+        for table, segment_by in self.COMPRESSED_TABLES.items():
+            if table not in hypertables:
+                logger.info(f"Skipping compression policy for {table}: not a hypertable")
+                continue
+            
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(
+                        f"ALTER TABLE {table} SET ("
+                        f"timescaledb.compress, "
+                        f"timescaledb.compress_segmentby = '{segment_by}', "
+                        f"timescaledb.compress_orderby = 'created_at DESC')"
+                    ))
+                    # Re-register so a changed COMPRESS_AFTER_DAYS takes effect
+                    conn.execute(text(f"SELECT remove_compression_policy('{table}', if_exists => TRUE)"))
+                    conn.execute(
+                        text(f"SELECT add_compression_policy('{table}', CAST(:after AS INTERVAL))"),
+                        {'after': f"{self.compress_after_days} days"}
+                    )
+                logger.info(f"Compression policy for {table}: chunks older than {self.compress_after_days} days")
+            except Exception as e:
+                logger.warning(f"Could not apply compression policy to {table}: {e}")
+    
+    def _rollup_emotions(self, conn, until: datetime) -> int:
+        """Roll closed hours of emotion_analysis up into zone_mood_aggregations"""
+        since = conn.execute(text(
+            "SELECT MAX(period_end) FROM zone_mood_aggregations WHERE aggregation_period = 'hourly'"
+        )).scalar()
+        
+        # Hours are rolled up once, when they close; rows arriving later for
+        # an already rolled-up hour stay in the raw table only.
+        result = conn.execute(text("""
+            INSERT INTO zone_mood_aggregations (
+                zone_id, mood_index_avg, mood_index_std, post_count,
+                joy_avg, sadness_avg, anger_avg, fear_avg, surprise_avg, disgust_avg, neutral_avg,
+                aggregation_period, period_start, period_end, created_at
+            )
+            SELECT
+                zone_id,
+                ROUND(CAST(AVG(mood_index) AS NUMERIC), 2),
+                ROUND(CAST(STDDEV_POP(mood_index) AS NUMERIC), 2),
+                COUNT(*),
+                AVG(joy), AVG(sadness), AVG(anger), AVG(fear), AVG(surprise), AVG(disgust), AVG(neutral),
+                'hourly',
+                date_trunc('hour', created_at),
+                date_trunc('hour', created_at) + INTERVAL '1 hour',
+                NOW()
+            FROM emotion_analysis
+            WHERE zone_id IS NOT NULL
+              AND created_at < :until
+              AND (CAST(:since AS TIMESTAMPTZ) IS NULL OR created_at >= :since)
+            GROUP BY zone_id, date_trunc('hour', created_at)
+        """), {'since': since, 'until': until})
+        return result.rowcount
+    
+    def _rollup_environmental(self, conn, until: datetime) -> int:
+        """Roll closed hours of environmental_data up into environmental_aggregations"""
+        since = conn.execute(text(
+            "SELECT MAX(period_end) FROM environmental_aggregations WHERE aggregation_period = 'hourly'"
+        )).scalar()
+        
+        result = conn.execute(text("""
+            INSERT INTO environmental_aggregations (
+                zone_id, data_type, value_avg, value_min, value_max, sample_count,
+                aggregation_period, period_start, period_end, created_at
+            )
+            SELECT
+                zone_id,
+                data_type,
+                AVG(value),
+                MIN(value),
+                MAX(value),
+                COUNT(*),
+                'hourly',
+                date_trunc('hour', created_at),
+                date_trunc('hour', created_at) + INTERVAL '1 hour',
+                NOW()
+            FROM environmental_data
+            WHERE zone_id IS NOT NULL
+              AND created_at < :until
+              AND (CAST(:since AS TIMESTAMPTZ) IS NULL OR created_at >= :since)
+            GROUP BY zone_id, data_type, date_trunc('hour', created_at)
+        """), {'since': since, 'until': until})
+        return result.rowcount
+    
+    def _expire_rows(self, conn, table: str, cutoff: datetime, hypertables: set, column: str = 'created_at') -> Dict[str, int]:
+        """Remove rows whose ``column`` is older than ``cutoff``, dropping whole chunks where possible"""
+        expired = {}
+        if table in hypertables:
+            dropped = conn.execute(
+                text(f"SELECT drop_chunks('{table}', older_than => CAST(:cutoff AS TIMESTAMPTZ))"),
+                {'cutoff': cutoff}
+            ).fetchall()
+            expired['chunks_dropped'] = len(dropped)
+            if column == 'created_at':
+                return expired
+        
+        # Chunks are bounded by created_at, so rows expired by another column
+        # (e.g. a backfilled rollup of an old period) can sit in live chunks
+        result = conn.execute(text(f"DELETE FROM {table} WHERE {column} < :cutoff"), {'cutoff': cutoff})
+        expired['rows_deleted'] = result.rowcount
+        return expired
+    
+    def _expire_post_content(self, conn, cutoff: datetime) -> int:
+        """Blank out the text of posts older than ``cutoff`` in bounded batches"""
+        total = 0
+        while True:
+            result = conn.execute(text("""
+                UPDATE social_posts SET content = ''
+                WHERE (id, created_at) IN (
+                    SELECT id, created_at FROM social_posts
+                    WHERE created_at < :cutoff AND content <> ''
+                    LIMIT :batch_size
+                )
+            """), {'cutoff': cutoff, 'batch_size': self.batch_size})
+            total += result.rowcount
+            if result.rowcount < self.batch_size:
+                return total
+    
+    def _drop_expired_post_partitions(self, conn, cutoff: datetime) -> int:
+        """Detach and drop daily social_posts partitions that end before ``cutoff``"""
+        dropped = 0
+        for name in self._post_partitions(conn):
+            match = re.fullmatch(r"social_posts_p(\d{8})", name)
+            if not match:
+                continue
+            partition_end = datetime.strptime(match.group(1), "%Y%m%d").replace(tzinfo=pytz.UTC) + timedelta(days=1)
+            if partition_end > cutoff:
+                continue
+            
+            # DETACH verifies no emotion_analysis row still references the
+            # partition, which holds once those rows have been expired
+            try:
+                with conn.begin_nested():
+                    conn.execute(text(f"ALTER TABLE social_posts DETACH PARTITION {name}"))
+                    conn.execute(text(f"DROP TABLE {name}"))
+            except Exception as e:
+                logger.warning(f"Could not drop partition {name}: {e}")
+                continue
+            dropped += 1
+        return dropped
+    
+    def _delete_orphaned_posts(self, conn, cutoff: datetime) -> int:
+        """Delete expired posts once their emotion analysis rows are gone"""
+        result = conn.execute(text("""
+            DELETE FROM social_posts p
+            WHERE p.created_at < :cutoff
+              AND NOT EXISTS (SELECT 1 FROM emotion_analysis e WHERE e.post_id = p.id)
+        """), {'cutoff': cutoff})
+        return result.rowcount
+    
+    def run_maintenance(self) -> Dict:
+        """Roll up, expire and report; safe to run repeatedly"""
+        now = datetime.now(pytz.UTC)
+        closed_hour = now.replace(minute=0, second=0, microsecond=0)
+        raw_cutoff = now - timedelta(days=self.raw_retention_days)
+        rollup_cutoff = now - timedelta(days=self.rollup_retention_days)
+        content_cutoff = now - timedelta(days=self.post_content_retention_days)
+        forecast_cutoff = now - timedelta(days=self.forecast_retention_days)
+        alert_cutoff = now - timedelta(days=self.alert_retention_days)
+        tables = list(self.COMPRESSED_TABLES) + ['social_posts'] + self.ROLLUP_TABLES
+        
+        self.ensure_post_partitions()
+        
+        with engine.connect() as conn:
+            sizes_before = self._table_sizes(conn, tables)
+        
+        # Rollups commit before anything is expired so raw rows are never
+        # dropped without their summary
+        with engine.begin() as conn:
+            rolled_up = {
+                'zone_mood_aggregations': self._rollup_emotions(conn, closed_hour),
+                'environmental_aggregations': self._rollup_environmental(conn, closed_hour),
+            }
+        
+        with engine.begin() as conn:
+            hypertables = set(self._hypertables(conn))
+            expired = {
+                table: self._expire_rows(conn, table, raw_cutoff, hypertables)
+                for table in self.COMPRESSED_TABLES
+            }
+            expired['social_posts'] = {
+                'partitions_dropped': self._drop_expired_post_partitions(conn, raw_cutoff),
+                'rows_deleted': self._delete_orphaned_posts(conn, raw_cutoff)
+            }
+            for table in self.ROLLUP_TABLES:
+                expired[table] = self._expire_rows(conn, table, rollup_cutoff, hypertables, column='period_start')
+            for table in self.FORECAST_TABLES:
+                expired[table] = self._expire_rows(conn, table, forecast_cutoff, hypertables)
+            for table in self.ALERT_TABLES:
+                expired[table] = self._expire_rows(conn, table, alert_cutoff, hypertables)
+            content_expired = self._expire_post_content(conn, content_cutoff)
+        
+        with engine.connect() as conn:
+            sizes_after = self._table_sizes(conn, tables)
+        
+        # DELETE/UPDATE space is reused after autovacuum rather than returned
+        # to the OS, so only dropped chunks show up here immediately
+        reclaimed = {table: sizes_before[table] - sizes_after[table] for table in tables}
+        
+        report = {
+            'rolled_up_rows': rolled_up,
+            'expired': expired,
+            'post_contents_expired': content_expired,
+            'size_before_bytes': sizes_before,
+            'size_after_bytes': sizes_after,
+            'reclaimed_bytes': reclaimed,
+            'total_reclaimed_bytes': sum(reclaimed.values()),
+            'timestamp': now.isoformat()
+        }
+        self.last_report = report
+        
+        logger.info(
+            f"Data lifecycle maintenance reclaimed {report['total_reclaimed_bytes']} bytes "
+            f"(rolled up {sum(rolled_up.values())} rows, expired {expired}, "
+            f"cleared {content_expired} post contents)"
+        )
+        return report
+    
+    def get_policy_info(self) -> Dict:
+        """Get the active lifecycle settings and the last maintenance report"""
+        return {
+            'compress_after_days': self.compress_after_days,
+            'raw_retention_days': self.raw_retention_days,
+            'rollup_retention_days': self.rollup_retention_days,
+            'post_content_retention_days': self.post_content_retention_days,
+            'forecast_retention_days': self.forecast_retention_days,
+            'alert_retention_days': self.alert_retention_days,
+            'last_report': self.last_report
+        }
+
+# Global instance
+data_lifecycle = DataLifecycleManager()
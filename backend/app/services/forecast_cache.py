@@ -0,0 +1,175 @@
+"""
+Forecast cache for City Pulse application
+Forecasts are fitted on closed hours only, so they are cached in the
+response cache under the zone, horizon, model version and last closed
+hour. An hour counts as closed once the social ingestion watermark (the
+latest committed post time) has moved past it, or a grace period after
+it ended if ingestion has stalled. Posts committed for hours that were
+already closed bump the CLOSED_HOURS version of their zones, which is the
+only other thing that changes a forecast's key. Right after each hour
+closes a background job brings the online model's state and the stored
+forecasts (app/services/forecast_store.py) up to date and fills the
+cache from them, so forecast requests are lookups.
+"""
+
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import pytz
+from fastapi import Response
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.ml import online_forecasting
+from app.models import CityZone
+from app.services.forecast_store import forecast_store, FORECAST_MODELS
+from app.services.response_cache import response_cache, SOCIAL, CLOSED_HOURS
+
+logger = logging.getLogger(__name__)
+
+class ForecastCache:
+    """Caches forecasts per last closed hour and precomputes them as hours close"""
+    
+    def __init__(self):
+        # Entries are keyed by hour, so they only need to outlive it
+        self.ttl = int(os.getenv("FORECAST_CACHE_TTL_SECONDS", "7200"))
+        self.default_model = os.getenv("FORECAST_MODEL", "linear")
+        if self.default_model not in FORECAST_MODELS:
+            logger.warning(f"Unknown FORECAST_MODEL {self.default_model!r}, using 'linear'")
+            self.default_model = 'linear'
+        self.close_grace_seconds = float(os.getenv("FORECAST_CLOSE_GRACE_SECONDS", "300"))
+        self.precompute_hours_ahead = [int(h) for h in os.getenv("FORECAST_PRECOMPUTE_HOURS_AHEAD", "24").split(',') if h]
+        self.stats = {'precompute_runs': 0, 'precomputed': 0, 'states_updated': 0, 'late_invalidations': 0}
+    
+    def _closed_until(self, watermark: Optional[float]) -> datetime:
+        now = time.time()
+        current_hour = now - now % 3600
+        if (watermark is None or watermark < current_hour) and now - current_hour < self.close_grace_seconds:
+            # Posts from the previous hour may still be in flight
+            current_hour -= 3600
+        return datetime.fromtimestamp(current_hour, pytz.UTC)
+    
+    def closed_until(self) -> datetime:
+        """End of the last closed hour, i.e. the start of the hour forecasts stop at"""
+        return self._closed_until(response_cache.get_watermark(SOCIAL))
+    
+    async def closed_until_async(self) -> datetime:
+        """``closed_until`` for request handlers, without blocking the event loop"""
+        return self._closed_until(await response_cache.get_watermark_async(SOCIAL))
+    
+    def record_ingest(self, rows: List[Tuple[Optional[int], datetime]]):
+        """Advance the watermark past newly committed (zone_id, created_at) rows.
+        
+        Rows for hours that had already closed invalidate their zones' forecasts.
+        """
+        if not rows:
+            return
+        closed_until = self.closed_until()
+        response_cache.advance_watermark(SOCIAL, max(created_at for _, created_at in rows).timestamp())
+        
+        late_zone_ids = [zone_id for zone_id, created_at in rows if zone_id is not None and created_at < closed_until]
+        if late_zone_ids:
+            self.stats['late_invalidations'] += 1
+            response_cache.publish_invalidation(CLOSED_HOURS, late_zone_ids)
+    
+    async def get_or_compute(
+        self,
+        endpoint: str,
+        model: str,
+        closed_until: datetime,
+        params: Dict[str, Any],
+        compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Serve a forecast from the cache, or compute and cache it for this model and closed hour"""
+        key_params = {**params, 'model': FORECAST_MODELS[model].version, 'hour': closed_until.isoformat()}
+        return await response_cache.get_or_compute(
+            endpoint, key_params, self.ttl, [(CLOSED_HOURS, params.get('zone_id'))], compute
+        )
+    
+    @staticmethod
+    def _was_computed(response: Any) -> bool:
+        """Whether a precompute lookup computed and cached its forecast.
+        
+        get_or_compute returns the plain result when Redis fails mid-run,
+        which was computed but not cached.
+        """
+        return isinstance(response, Response) and response.headers.get('X-Cache') == 'MISS'
+    
+    async def precompute(self):
+        """Fold closed hours into the online model's state, store every model's forecasts for
+        zones whose inputs changed, then cache the default model's forecasts for the current
+        closed hour; entries already cached are kept
+        """
+        closed_until = await self.closed_until_async()
+        db = SessionLocal()
+        computed = 0
+        try:
+            try:
+                self.stats['states_updated'] += online_forecasting.update_states(db, closed_until)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Error updating online forecast states: {e}")
+            for model in FORECAST_MODELS:
+                try:
+                    stored = forecast_store.materialize(db, model, closed_until)
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Error storing {model} forecasts: {e}")
+                    continue
+                # Late posts changed forecasts that may already be cached for this hour
+                if stored['refreshed']:
+                    response_cache.publish_invalidation(CLOSED_HOURS, stored['refreshed'])
+            
+            if not response_cache.available():
+                return
+            
+            zone_ids = db.scalars(select(CityZone.id)).all()
+            for hours_ahead in self.precompute_hours_ahead:
+                for zone_id in zone_ids:
+                    async def compute_zone():
+                        return forecast_store.zone_forecast(db, self.default_model, zone_id, hours_ahead, closed_until)
+                    try:
+                        response = await self.get_or_compute(
+                            "forecast/zone", self.default_model, closed_until,
+                            {'zone_id': zone_id, 'hours_ahead': hours_ahead}, compute_zone
+                        )
+                        computed += self._was_computed(response)
+                    except Exception as e:
+                        # Zones without history have no forecast
+                        db.rollback()
+                        logger.debug(f"No forecast for zone {zone_id}: {e}")
+                
+                async def compute_city():
+                    return forecast_store.city_forecast(db, self.default_model, hours_ahead, closed_until)
+                try:
+                    response = await self.get_or_compute(
+                        "forecast/city", self.default_model, closed_until, {'hours_ahead': hours_ahead}, compute_city
+                    )
+                    computed += self._was_computed(response)
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Error precomputing the {hours_ahead}h city forecast: {e}")
+        finally:
+            db.close()
+            # The background manager closes this run's event loop afterwards
+            await response_cache.release_async_client()
+        
+        self.stats['precompute_runs'] += 1
+        self.stats['precomputed'] += computed
+        if computed:
+            logger.info(f"Precomputed {computed} forecasts for hours up to {closed_until.isoformat()}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'default_model': self.default_model,
+            'models': {name: model.version for name, model in FORECAST_MODELS.items()},
+            'closed_until': self.closed_until().isoformat(),
+            **self.stats,
+            'store': forecast_store.get_stats()
+        }
+
+# Global forecast cache instance
+forecast_cache = ForecastCache()
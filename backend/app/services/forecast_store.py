@@ -0,0 +1,259 @@
+"""
+Materialized forecasts for City Pulse application
+The forecast_precompute job writes each zone's forecast for the next
+FORECAST_STORE_HOURS hours into zone_forecasts and zone_forecast_points,
+tagged with the model version and the closed hour it was made at, and
+records in forecast_runs which closed hours it has covered per model.
+A zone is only re-forecast when its inputs changed: posts entering or
+leaving its window for the linear model, a newly folded hour for the
+online model. Once a run covers the current closed hour the endpoints
+read a zone's latest stored forecast; before that they compute live.
+Stored forecasts are kept as history, so forecast accuracy is a join
+against the actual hourly moods instead of a recomputation.
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select, delete, func, and_, true, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, aliased
+
+from app.ml import forecasting, online_forecasting
+from app.ml.forecasting import city_response, count_zones
+from app.models import CityZone, EmotionAnalysis, ZoneForecast, ZoneForecastPoint, ForecastRun
+
+logger = logging.getLogger(__name__)
+
+class ForecastModel(NamedTuple):
+    version: str
+    zone_forecast: Callable
+    city_forecast: Callable
+    input_signatures: Callable
+    forecast_zones: Callable
+
+# Models the forecast endpoints can be asked for by name
+FORECAST_MODELS = {
+    'linear': ForecastModel(
+        forecasting.MODEL_VERSION, forecasting.zone_forecast, forecasting.city_forecast,
+        forecasting.input_signatures, forecasting.forecast_zones
+    ),
+    'holt-winters': ForecastModel(
+        online_forecasting.MODEL_VERSION, online_forecasting.zone_forecast, online_forecasting.city_forecast,
+        online_forecasting.input_signatures, online_forecasting.forecast_zones
+    )
+}
+
+class ForecastStore:
+    """Writes forecasts as zones' inputs change and serves them back"""
+    
+    def __init__(self):
+        self.hours = int(os.getenv("FORECAST_STORE_HOURS", "48"))
+        self.stats = {'zones_forecast': 0, 'zones_unchanged': 0, 'served_stored': 0, 'served_live': 0}
+    
+    def _covered(self, db: Session, version: str, closed_until: datetime) -> bool:
+        return db.scalar(select(ForecastRun.inputs_until).where(
+            ForecastRun.model_version == version,
+            ForecastRun.inputs_until == closed_until
+        )) is not None
+    
+    def _latest(self, db: Session, version: str, closed_until: datetime, zone_id: Optional[int] = None) -> Dict[int, ZoneForecast]:
+        """Each zone's most recent forecast made at or before ``closed_until``"""
+        latest = select(ZoneForecast).where(
+            ZoneForecast.zone_id == CityZone.id,
+            ZoneForecast.model_version == version,
+            ZoneForecast.inputs_until <= closed_until
+        ).order_by(ZoneForecast.inputs_until.desc()).limit(1).lateral()
+        forecast = aliased(ZoneForecast, latest)
+        query = select(forecast).select_from(CityZone).join(latest, true())
+        if zone_id is not None:
+            query = query.where(CityZone.id == zone_id)
+        return {row.zone_id: row for row in db.scalars(query)}
+    
+    def materialize(self, db: Session, model_name: str, closed_until: datetime) -> Dict[str, Any]:
+        """Re-forecast the zones whose inputs changed since their latest stored forecast.
+        
+        ``refreshed`` lists zones re-forecast for a closed hour that had already been covered (late data).
+        """
+        model = FORECAST_MODELS[model_name]
+        signatures = model.input_signatures(db, closed_until)
+        stored = {zone_id: forecast.inputs_signature for zone_id, forecast in self._latest(db, model.version, closed_until).items()}
+        # Zones whose inputs all left the window get an empty forecast, so the old one is not served
+        changed = sorted(
+            zone_id for zone_id in set(signatures) | set(stored)
+            if signatures.get(zone_id, '') != stored.get(zone_id)
+        )
+        covered = self._covered(db, model.version, closed_until)
+        result = {
+            'forecast': len(changed),
+            'unchanged': len(set(signatures).difference(changed)),
+            'refreshed': changed if covered else []
+        }
+        self.stats['zones_forecast'] += result['forecast']
+        self.stats['zones_unchanged'] += result['unchanged']
+        if covered and not changed:
+            return result
+        
+        if changed:
+            forecasts = model.forecast_zones(db, [zone_id for zone_id in changed if zone_id in signatures], self.hours, closed_until)
+            db.execute(delete(ZoneForecast).where(
+                ZoneForecast.zone_id.in_(changed),
+                ZoneForecast.model_version == model.version,
+                ZoneForecast.inputs_until == closed_until
+            ))
+            db.execute(insert(ZoneForecast).values([
+                {
+                    'zone_id': zone_id,
+                    'model_version': model.version,
+                    'inputs_until': closed_until,
+                    'input_hours': forecasts[zone_id][1] if zone_id in forecasts else 0,
+                    'inputs_signature': signatures.get(zone_id, '')
+                }
+                for zone_id in changed
+            ]))
+            points = [
+                {
+                    'zone_id': zone_id,
+                    'model_version': model.version,
+                    'inputs_until': closed_until,
+                    'horizon': horizon,
+                    'target_hour': datetime.fromisoformat(point['timestamp']),
+                    'predicted_mood_index': point['predicted_mood_index'],
+                    'confidence': point['confidence']
+                }
+                for zone_id, (forecast, _) in forecasts.items()
+                for horizon, point in enumerate(forecast, start=1)
+            ]
+            if points:
+                db.execute(insert(ZoneForecastPoint).values(points))
+        
+        run = insert(ForecastRun).values(
+            model_version=model.version,
+            inputs_until=closed_until,
+            zones_forecast=result['forecast'],
+            zones_unchanged=result['unchanged']
+        )
+        db.execute(run.on_conflict_do_update(
+            index_elements=['model_version', 'inputs_until'],
+            set_={'zones_forecast': ForecastRun.zones_forecast + run.excluded.zones_forecast}
+        ))
+        db.commit()
+        return result
+    
+    def zone_forecast(self, db: Session, model_name: str, zone_id: int, hours_ahead: int, closed_until: datetime) -> Dict[str, Any]:
+        """A zone's stored forecast once a run covers ``closed_until``, otherwise computed live"""
+        model = FORECAST_MODELS[model_name]
+        if hours_ahead > self.hours or not self._covered(db, model.version, closed_until):
+            self.stats['served_live'] += 1
+            return model.zone_forecast(db, zone_id, hours_ahead, closed_until)
+        
+        zone = db.scalar(select(CityZone).where(CityZone.id == zone_id))
+        if not zone:
+            raise HTTPException(status_code=404, detail="Zone not found")
+        
+        forecast = self._latest(db, model.version, closed_until, zone_id).get(zone_id)
+        if forecast is None or not forecast.input_hours:
+            raise HTTPException(status_code=400, detail="Insufficient data for forecasting")
+        
+        points = db.execute(select(
+            ZoneForecastPoint.target_hour, ZoneForecastPoint.predicted_mood_index, ZoneForecastPoint.confidence
+        ).where(
+            ZoneForecastPoint.zone_id == zone_id,
+            ZoneForecastPoint.model_version == model.version,
+            ZoneForecastPoint.inputs_until == forecast.inputs_until,
+            ZoneForecastPoint.horizon <= hours_ahead
+        ).order_by(ZoneForecastPoint.horizon)).all()
+        
+        self.stats['served_stored'] += 1
+        return {
+            'zone_id': zone_id,
+            'zone_name': zone.name,
+            'historical_data_points': forecast.input_hours,
+            'forecast_hours': hours_ahead,
+            'forecast': [
+                {'timestamp': target_hour.isoformat(), 'predicted_mood_index': predicted, 'confidence': confidence}
+                for target_hour, predicted, confidence in points
+            ],
+            'model_version': model.version,
+            'inputs_until': closed_until.isoformat(),
+            'generated_at': forecast.created_at.isoformat()
+        }
+    
+    def city_forecast(self, db: Session, model_name: str, hours_ahead: int, closed_until: datetime) -> Dict[str, Any]:
+        """The city forecast from every zone's stored forecast once a run covers ``closed_until``, otherwise computed live"""
+        model = FORECAST_MODELS[model_name]
+        if hours_ahead > self.hours or not self._covered(db, model.version, closed_until):
+            self.stats['served_live'] += 1
+            return model.city_forecast(db, hours_ahead, closed_until)
+        
+        total_zones = count_zones(db)
+        latest = {zone_id: forecast for zone_id, forecast in self._latest(db, model.version, closed_until).items() if forecast.input_hours}
+        zone_forecasts = {zone_id: [] for zone_id in sorted(latest)}
+        if latest:
+            points = db.execute(select(
+                ZoneForecastPoint.zone_id, ZoneForecastPoint.target_hour,
+                ZoneForecastPoint.predicted_mood_index, ZoneForecastPoint.confidence
+            ).where(
+                ZoneForecastPoint.model_version == model.version,
+                tuple_(ZoneForecastPoint.zone_id, ZoneForecastPoint.inputs_until).in_(
+                    [(zone_id, forecast.inputs_until) for zone_id, forecast in latest.items()]
+                ),
+                ZoneForecastPoint.horizon <= hours_ahead
+            ).order_by(ZoneForecastPoint.zone_id, ZoneForecastPoint.horizon)).all()
+            for zone_id, target_hour, predicted, confidence in points:
+                zone_forecasts[zone_id].append(
+                    {'timestamp': target_hour.isoformat(), 'predicted_mood_index': predicted, 'confidence': confidence}
+                )
+        
+        self.stats['served_stored'] += 1
+        generated_at = max((forecast.created_at for forecast in latest.values()), default=None)
+        return city_response(zone_forecasts, total_zones, hours_ahead, model.version, closed_until, generated_at)
+    
+    def accuracy(self, db: Session, model_name: str, closed_until: datetime, days: int) -> Dict[str, Any]:
+        """Error of the stored forecasts whose target hour closed in the last ``days`` days, per horizon"""
+        model = FORECAST_MODELS[model_name]
+        since = closed_until - timedelta(days=days)
+        hour = func.date_trunc('hour', EmotionAnalysis.created_at)
+        actual = select(
+            EmotionAnalysis.zone_id, hour.label('hour'), func.avg(EmotionAnalysis.mood_index).label('mood_index')
+        ).where(
+            EmotionAnalysis.created_at >= since,
+            EmotionAnalysis.created_at < closed_until
+        ).group_by(EmotionAnalysis.zone_id, hour).subquery()
+        
+        error = ZoneForecastPoint.predicted_mood_index - actual.c.mood_index
+        rows = db.execute(select(
+            ZoneForecastPoint.horizon, func.count(), func.avg(func.abs(error)), func.avg(error)
+        ).join(actual, and_(
+            actual.c.zone_id == ZoneForecastPoint.zone_id,
+            actual.c.hour == ZoneForecastPoint.target_hour
+        )).where(
+            ZoneForecastPoint.model_version == model.version,
+            ZoneForecastPoint.target_hour >= since,
+            ZoneForecastPoint.target_hour < closed_until
+        ).group_by(ZoneForecastPoint.horizon).order_by(ZoneForecastPoint.horizon)).all()
+        
+        horizons = [
+            {'horizon': horizon, 'points': points, 'mae': round(float(mae), 2), 'bias': round(float(bias), 2)}
+            for horizon, points, mae, bias in rows
+        ]
+        total = sum(h['points'] for h in horizons)
+        return {
+            'model': model_name,
+            'model_version': model.version,
+            'since': since.isoformat(),
+            'until': closed_until.isoformat(),
+            'points': total,
+            'mae': round(sum(float(mae) * points for _, points, mae, _ in rows) / total, 2) if total else None,
+            'bias': round(sum(float(bias) * points for _, points, _, bias in rows) / total, 2) if total else None,
+            'horizons': horizons
+        }
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {'stored_hours': self.hours, **self.stats}
+
+# Global forecast store instance
+forecast_store = ForecastStore()
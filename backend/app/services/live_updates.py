@@ -0,0 +1,302 @@
+"""
+Live update broker for City Pulse application
+Turns each ingestion commit into sequenced delta events (new posts, zone
+mood changes, environmental readings, alerts), encodes them once and
+fans them out to every Server-Sent Events subscriber. Each subscriber has
+a bounded buffer; slow consumers are dropped and resume from the last
+sequence number they saw.
+Events are relayed through Redis pub/sub so that subscribers on every
+worker process see them, not just those on the worker running the
+collectors. Each batch takes its sequence numbers from one Redis counter
+and is published in the same script, so every worker numbers events
+alike and in order. Without Redis, events are only fanned out in the
+publishing process.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytz
+import redis
+
+from app.database import SessionLocal
+from app.models import EmotionAnalysis
+from app.services.response_cache import KEY_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# Same window /api/now averages over
+MOOD_WINDOW = timedelta(hours=1)
+
+Event = namedtuple('Event', ['seq', 'chunk'])
+
+RELAY_CHANNEL = f"{KEY_PREFIX}:live"
+RELAY_SEQ_KEY = f"{KEY_PREFIX}:live:seq"
+
+# Reserve sequence numbers for a batch and publish it as "<first seq>\n<events>",
+# atomically so batches reach every worker in sequence order
+RELAY_SCRIPT = """
+local last = redis.call('incrby', KEYS[1], ARGV[1])
+redis.call('publish', KEYS[2], (last - tonumber(ARGV[1]) + 1) .. '\\n' .. ARGV[2])
+return last
+"""
+
+def format_sse(event_type: str, data: Dict[str, Any], seq: Optional[int] = None) -> bytes:
+    """One Server-Sent Events message"""
+    lines = [f"id: {seq}"] if seq is not None else []
+    lines += [f"event: {event_type}", f"data: {json.dumps(data, default=str, separators=(',', ':'))}"]
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+class Subscriber:
+    """One connected client: a bounded queue on the event loop serving it"""
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop, buffer_size: int):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = False
+    
+    def offer(self, events: List[Event]):
+        """Queue events without blocking; runs on the subscriber's loop"""
+        if self.dropped:
+            return
+        for event in events:
+            try:
+                self.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too far behind: discard the backlog and tell the stream to close
+                self.dropped = True
+                while not self.queue.empty():
+                    self.queue.get_nowait()
+                self.queue.put_nowait(None)
+                return
+
+class LiveUpdateBroker:
+    """Single producer fanning delta events out to many subscribers"""
+    
+    def __init__(self):
+        self.buffer_size = int(os.getenv("LIVE_CLIENT_BUFFER", "256"))
+        self.history_size = int(os.getenv("LIVE_HISTORY_SIZE", "1000"))
+        self.relay_enabled = os.getenv("LIVE_RELAY_ENABLED", "true").lower() == "true"
+        self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+        # After a Redis error, fan out locally for this long before relaying again
+        self.retry_after = 30.0
+        
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._history = deque(maxlen=self.history_size)
+        self._subscribers = set()
+        self._stats = {'events_published': 0, 'events_relayed': 0, 'relay_gaps': 0, 'clients_dropped': 0, 'resets': 0}
+        
+        self._client = None
+        self._unavailable_until = 0.0
+        self._listener = None
+        
+        # Rolling per-zone mood window, seeded from the database on first use
+        self._zone_windows = {}
+        self._zone_state = {}
+        self._windows_loaded = False
+    
+    def subscribe(self, resume_from: Optional[int] = None) -> Tuple[Subscriber, List[Event]]:
+        """Register a subscriber on the running loop; returns it with the messages to send first.
+        
+        ``resume_from`` is the last sequence number the client received. Events
+        after it are replayed from history; if they are no longer all there the
+        client gets a ``reset`` and should refetch a snapshot.
+        """
+        subscriber = Subscriber(asyncio.get_running_loop(), self.buffer_size)
+        with self._lock:
+            oldest = self._history[0].seq if self._history else self._seq + 1
+            if resume_from is None:
+                backlog = [Event(self._seq, format_sse('ready', {'seq': self._seq}, self._seq))]
+            elif oldest - 1 <= resume_from <= self._seq:
+                backlog = [event for event in self._history if event.seq > resume_from]
+            else:
+                self._stats['resets'] += 1
+                backlog = [Event(self._seq, format_sse('reset', {'seq': self._seq}, self._seq))]
+            self._subscribers.add(subscriber)
+        return subscriber, backlog
+    
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if subscriber.dropped:
+                self._stats['clients_dropped'] += 1
+    
+    def _get_client(self) -> Optional[redis.Redis]:
+        """Redis client for relaying, or None while relaying is disabled or Redis is unreachable"""
+        if not self.relay_enabled or time.monotonic() < self._unavailable_until:
+            return None
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._client
+    
+    def _relay(self, events: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        """Publish events to every worker's listener; False if they must be fanned out locally"""
+        client = self._get_client()
+        if client is None:
+            return False
+        try:
+            payload = json.dumps(events, default=str, separators=(',', ':'))
+            client.eval(RELAY_SCRIPT, 2, RELAY_SEQ_KEY, RELAY_CHANNEL, len(events), payload)
+        except redis.RedisError as e:
+            logger.warning(f"Live update relay unavailable, publishing to this worker only for {self.retry_after:.0f}s: {e}")
+            self._unavailable_until = time.monotonic() + self.retry_after
+            return False
+        with self._lock:
+            self._stats['events_relayed'] += len(events)
+        return True
+    
+    def start_relay(self):
+        """Start this process's listener for relayed events; call once per worker after it starts"""
+        if self.relay_enabled and self._listener is None:
+            self._listener = threading.Thread(target=self._listen, daemon=True, name="live-relay")
+            self._listener.start()
+    
+    def _listen(self):
+        """Fan out relayed event batches to this worker's subscribers, reconnecting after errors"""
+        while True:
+            try:
+                client = redis.Redis.from_url(self.redis_url, socket_connect_timeout=0.5, health_check_interval=30)
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(RELAY_CHANNEL)
+                # Continue from the shared counter, so a new worker's first 'ready' matches the others
+                current = client.get(RELAY_SEQ_KEY)
+                with self._lock:
+                    if current is not None and not self._history:
+                        self._seq = int(current)
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        first_seq, payload = message['data'].split(b'\n', 1)
+                        self._fan_out(int(first_seq), json.loads(payload))
+            except Exception as e:
+                logger.warning(f"Live update relay listener disconnected, retrying in {self.retry_after:.0f}s: {e}")
+                time.sleep(self.retry_after)
+    
+    def _publish(self, events: List[Tuple[str, Dict[str, Any]]]):
+        """Relay events to every worker, or fan them out here without Redis; safe to call from any thread"""
+        if events and not self._relay(events):
+            self._fan_out(None, events)
+    
+    def _fan_out(self, first_seq: Optional[int], events: List[Tuple[str, Dict[str, Any]]]):
+        """Encode once and queue for this process's subscribers, numbering from ``first_seq``
+        (relayed batches) or from this process's own sequence
+        """
+        if not events:
+            return
+        
+        with self._lock:
+            if first_seq is None:
+                first_seq = self._seq + 1
+            elif first_seq != self._seq + 1:
+                # Missed relayed events, or the counter restarted: history can no longer
+                # replay a gap-free run, so resuming clients get a reset
+                self._stats['relay_gaps'] += 1
+                self._history.clear()
+            encoded = [
+                Event(seq, format_sse(event_type, data, seq))
+                for seq, (event_type, data) in enumerate(events, start=first_seq)
+            ]
+            self._seq = encoded[-1].seq
+            self._history.extend(encoded)
+            self._stats['events_published'] += len(encoded)
+            subscribers = list(self._subscribers)
+        
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, encoded)
+            except RuntimeError:
+                # The subscriber's loop has closed
+                self.unsubscribe(subscriber)
+    
+    def _load_zone_windows(self):
+        """Seed the rolling mood windows with the last hour of analyses"""
+        self._windows_loaded = True
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                EmotionAnalysis.zone_id,
+                EmotionAnalysis.created_at,
+                EmotionAnalysis.mood_index,
+                EmotionAnalysis.dominant_emotion
+            ).filter(
+                EmotionAnalysis.created_at >= datetime.now(pytz.UTC) - MOOD_WINDOW
+            ).order_by(EmotionAnalysis.created_at).all()
+            for zone_id, created_at, mood_index, dominant_emotion in rows:
+                self._zone_windows.setdefault(zone_id, deque()).append((created_at, float(mood_index), dominant_emotion))
+        except Exception as e:
+            logger.warning(f"Live mood windows start empty: {e}")
+        finally:
+            db.close()
+    
+    def _zone_mood(self, zone_id: int, now: datetime) -> Dict[str, Any]:
+        """Current mood of a zone over the rolling window, as /api/now reports it"""
+        window = self._zone_windows.get(zone_id, deque())
+        while window and window[0][0] < now - MOOD_WINDOW:
+            window.popleft()
+        
+        emotion_counts = {}
+        for _, _, dominant in window:
+            emotion_counts[dominant] = emotion_counts.get(dominant, 0) + 1
+        
+        return {
+            'zone_id': zone_id,
+            'current_mood_index': round(sum(mood for _, mood, _ in window) / len(window), 2) if window else 50.0,
+            'post_count': len(window),
+            'dominant_emotion': max(emotion_counts.items(), key=lambda x: x[1])[0] if emotion_counts else 'neutral',
+            'last_updated': now.isoformat()
+        }
+    
+    def publish_posts(self, posts: List[Dict[str, Any]]):
+        """Publish newly committed posts plus the zone mood changes they cause"""
+        with self._lock:
+            if not self._windows_loaded:
+                self._load_zone_windows()
+            
+            now = datetime.now(pytz.UTC)
+            events = []
+            for post in posts:
+                events.append(('post', post))
+                if post['zone_id'] is None:
+                    continue
+                
+                mood_index = post['emotion_analysis']['mood_index']
+                window = self._zone_windows.setdefault(post['zone_id'], deque())
+                window.append((post['created_at'], mood_index, post['emotion_analysis']['dominant_emotion']))
+            
+            for zone_id in sorted({post['zone_id'] for post in posts if post['zone_id'] is not None}):
+                state = self._zone_mood(zone_id, now)
+                key = (state['current_mood_index'], state['post_count'], state['dominant_emotion'])
+                if self._zone_state.get(zone_id) != key:
+                    self._zone_state[zone_id] = key
+                    events.append(('zone_mood', state))
+        
+        self._publish(events)
+    
+    def publish_environmental(self, data_points: List[Dict[str, Any]]):
+        """Publish newly committed environmental readings"""
+        self._publish([('environment', data_point) for data_point in data_points])
+    
+    def publish_alerts(self, alerts: List[Dict[str, Any]]):
+        """Publish alerts the streaming detector raised or extended (app/services/alert_stream.py)"""
+        self._publish([('alert', alert) for alert in alerts])
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'relay_listening': self._listener is not None and self._listener.is_alive(),
+                'seq': self._seq,
+                'history': len(self._history),
+                **self._stats
+            }
+
+# Global live update broker instance
+live_updates = LiveUpdateBroker()
@@ -0,0 +1,326 @@
+"""
+Request profiling for City Pulse application
+Opt-in diagnostics for slow endpoints. When enabled, every request gets a
+trace that SQLAlchemy event hooks fill with each statement's duration and
+row count; requests and statements over their thresholds are written to a
+rotating slow-log with the route and parameters. A request carrying the
+profiling token in ``X-Profile`` (or picked by the sampling rate) is also
+sampled by a background thread and written out as a profile report.
+With PROFILING_ENABLED unset nothing is installed.
+"""
+
+import asyncio
+import contextvars
+import hmac
+import json
+import logging
+import logging.handlers
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl
+
+import pytz
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Statements kept per request; later ones are only counted
+MAX_STATEMENTS_PER_REQUEST = 1000
+
+# The trace of the request being served, visible to the statement hooks
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+class RequestTrace:
+    """Timing and statements recorded for one request"""
+    
+    def __init__(self, scope, profile_id: Optional[str]):
+        self.scope = scope
+        self.profile_id = profile_id
+        self.started = time.perf_counter()
+        self.statements = []
+        self.statement_count = 0
+        self.sql_seconds = 0.0
+    
+    def record_statement(self, statement: str, seconds: float, rows: int):
+        self.statement_count += 1
+        self.sql_seconds += seconds
+        if len(self.statements) < MAX_STATEMENTS_PER_REQUEST:
+            self.statements.append({
+                'sql': statement,
+                'duration_ms': round(seconds * 1000, 2),
+                'rows': rows
+            })
+    
+    def route(self) -> str:
+        """Route template once the request is routed, e.g. /api/zone/{zone_id}, else the raw path"""
+        endpoint = self.scope.get('endpoint')
+        app = self.scope.get('app')
+        if endpoint is not None and app is not None:
+            for route in app.routes:
+                if getattr(route, 'endpoint', None) is endpoint:
+                    return route.path
+        return self.scope.get('path', '')
+    
+    def params(self) -> Dict[str, Any]:
+        """Path and query parameters of the request"""
+        params = dict(parse_qsl(self.scope.get('query_string', b'').decode('latin-1')))
+        params.update(self.scope.get('path_params', {}))
+        return params
+
+class StackProfile:
+    """Stacks sampled from the thread serving one request"""
+    
+    def __init__(self, anchor, task_coro):
+        # Stacks are cut at the request's own frame; its task's coroutine tells
+        # whether the event loop is running this request at all
+        self.anchor = anchor
+        self.task_coro = task_coro
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self.on_cpu = 0
+        self.waiting = 0
+    
+    def sample(self, frame):
+        if not self.task_coro.cr_running:
+            # Waiting on I/O, or the event loop is serving another request
+            self.waiting += 1
+            return
+        
+        stack = []
+        while frame is not None and frame is not self.anchor:
+            stack.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        if frame is None:
+            # SQLAlchemy runs ORM and driver code in a greenlet whose frames
+            # do not chain back to the request
+            stack.append('(greenlet)')
+        self.stacks[';'.join(reversed(stack))] += 1
+        self.on_cpu += 1
+
+_labels = {}
+
+def _frame_label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        filename = '/'.join(code.co_filename.split(os.sep)[-2:])
+        label = _labels[code] = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+    return label
+
+class StackSampler:
+    """Background thread sampling the stacks of profiled requests; runs only while one is active"""
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._profiles = set()
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def add(self, profile: StackProfile):
+        with self._lock:
+            self._profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+    
+    def remove(self, profile: StackProfile):
+        with self._lock:
+            self._profiles.discard(profile)
+    
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                profiles = list(self._profiles)
+            frames = sys._current_frames()
+            for profile in profiles:
+                profile.sample(frames.get(profile.thread_id))
+            time.sleep(self.interval)
+
+class RequestProfiler:
+    """Per-request statement tracing, slow-log and on-demand sampling profiles"""
+    
+    def __init__(self):
+        self.enabled = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+        self.token = os.getenv("PROFILE_TOKEN", "")
+        self.sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        self.profile_dir = os.getenv("PROFILE_DIR", "profiles")
+        self.slow_request_seconds = float(os.getenv("SLOW_REQUEST_MS", "1000")) / 1000
+        self.slow_query_seconds = float(os.getenv("SLOW_QUERY_MS", "250")) / 1000
+        self.sampler = StackSampler(float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000)
+        
+        self.slow_log = logging.getLogger("city_pulse.slow")
+        self.stats = {'requests': 0, 'profiled': 0, 'slow_requests': 0, 'slow_queries': 0}
+        
+        if self.enabled:
+            self._configure_slow_log()
+    
+    def _configure_slow_log(self):
+        """JSON lines to SLOW_LOG_PATH, rotated by size"""
+        path = os.getenv("SLOW_LOG_PATH", "logs/slow.log")
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            path,
+            maxBytes=int(os.getenv("SLOW_LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+            backupCount=int(os.getenv("SLOW_LOG_BACKUPS", "5"))
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self.slow_log.addHandler(handler)
+        self.slow_log.setLevel(logging.INFO)
+        self.slow_log.propagate = False
+    
+    def _write_slow(self, kind: str, trace: Optional[RequestTrace], **fields):
+        entry = {'time': datetime.now(pytz.UTC).isoformat(), 'kind': kind}
+        if trace is not None:
+            entry.update({'route': trace.route(), 'params': trace.params()})
+        entry.update(fields)
+        self.slow_log.info(json.dumps(entry, default=str))
+    
+    def instrument(self, engine):
+        """Record each statement run on ``engine`` against the current request's trace"""
+        # The start is kept on the statement's execution context, so a statement
+        # that fails (and never reaches after_cursor_execute) leaves nothing behind
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            context._profiler_started = time.perf_counter()
+        
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            seconds = time.perf_counter() - context._profiler_started
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.record_statement(statement, seconds, cursor.rowcount)
+            if seconds >= self.slow_query_seconds:
+                self.stats['slow_queries'] += 1
+                self._write_slow(
+                    'query', trace,
+                    duration_ms=round(seconds * 1000, 1),
+                    rows=cursor.rowcount,
+                    sql=statement,
+                    sql_params=parameters
+                )
+        
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    
+    def wants_profile(self, scope) -> bool:
+        """Profile requests carrying the token in X-Profile, plus a random sample"""
+        if self.token:
+            for name, value in scope.get('headers', []):
+                if name == b'x-profile' and hmac.compare_digest(value.decode('latin-1'), self.token):
+                    return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+    
+    def _write_profile(self, trace: RequestTrace, profile: StackProfile, status: Optional[int], seconds: float):
+        report = {
+            'id': trace.profile_id,
+            'time': datetime.now(pytz.UTC).isoformat(),
+            'method': trace.scope.get('method'),
+            'route': trace.route(),
+            'path': trace.scope.get('path'),
+            'params': trace.params(),
+            'status': status,
+            'duration_ms': round(seconds * 1000, 1),
+            'sql_ms': round(trace.sql_seconds * 1000, 1),
+            'statement_count': trace.statement_count,
+            'statements': trace.statements,
+            'samples': {
+                'interval_ms': self.sampler.interval * 1000,
+                'on_cpu': profile.on_cpu,
+                'waiting': profile.waiting
+            },
+            # Folded stacks, outermost frame first, for flame graph tools
+            'stacks': dict(profile.stacks.most_common())
+        }
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{trace.profile_id}.json")
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=1, default=str)
+        logger.info(f"Profiled {report['method']} {report['route']} in {report['duration_ms']}ms: {path}")
+    
+    async def handle(self, app, scope, receive, send):
+        """Serve one request under a trace; profile it when asked to"""
+        profile_id = None
+        profile = None
+        if self.wants_profile(scope):
+            profile_id = f"{datetime.now(pytz.UTC).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            profile = StackProfile(sys._getframe(), asyncio.current_task().get_coro())
+        
+        trace = RequestTrace(scope, profile_id)
+        token = _current_trace.set(trace)
+        status = None
+        first_byte_seconds = None
+        
+        async def send_traced(message):
+            nonlocal status, first_byte_seconds
+            if message['type'] == 'http.response.start':
+                # Time to the response head, so long-lived streams are not counted as slow
+                first_byte_seconds = time.perf_counter() - trace.started
+                status = message['status']
+                if profile is not None:
+                    self.sampler.remove(profile)
+                    message['headers'] = list(message.get('headers', [])) + [(b'x-profile-id', profile_id.encode())]
+            await send(message)
+        
+        if profile is not None:
+            self.sampler.add(profile)
+        try:
+            await app(scope, receive, send_traced)
+        finally:
+            if profile is not None:
+                self.sampler.remove(profile)
+            _current_trace.reset(token)
+            
+            seconds = first_byte_seconds if first_byte_seconds is not None else time.perf_counter() - trace.started
+            self.stats['requests'] += 1
+            if seconds >= self.slow_request_seconds:
+                self.stats['slow_requests'] += 1
+                slowest = sorted(trace.statements, key=lambda s: s['duration_ms'], reverse=True)[:5]
+                self._write_slow(
+                    'request', trace,
+                    method=scope.get('method'),
+                    status=status,
+                    duration_ms=round(seconds * 1000, 1),
+                    sql_ms=round(trace.sql_seconds * 1000, 1),
+                    statement_count=trace.statement_count,
+                    slowest_statements=slowest,
+                    profile_id=profile_id
+                )
+            if profile is not None:
+                self.stats['profiled'] += 1
+                try:
+                    await asyncio.to_thread(self._write_profile, trace, profile, status, seconds)
+                except Exception as e:
+                    logger.warning(f"Could not write profile {profile_id}: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Traced, profiled and slow request counts for this worker"""
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'token_configured': bool(self.token),
+            'slow_request_ms': self.slow_request_seconds * 1000,
+            'slow_query_ms': self.slow_query_seconds * 1000,
+            **self.stats
+        }
+
+class ProfilingMiddleware:
+    """ASGI middleware tracing HTTP requests through the request profiler"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        await request_profiler.handle(self.app, scope, receive, send)
+
+# Global request profiler instance
+request_profiler = RequestProfiler()
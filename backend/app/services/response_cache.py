@@ -0,0 +1,364 @@
+"""
+Response cache for City Pulse application
+Caches read endpoint responses in Redis under keys built from the endpoint,
+its query parameters and the data versions of the datasets it reads.
+Collectors bump those versions after each commit, so new data invalidates
+every dependent response at once without scanning keys. The same versions
+back the ETags that let idle pollers get a 304 without a database query.
+Request handlers talk to Redis through redis.asyncio so a lookup never
+blocks the event loop; the collectors' background threads keep the sync
+client for their version bumps and watermarks.
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import redis
+import redis.asyncio
+from fastapi import Header, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.async_database import consistent_read
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "citypulse"
+INVALIDATION_CHANNEL = f"{KEY_PREFIX}:invalidations"
+
+# Datasets the collectors write; endpoints declare which ones they read
+SOCIAL = 'social'
+ENVIRONMENTAL = 'environmental'
+# Social data for hours that had already closed (late data); bumped far less often than SOCIAL
+CLOSED_HOURS = 'closed_hours'
+
+# Release the stampede lock only if this request still owns it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Move a dataset's ingestion watermark forward, never back
+ADVANCE_WATERMARK_SCRIPT = """
+local current = redis.call('get', KEYS[1])
+if not current or tonumber(ARGV[1]) > tonumber(current) then
+    redis.call('set', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+class ResponseCache:
+    """Redis-backed response cache with data-version invalidation and stampede protection"""
+    
+    def __init__(self):
+        self.enabled = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+        self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+        # How long one request may hold a key's recompute lock before others give up waiting
+        self.lock_timeout = float(os.getenv("CACHE_LOCK_TIMEOUT_SECONDS", "10"))
+        self.poll_interval = 0.05
+        # After a Redis error, serve uncached for this long before retrying
+        self.retry_after = 30.0
+        
+        self._client = None
+        # One asyncio client per event loop, since its connections belong to the loop that opened them
+        self._async_clients: Dict[asyncio.AbstractEventLoop, redis.asyncio.Redis] = {}
+        self._unavailable_until = 0.0
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+    
+    def _get_client(self) -> Optional[redis.Redis]:
+        """Redis client, or None while caching is disabled or Redis is unreachable"""
+        if not self.enabled or time.monotonic() < self._unavailable_until:
+            return None
+        if self._client is None:
+            self._client = redis.Redis.from_url(
+                self.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5
+            )
+        return self._client
+    
+    def _get_async_client(self) -> Optional[redis.asyncio.Redis]:
+        """asyncio Redis client for the running loop, or None while caching is disabled or Redis is unreachable"""
+        if not self.available():
+            return None
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = redis.asyncio.Redis.from_url(
+                self.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5
+            )
+        return client
+    
+    async def release_async_client(self):
+        """Close the running loop's asyncio client; for background jobs whose loop is about to close"""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+    
+    def available(self) -> bool:
+        return self.enabled and time.monotonic() >= self._unavailable_until
+    
+    def _mark_unavailable(self, error: Exception):
+        logger.warning(f"Redis unavailable, serving uncached for {self.retry_after:.0f}s: {error}")
+        self._unavailable_until = time.monotonic() + self.retry_after
+    
+    def _record(self, endpoint: str, outcome: str):
+        with self._stats_lock:
+            counters = self._stats.setdefault(endpoint, {
+                'hits': 0, 'misses': 0, 'coalesced': 0, 'not_modified': 0, 'bypassed': 0
+            })
+            counters[outcome] += 1
+    
+    @staticmethod
+    def _version_key(dataset: str, zone_id: Optional[int] = None) -> str:
+        if zone_id is None:
+            return f"{KEY_PREFIX}:version:{dataset}"
+        return f"{KEY_PREFIX}:version:{dataset}:zone:{zone_id}"
+    
+    def publish_invalidation(self, dataset: str, zone_ids: List[int]):
+        """Bump the city-wide and per-zone versions of ``dataset`` after new data is committed"""
+        client = self._get_client()
+        if client is None:
+            return
+        
+        zone_ids = sorted(set(zone_ids))
+        try:
+            pipe = client.pipeline()
+            pipe.incr(self._version_key(dataset))
+            for zone_id in zone_ids:
+                pipe.incr(self._version_key(dataset, zone_id))
+            version = pipe.execute()[0]
+            client.publish(INVALIDATION_CHANNEL, json.dumps({
+                'dataset': dataset,
+                'zone_ids': zone_ids,
+                'version': version
+            }))
+        except redis.RedisError as e:
+            self._mark_unavailable(e)
+    
+    def advance_watermark(self, dataset: str, timestamp: float):
+        """Record that ``dataset`` has been committed up to ``timestamp`` (epoch seconds)"""
+        client = self._get_client()
+        if client is None:
+            return
+        try:
+            client.eval(ADVANCE_WATERMARK_SCRIPT, 1, f"{KEY_PREFIX}:watermark:{dataset}", timestamp)
+        except redis.RedisError as e:
+            self._mark_unavailable(e)
+    
+    def get_watermark(self, dataset: str) -> Optional[float]:
+        """Latest committed timestamp of ``dataset``, or None if unknown"""
+        client = self._get_client()
+        if client is None:
+            return None
+        try:
+            value = client.get(f"{KEY_PREFIX}:watermark:{dataset}")
+        except redis.RedisError as e:
+            self._mark_unavailable(e)
+            return None
+        return float(value) if value is not None else None
+    
+    async def get_watermark_async(self, dataset: str) -> Optional[float]:
+        """``get_watermark`` for request handlers"""
+        client = self._get_async_client()
+        if client is None:
+            return None
+        try:
+            value = await client.get(f"{KEY_PREFIX}:watermark:{dataset}")
+        except redis.RedisError as e:
+            self._mark_unavailable(e)
+            return None
+        return float(value) if value is not None else None
+    
+    async def _version_tag(self, client: redis.asyncio.Redis, dependencies: List[Tuple[str, Optional[int]]]) -> str:
+        """Current versions of an endpoint's dependencies, e.g. '41.7'"""
+        versions = await client.mget([self._version_key(dataset, zone_id) for dataset, zone_id in dependencies])
+        return '.'.join((v or b'0').decode() for v in versions)
+    
+    @staticmethod
+    def _cache_key(endpoint: str, params: Dict[str, Any], version_tag: str) -> str:
+        """Key for one response: endpoint, sorted params and current versions of its dependencies"""
+        query = urlencode(sorted((k, v) for k, v in params.items() if v is not None))
+        return f"{KEY_PREFIX}:cache:{endpoint}?{query}@{version_tag}"
+    
+    @staticmethod
+    def _etag(version_tag: str, ttl: int) -> str:
+        """Weak ETag for the data behind a response.
+        
+        Bodies carry a fresh timestamp, hence weak. The TTL bucket makes the tag
+        expire like the cached body does, so rolling time windows still refresh
+        when no new data arrives.
+        """
+        return f'W/"{version_tag}-{int(time.time() // ttl)}"'
+    
+    @staticmethod
+    def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+        if not if_none_match:
+            return False
+        candidates = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in candidates or any(tag.removeprefix('W/') == etag.removeprefix('W/') for tag in candidates)
+    
+    @staticmethod
+    def _render(result: Any) -> bytes:
+        """Serialize a response body the way FastAPI's JSONResponse does"""
+        return json.dumps(
+            jsonable_encoder(result), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+    
+    @staticmethod
+    def _response(body: bytes, status: str, etag: Optional[str] = None) -> Response:
+        headers = {"X-Cache": status}
+        if etag:
+            # Revalidate on every poll; unchanged data costs a bodiless 304
+            headers.update({"ETag": etag, "Cache-Control": "no-cache"})
+        return Response(content=body, media_type="application/json", headers=headers)
+    
+    async def get_or_compute(
+        self,
+        endpoint: str,
+        params: Dict[str, Any],
+        ttl: int,
+        dependencies: List[Tuple[str, Optional[int]]],
+        compute: Callable[[], Awaitable[Any]],
+        etag: bool = False,
+        if_none_match: Optional[str] = None
+    ) -> Any:
+        """Serve a cached response, or compute it once per key under concurrent misses.
+        
+        With ``etag`` the response carries a data-version ETag and a matching
+        ``If-None-Match`` is answered with 304 before any database work.
+        """
+        client = self._get_async_client()
+        if client is None:
+            self._record(endpoint, 'bypassed')
+            return await compute()
+        
+        try:
+            version_tag = await self._version_tag(client, dependencies)
+            entity_tag = self._etag(version_tag, ttl) if etag else None
+            if self._etag_matches(if_none_match, entity_tag or ''):
+                self._record(endpoint, 'not_modified')
+                return Response(status_code=304, headers={"ETag": entity_tag, "Cache-Control": "no-cache"})
+            
+            key = self._cache_key(endpoint, params, version_tag)
+            cached = await client.get(key)
+        except redis.RedisError as e:
+            self._mark_unavailable(e)
+            self._record(endpoint, 'bypassed')
+            return await compute()
+        
+        if cached is not None:
+            self._record(endpoint, 'hits')
+            return self._response(cached, "HIT", entity_tag)
+        
+        lock_key = f"{key}:lock"
+        token = uuid.uuid4().hex
+        try:
+            owner = await client.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000))
+        except redis.RedisError as e:
+            self._mark_unavailable(e)
+            owner = True
+        
+        if not owner:
+            # Another request is already computing this key: wait for its result
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                try:
+                    cached = await client.get(key)
+                    if cached is not None:
+                        self._record(endpoint, 'coalesced')
+                        return self._response(cached, "HIT", entity_tag)
+                    if not await client.exists(lock_key):
+                        break
+                except redis.RedisError as e:
+                    self._mark_unavailable(e)
+                    break
+        
+        self._record(endpoint, 'misses')
+        try:
+            body = self._render(await compute())
+            try:
+                await client.set(key, body, ex=ttl)
+            except redis.RedisError as e:
+                self._mark_unavailable(e)
+            return self._response(body, "MISS", entity_tag)
+        finally:
+            if owner:
+                try:
+                    await client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+                except redis.RedisError:
+                    pass
+    
+    def cached(self, endpoint: str, ttl: int, datasets: List[str], etag: bool = False):
+        """Decorator caching a read endpoint for ``ttl`` seconds.
+        
+        Query parameters become part of the key; a ``zone_id`` parameter scopes
+        invalidation to that zone's data versions instead of the city-wide ones.
+        With ``etag`` the endpoint also answers conditional GETs.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(**kwargs):
+                if_none_match = kwargs.pop('if_none_match', None)
+                params = {k: v for k, v in kwargs.items() if not isinstance(v, (Session, AsyncSession))}
+                zone_id = params.get('zone_id')
+                dependencies = [(dataset, zone_id) for dataset in datasets]
+                
+                async def compute():
+                    # Versions are read before this runs, so the body is at least as new as its key
+                    session_name = next((name for name, value in kwargs.items() if isinstance(value, AsyncSession)), None)
+                    if session_name is None:
+                        return await func(**kwargs)
+                    async with consistent_read(kwargs[session_name]) as db:
+                        return await func(**{**kwargs, session_name: db})
+                
+                return await self.get_or_compute(
+                    endpoint, params, ttl, dependencies, compute,
+                    etag=etag, if_none_match=if_none_match
+                )
+            
+            if etag:
+                # Have FastAPI pass the If-None-Match header without the endpoint declaring it
+                signature = inspect.signature(func)
+                header = inspect.Parameter(
+                    'if_none_match', inspect.Parameter.KEYWORD_ONLY,
+                    default=Header(None), annotation=Optional[str]
+                )
+                wrapper.__signature__ = signature.replace(parameters=[*signature.parameters.values(), header])
+            return wrapper
+        return decorator
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-endpoint hit/miss counters and hit ratios for this process"""
+        with self._stats_lock:
+            endpoints = {endpoint: dict(counters) for endpoint, counters in self._stats.items()}
+        
+        # A 304 is served without recomputing, so it counts as a hit
+        for counters in endpoints.values():
+            hits = counters['hits'] + counters['coalesced'] + counters['not_modified']
+            served = hits + counters['misses']
+            counters['hit_ratio'] = round(hits / served, 4) if served else None
+        
+        hits = sum(c['hits'] + c['coalesced'] + c['not_modified'] for c in endpoints.values())
+        served = hits + sum(c['misses'] for c in endpoints.values())
+        return {
+            'enabled': self.enabled,
+            'available': self.available(),
+            'hit_ratio': round(hits / served, 4) if served else None,
+            'endpoints': endpoints
+        }
+
+# Global response cache instance
+response_cache = ResponseCache()
@@ -0,0 +1,281 @@
+"""
+Span tracing for City Pulse application
+Times the ingestion path (collection, emotion tokenization and inference,
+flush, commit, publish) and API requests as nested spans. Finished spans
+are batched by a background thread and exported in the OTLP/JSON encoding,
+either appended to a local file or posted to an OTLP/HTTP collector.
+With TRACING_ENABLED unset every span is a shared no-op.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import requests
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds and status codes
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+STATUS_ERROR = 2
+
+# Spans buffered for export; beyond this they are dropped and counted
+MAX_QUEUED_SPANS = 10000
+EXPORT_BATCH_SIZE = 512
+
+# The span that new spans on this task or thread become children of
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+def _attribute_value(value) -> Dict[str, Any]:
+    """OTLP AnyValue for a Python attribute value"""
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+class Span:
+    """A timed operation; use as a context manager to make it the current span"""
+    
+    def __init__(self, tracer, name: str, trace_id: str, parent_id: Optional[str], kind: int,
+                 attributes: Dict[str, Any], start_ns: Optional[int] = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self._token = None
+    
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+    
+    def end(self, end_ns: Optional[int] = None):
+        if self.end_ns is None:
+            self.end_ns = end_ns or time.time_ns()
+            self.tracer._finish(self)
+    
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.end()
+        return False
+    
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id or '',
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [{'key': key, 'value': _attribute_value(value)} for key, value in self.attributes.items()]
+        }
+        if self.error:
+            span['status'] = {'code': STATUS_ERROR, 'message': self.error}
+        return span
+
+class NoopSpan:
+    """Stand-in returned while tracing is off"""
+    
+    def set_attribute(self, key: str, value):
+        pass
+    
+    def end(self, end_ns: Optional[int] = None):
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NOOP_SPAN = NoopSpan()
+
+class Tracer:
+    """Creates spans and exports them in batches from a background thread"""
+    
+    def __init__(self):
+        self.enabled = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+        self.service_name = os.getenv("TRACE_SERVICE_NAME", "city-pulse")
+        self.exporter = os.getenv("TRACE_EXPORTER", "file")
+        self.trace_file = os.getenv("TRACE_FILE", "traces/spans.jsonl")
+        self.otlp_endpoint = os.getenv("OTLP_ENDPOINT", "http://localhost:4318").rstrip('/') + "/v1/traces"
+        self.request_sample_rate = float(os.getenv("TRACE_REQUEST_SAMPLE_RATE", "1.0"))
+        self.export_interval = float(os.getenv("TRACE_EXPORT_INTERVAL_SECONDS", "2"))
+        
+        self._queue = queue.Queue(maxsize=MAX_QUEUED_SPANS)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {'exported': 0, 'dropped': 0, 'export_errors': 0}
+    
+    def current_span(self):
+        return _current_span.get()
+    
+    def start_span(self, name: str, kind: int = KIND_INTERNAL, parent: Optional[Span] = None,
+                   trace_id: Optional[str] = None, parent_id: Optional[str] = None,
+                   start_ns: Optional[int] = None, **attributes):
+        """Start a span under ``parent`` (default: the current span) without making it current"""
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = parent or _current_span.get()
+        if parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        return Span(self, name, trace_id or os.urandom(16).hex(), parent_id, kind, attributes, start_ns)
+    
+    def span(self, name: str, kind: int = KIND_INTERNAL, **attributes):
+        """Context manager timing a block as a child of the current span"""
+        return self.start_span(name, kind, **attributes)
+    
+    def _finish(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.stats['dropped'] += 1
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._export_loop, name="trace-exporter", daemon=True)
+                    self._thread.start()
+    
+    def _export_loop(self):
+        while True:
+            time.sleep(self.export_interval)
+            self.flush()
+    
+    def flush(self):
+        """Export every finished span now"""
+        while True:
+            batch = []
+            while len(batch) < EXPORT_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            try:
+                self._export(batch)
+                self.stats['exported'] += len(batch)
+            except Exception as e:
+                self.stats['export_errors'] += 1
+                logger.warning(f"Failed to export {len(batch)} spans to {self.exporter}: {e}")
+    
+    def _export(self, spans: List[Span]):
+        payload = {
+            'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.service_name}}]},
+                'scopeSpans': [{
+                    'scope': {'name': 'city_pulse'},
+                    'spans': [span.to_otlp() for span in spans]
+                }]
+            }]
+        }
+        if self.exporter == 'otlp':
+            response = requests.post(self.otlp_endpoint, json=payload, timeout=5)
+            response.raise_for_status()
+        else:
+            os.makedirs(os.path.dirname(self.trace_file) or '.', exist_ok=True)
+            with open(self.trace_file, 'a') as f:
+                f.write(json.dumps(payload) + '\n')
+    
+    def instrument(self, engine):
+        """Record each statement run on ``engine`` inside a span as a child ``db.query`` span"""
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if context is not None and _current_span.get() is not None:
+                context._trace_span = self.start_span(
+                    "db.query", KIND_CLIENT, **{'db.system': 'postgresql', 'db.statement': statement}
+                )
+        
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            span = getattr(context, '_trace_span', None)
+            if span is not None:
+                span.set_attribute('db.rows', cursor.rowcount)
+                span.end()
+        
+        def handle_error(exception_context):
+            span = getattr(exception_context.execution_context, '_trace_span', None)
+            if span is not None:
+                span.error = str(exception_context.original_exception)
+                span.end()
+        
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+        event.listen(engine, "handle_error", handle_error)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Export counts and queue depth for this process"""
+        return {
+            'enabled': self.enabled,
+            'exporter': self.exporter,
+            'target': self.otlp_endpoint if self.exporter == 'otlp' else self.trace_file,
+            'queued': self._queue.qsize(),
+            **self.stats
+        }
+
+class TracingMiddleware:
+    """ASGI middleware wrapping each sampled HTTP request in a server span"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or random.random() >= tracer.request_sample_rate:
+            await self.app(scope, receive, send)
+            return
+        
+        # Continue a caller's trace when it sends a W3C traceparent header
+        trace_id = parent_id = None
+        for name, value in scope.get('headers', []):
+            if name == b'traceparent':
+                parts = value.decode('latin-1').split('-')
+                if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+                    trace_id, parent_id = parts[1], parts[2]
+                break
+        
+        span = tracer.start_span(
+            f"{scope['method']} {scope['path']}", KIND_SERVER, trace_id=trace_id, parent_id=parent_id,
+            **{'http.method': scope['method'], 'http.target': scope['path']}
+        )
+        
+        async def send_traced(message):
+            if message['type'] == 'http.response.start':
+                # The request has been routed by now, so name the span after its route template
+                endpoint = scope.get('endpoint')
+                for route in scope['app'].routes if endpoint is not None else []:
+                    if getattr(route, 'endpoint', None) is endpoint:
+                        span.name = f"{scope['method']} {route.path}"
+                        span.set_attribute('http.route', route.path)
+                        break
+                span.set_attribute('http.status_code', message['status'])
+                # End at the response head so long-lived streams do not hold the span open
+                span.end()
+            await send(message)
+        
+        with span:
+            await self.app(scope, receive, send_traced)
+
+# Global tracer instance
+tracer = Tracer()
@@ -0,0 +1,72 @@
+"""
+Startup warm-up for City Pulse application
+The API keeps pandas, scikit-learn, torch and transformers out of its
+startup import graph so it starts serving without them. Once it is up, a
+background thread imports them and loads the emotion model so the first
+alert, forecast or ingest cycle does not pay for it. With
+WARMUP_ON_STARTUP=false they load on first use instead.
+"""
+
+import importlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+# Heavy packages that must not be imported while the API starts
+DEFERRED_MODULES = ['pandas', 'sklearn', 'torch', 'transformers']
+
+# Imported by the warm-up; torch and transformers come with the emotion model
+WARM_UP_IMPORTS = ['pandas', 'sklearn.preprocessing', 'sklearn.linear_model', 'sklearn.ensemble']
+
+class WarmUp:
+    """Loads the deferred modules and the emotion model in a background thread"""
+    
+    def __init__(self):
+        self.enabled = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+        self.state = 'disabled' if not self.enabled else 'pending'
+        self.seconds = {}
+        self.errors = {}
+        self._thread = None
+    
+    def start(self):
+        """Start warming up once; returns immediately"""
+        if not self.enabled or self._thread is not None or self.state == 'done':
+            return
+        self._thread = threading.Thread(target=self.run, name="warm-up", daemon=True)
+        self._thread.start()
+    
+    def _step(self, name: str, load):
+        started = time.perf_counter()
+        try:
+            load()
+        except Exception as e:
+            self.errors[name] = str(e)
+            logger.warning(f"Warm-up of {name} failed, it will load on first use: {e}")
+        self.seconds[name] = round(time.perf_counter() - started, 3)
+    
+    def run(self):
+        self.state = 'running'
+        started = time.perf_counter()
+        
+        for module in WARM_UP_IMPORTS:
+            self._step(module, lambda: importlib.import_module(module))
+        
+        from app.ml.emotion_service import emotion_service
+        self._step('emotion_model', emotion_service.ensure_loaded)
+        
+        self.state = 'done'
+        logger.info(f"Warm-up completed in {time.perf_counter() - started:.1f}s")
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'seconds': self.seconds,
+            'errors': self.errors
+        }
+
+# Global warm-up instance
+warm_up = WarmUp()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Forecast backtesting for City Pulse application
+Replays hourly mood series per zone with rolling-origin evaluation: at
+each origin every model is fitted on the HISTORY window of closed hours
+before it and scored on the hours after it. Reports MAE and MAPE per
+model together with its fit and predict time for all zones at once, per
+zone count. Runs offline on a synthetic city or on the hourly moods
+already in the database (e.g. from seed_data.py).
+"""
+
+import sys
+import os
+import time
+import json
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytz
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ml.forecasting import SimpleForecaster, BatchForecaster, HISTORY
+from app.ml import online_forecasting
+from app.ml.online_forecasting import HoltWintersState
+
+HOUR = 3600
+WINDOW = HISTORY.total_seconds()
+
+def synthetic_series(zones: int, days: int, missing: float, seed: int) -> dict:
+    """Hourly moods per zone: a level, daily seasonality, a slow drift, AR(1) noise and hours without posts"""
+    rng = np.random.default_rng(seed)
+    end = time.time() // HOUR * HOUR
+    hours = end - HOUR * np.arange(days * 24, 0, -1)
+    series = {}
+    for zone_id in range(1, zones + 1):
+        level = rng.uniform(40, 70)
+        amplitude = rng.uniform(5, 15)
+        peak = rng.uniform(0, 24)
+        drift = rng.uniform(-0.02, 0.02)
+        
+        noise = np.zeros(len(hours))
+        shocks = rng.normal(0, 3, len(hours))
+        for i in range(1, len(hours)):
+            noise[i] = 0.6 * noise[i - 1] + shocks[i]
+        
+        hour_of_day = hours / HOUR % 24
+        moods = level + amplitude * np.cos(2 * np.pi * (hour_of_day - peak) / 24) + drift * np.arange(len(hours)) + noise
+        kept = rng.random(len(hours)) >= missing
+        series[zone_id] = (hours[kept], np.round(np.clip(moods[kept], 0, 100), 2))
+    return series
+
+def database_series(days: int) -> dict:
+    """Hourly moods per zone over the last ``days`` days of closed hours in the database"""
+    from sqlalchemy import select, func
+    from app.database import SessionLocal
+    from app.ml.forecasting import hourly_arrays
+    from app.models import EmotionAnalysis
+    
+    db = SessionLocal()
+    try:
+        latest = db.scalar(select(func.max(EmotionAnalysis.created_at)))
+        if latest is None:
+            return {}
+        # The hour holding the latest post may still be filling up
+        until = datetime.fromtimestamp(latest.timestamp() // HOUR * HOUR, pytz.UTC)
+        zone_ids, hours, moods = hourly_arrays(db, until, since=until - timedelta(days=days))
+    finally:
+        db.close()
+    
+    zones, starts = np.unique(zone_ids, return_index=True)
+    ends = np.append(starts[1:], len(zone_ids))
+    return {int(zone_id): (hours[start:end], moods[start:end]) for zone_id, start, end in zip(zones, starts, ends)}
+
+def windows(series: dict, origin: float) -> dict:
+    """Each zone's closed hours in the HISTORY window before ``origin``"""
+    result = {}
+    for zone_id, (hours, moods) in series.items():
+        first, last = np.searchsorted(hours, [origin - WINDOW, origin])
+        if last > first:
+            result[zone_id] = (hours[first:last], moods[first:last])
+    return result
+
+def as_points(hours: np.ndarray, moods: np.ndarray) -> list:
+    """A window in the shape the per-zone forecasters take"""
+    return [
+        {'timestamp': datetime.fromtimestamp(hour, pytz.UTC).isoformat(), 'mood_index': mood}
+        for hour, mood in zip(hours.tolist(), moods.tolist())
+    ]
+
+def by_target(forecast: list) -> dict:
+    return {datetime.fromisoformat(point['timestamp']).timestamp(): point['predicted_mood_index'] for point in forecast}
+
+class LinearModel:
+    """The endpoints' per-zone regression, one fit per zone"""
+    
+    name = 'linear'
+    
+    def __init__(self):
+        self.forecaster = SimpleForecaster()
+    
+    def prepare(self, window: dict, origin: float):
+        return {zone_id: as_points(hours, moods) for zone_id, (hours, moods) in window.items()}
+    
+    def fit(self, data):
+        return {zone_id: self.forecaster.fit(points) for zone_id, points in data.items()}
+    
+    def predict(self, data, fitted, hours_ahead: int) -> dict:
+        return {
+            zone_id: self.forecaster.predict(fitted[zone_id], points, hours_ahead) if fitted[zone_id]
+            else self.forecaster._simple_trend_forecast(points, hours_ahead)
+            for zone_id, points in data.items()
+        }
+
+class TrendModel(LinearModel):
+    """The linear model's fallback: the last mood plus its recent trend"""
+    
+    name = 'trend'
+    
+    def fit(self, data):
+        return None
+    
+    def predict(self, data, fitted, hours_ahead: int) -> dict:
+        return {zone_id: self.forecaster._simple_trend_forecast(points, hours_ahead) for zone_id, points in data.items()}
+
+class BatchLinearModel:
+    """The city forecast's regression, fitted for all zones in one pass"""
+    
+    name = 'linear-batch'
+    
+    def __init__(self):
+        self.forecaster = BatchForecaster()
+    
+    def prepare(self, window: dict, origin: float):
+        zone_ids = sorted(window)
+        return (
+            np.concatenate([np.full(len(window[zone_id][0]), zone_id) for zone_id in zone_ids]),
+            np.concatenate([window[zone_id][0] for zone_id in zone_ids]),
+            np.concatenate([window[zone_id][1] for zone_id in zone_ids])
+        )
+    
+    def fit(self, data):
+        return self.forecaster.fit(*data)
+    
+    def predict(self, data, fitted, hours_ahead: int) -> dict:
+        return self.forecaster.predict(fitted, hours_ahead)
+
+class HoltWintersModel:
+    """The online model; fitting folds in the hours closed since the previous origin"""
+    
+    name = 'holt-winters'
+    
+    def __init__(self):
+        self.states = {}
+    
+    def prepare(self, window: dict, origin: float):
+        return {
+            zone_id: (hours[hours > self.states[zone_id].last_hour], moods[hours > self.states[zone_id].last_hour])
+            if zone_id in self.states else (hours, moods)
+            for zone_id, (hours, moods) in window.items()
+        }
+    
+    def fit(self, data):
+        for zone_id, (hours, moods) in data.items():
+            state = self.states.get(zone_id)
+            for hour, mood in zip(hours.tolist(), moods.tolist()):
+                if state is None:
+                    state = self.states[zone_id] = HoltWintersState.start(hour, mood)
+                else:
+                    state.update(hour, mood)
+        return [zone_id for zone_id in data if zone_id in self.states]
+    
+    def predict(self, data, fitted, hours_ahead: int) -> dict:
+        return dict(zip(fitted, online_forecasting.predict([self.states[zone_id] for zone_id in fitted], hours_ahead)))
+
+MODELS = {model.name: model for model in (LinearModel, TrendModel, BatchLinearModel, HoltWintersModel)}
+
+def backtest(series: dict, model_names: list, origins: list, horizon: int) -> dict:
+    """Fit and score every model at each origin, in order; returns per-model errors and timings"""
+    results = {}
+    for name in model_names:
+        model = MODELS[name]()
+        errors = {h: [] for h in range(1, horizon + 1)}
+        percentage_errors = []
+        fit_ms, predict_ms = [], []
+        for origin in origins:
+            window = windows(series, origin)
+            if not window:
+                continue
+            # Hours without posts at the end of a window push the forecast's start back
+            gap = max(round((origin - hours[-1]) / HOUR) - 1 for hours, _ in window.values())
+            data = model.prepare(window, origin)
+            
+            start = time.perf_counter()
+            fitted = model.fit(data)
+            fit_ms.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            forecasts = model.predict(data, fitted, horizon + gap)
+            predict_ms.append((time.perf_counter() - start) * 1000)
+            
+            for zone_id, forecast in forecasts.items():
+                predicted = by_target(forecast)
+                hours, moods = series[zone_id]
+                first, last = np.searchsorted(hours, [origin, origin + horizon * HOUR])
+                for hour, actual in zip(hours[first:last].tolist(), moods[first:last].tolist()):
+                    if hour not in predicted:
+                        continue
+                    error = predicted[hour] - actual
+                    errors[round((hour - origin) / HOUR) + 1].append(abs(error))
+                    if actual > 0:
+                        percentage_errors.append(abs(error) / actual * 100)
+        
+        points = [error for horizon_errors in errors.values() for error in horizon_errors]
+        results[name] = {
+            'points': len(points),
+            'mae': round(statistics.fmean(points), 3) if points else None,
+            'mape': round(statistics.fmean(percentage_errors), 2) if percentage_errors else None,
+            'mae_by_horizon': {h: round(statistics.fmean(e), 3) for h, e in errors.items() if e},
+            'fit_ms': round(statistics.median(fit_ms), 3) if fit_ms else None,
+            'predict_ms': round(statistics.median(predict_ms), 3) if predict_ms else None
+        }
+    return results
+
+def rolling_origins(series: dict, count: int, step: int, horizon: int) -> list:
+    """``count`` hour boundaries ``step`` hours apart, the last leaving ``horizon`` hours to score"""
+    end = max(hours[-1] for hours, _ in series.values()) + HOUR
+    last = end - horizon * HOUR
+    return [last - i * step * HOUR for i in reversed(range(count))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the mood forecasters with rolling origins")
+    parser.add_argument("--source", choices=['synthetic', 'db'], default='synthetic', help="hourly moods to replay")
+    parser.add_argument("--zones", type=int, nargs='+', default=[5, 50, 200], help="zone counts to evaluate")
+    parser.add_argument("--models", nargs='+', choices=list(MODELS), default=list(MODELS), help="models to evaluate")
+    parser.add_argument("--origins", type=int, default=24, help="forecast origins per run")
+    parser.add_argument("--step", type=int, default=1, help="hours between origins")
+    parser.add_argument("--horizon", type=int, default=24, help="hours forecast and scored after each origin")
+    parser.add_argument("--days", type=int, default=14, help="days of hourly moods to generate or read")
+    parser.add_argument("--missing", type=float, default=0.05, help="share of synthetic hours without posts")
+    parser.add_argument("--seed", type=int, default=42, help="synthetic data seed")
+    parser.add_argument("--json", action='store_true', help="print the results as JSON")
+    args = parser.parse_args()
+    
+    if args.source == 'synthetic':
+        series = synthetic_series(max(args.zones), args.days, args.missing, args.seed)
+    else:
+        series = database_series(args.days)
+    if not series:
+        print("No hourly moods to replay")
+        sys.exit(1)
+    
+    origins = rolling_origins(series, args.origins, args.step, args.horizon)
+    zone_ids = sorted(series)
+    zone_counts = sorted({min(count, len(zone_ids)) for count in args.zones})
+    if zone_counts[-1] < max(args.zones):
+        print(f"Only {len(zone_ids)} zones have moods; evaluating {zone_counts}", file=sys.stderr)
+    
+    results = {}
+    for count in zone_counts:
+        subset = {zone_id: series[zone_id] for zone_id in zone_ids[:count]}
+        results[count] = backtest(subset, args.models, origins, args.horizon)
+    
+    if args.json:
+        print(json.dumps({
+            'source': args.source,
+            'origins': [datetime.fromtimestamp(origin, pytz.UTC).isoformat() for origin in origins],
+            'horizon': args.horizon,
+            'results': results
+        }, indent=2))
+        return
+    
+    print(f"{args.source} data, {len(origins)} origins every {args.step}h from "
+          f"{datetime.fromtimestamp(origins[0], pytz.UTC).isoformat()}, {args.horizon}h horizon")
+    horizons = sorted({1, min(6, args.horizon), args.horizon})
+    header = f"{'zones':>6} {'model':<13} {'MAE':>7} {'MAPE%':>7} " + ' '.join(f"{f'MAE@{h}':>8}" for h in horizons)
+    print(header + f" {'fit ms':>9} {'predict ms':>11} {'us/zone':>9}")
+    for count, models in results.items():
+        for name, result in models.items():
+            if result['mae'] is None:
+                print(f"{count:>6} {name:<13} {'no forecasts':>15}")
+                continue
+            by_horizon = ' '.join(f"{result['mae_by_horizon'].get(h, float('nan')):>8.2f}" for h in horizons)
+            per_zone = (result['fit_ms'] + result['predict_ms']) * 1000 / count
+            print(f"{count:>6} {name:<13} {result['mae']:>7.2f} {result['mape']:>7.2f} {by_horizon} "
+                  f"{result['fit_ms']:>9.2f} {result['predict_ms']:>11.2f} {per_zone:>9.0f}")
+
+if __name__ == "__main__":
+    main()
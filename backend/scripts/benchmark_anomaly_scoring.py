@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Anomaly scoring benchmark for City Pulse application
+Times the Isolation Forest the anomaly_scoring job runs: training on a
+sliding window of zone-hours and batch scoring of one closed hour (every
+zone at once) and of the whole window, for each window size and zone
+count. Runs offline on synthetic feature vectors, or with --db also
+times building the window's features from the database.
+"""
+
+import sys
+import os
+import time
+import json
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytz
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ml.anomaly_detection import AnomalyDetector, hourly_features, MOOD_FEATURES
+
+ENV_TYPES = ['air_quality', 'humidity', 'noise_level', 'temperature']
+
+def synthetic_features(zones: int, days: int, missing: float, seed: int) -> np.ndarray:
+    """One row per zone-hour with mood statistics and env means, some readings missing and a few outliers"""
+    rng = np.random.default_rng(seed)
+    rows = zones * days * 24
+    mood_mean = rng.normal(55, 8, rows)
+    mood_std = np.abs(rng.normal(20, 4, rows))
+    features = np.column_stack([
+        mood_mean,
+        mood_std,
+        np.clip(mood_mean - 2 * mood_std, 0, 100),
+        np.clip(mood_mean + 2 * mood_std, 0, 100),
+        rng.poisson(8, rows).astype(float),
+        rng.normal(60, 15, rows),
+        rng.normal(55, 10, rows),
+        rng.normal(65, 8, rows),
+        rng.normal(20, 6, rows),
+    ])
+    features[rng.random(features.shape) < missing] = np.nan
+    outliers = rng.random(rows) < 0.01
+    features[outliers] *= rng.uniform(1.5, 3, (outliers.sum(), features.shape[1]))
+    return features
+
+def median_ms(func, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def measure(features: np.ndarray, zones: int, repeats: int) -> dict:
+    detector = AnomalyDetector()
+    feature_names = MOOD_FEATURES + ENV_TYPES
+    trained_until = datetime.now(pytz.UTC)
+    fit_ms = median_ms(lambda: detector.fit_isolation_forest(features, feature_names, trained_until), repeats)
+    hour = features[-zones:]
+    window_ms = median_ms(lambda: detector.score_isolation_forest(features), repeats)
+    return {
+        'rows': len(features),
+        'fit_ms': fit_ms,
+        'score_hour_ms': median_ms(lambda: detector.score_isolation_forest(hour), repeats),
+        'score_window_ms': window_ms,
+        'score_row_us': window_ms * 1000 / len(features),
+        'flagged': int(detector.score_isolation_forest(features)[1].sum()),
+    }
+
+def measure_database(days_list: list, repeats: int) -> dict:
+    """Median time to build each window's feature matrix from the database, ending at the current hour"""
+    from app.database import SessionLocal
+    
+    until = datetime.now(pytz.UTC).replace(minute=0, second=0, microsecond=0)
+    results = {}
+    db = SessionLocal()
+    try:
+        for days in days_list:
+            rows = len(hourly_features(db, until - timedelta(days=days), until)[2])
+            results[days] = {
+                'rows': rows,
+                'features_ms': median_ms(lambda: hourly_features(db, until - timedelta(days=days), until), repeats),
+            }
+    finally:
+        db.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Time Isolation Forest training and scoring against window size")
+    parser.add_argument("--days", default="1,7,30", help="comma-separated training window sizes in days")
+    parser.add_argument("--zones", default="5,50", help="comma-separated zone counts")
+    parser.add_argument("--missing", type=float, default=0.05, help="fraction of feature values missing")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per measurement (median reported)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", action="store_true", help="also time building the windows' features from the database")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    
+    days_list = [int(days) for days in args.days.split(',')]
+    zone_counts = [int(zones) for zones in args.zones.split(',')]
+    
+    results = {}
+    for zones in zone_counts:
+        for days in days_list:
+            features = synthetic_features(zones, days, args.missing, args.seed)
+            results[f"{zones}x{days}d"] = measure(features, zones, args.repeats)
+    database = measure_database(days_list, args.repeats) if args.db else None
+    
+    if args.json:
+        print(json.dumps({'synthetic': results, 'database': database}, indent=2))
+        return
+    
+    print(f"{'window':<10} {'rows':>8} {'fit ms':>9} {'hour ms':>9} {'window ms':>10} {'us/row':>8} {'flagged':>8}")
+    for window, result in results.items():
+        print(f"{window:<10} {result['rows']:>8} {result['fit_ms']:>9.1f} {result['score_hour_ms']:>9.2f} "
+              f"{result['score_window_ms']:>10.1f} {result['score_row_us']:>8.2f} {result['flagged']:>8}")
+    if database:
+        print(f"\n{'db window':<10} {'rows':>8} {'features ms':>12}")
+        for days, result in database.items():
+            print(f"{str(days) + 'd':<10} {result['rows']:>8} {result['features_ms']:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for City Pulse application
+Simulates dashboard clients against a running API: each client refreshes
+the dashboard (city pulse, post feed, environment, a zone panel and the
+alert summary, fetched concurrently like the panels do) in a loop. Reports
+dashboard refreshes and requests per second, latency percentiles and
+errors at each client count.
+
+Start the API with RESPONSE_CACHE_ENABLED=false to measure the database
+path rather than Redis hits.
+"""
+
+import os
+import time
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+DASHBOARD = [
+    "/api/now",
+    "/api/recent-posts",
+    "/api/environmental-overview",
+    "/api/zone/{zone_id}",
+    "/api/alerts/summary",
+]
+
+async def dashboard_client(client: httpx.AsyncClient, paths: list, deadline: float, think_time: float, results: dict):
+    """Refresh the dashboard until ``deadline``, recording each refresh's latency"""
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.get(path) for path in paths), return_exceptions=True)
+        results['latencies'].append(time.perf_counter() - started)
+        results['requests'] += len(paths)
+        results['errors'] += sum(
+            1 for r in responses if isinstance(r, Exception) or r.status_code != 200
+        )
+        if think_time:
+            await asyncio.sleep(think_time)
+
+async def run_level(base_url: str, paths: list, clients: int, duration: float, think_time: float) -> dict:
+    """Run ``clients`` dashboard clients for ``duration`` seconds"""
+    results = {'latencies': [], 'requests': 0, 'errors': 0}
+    limits = httpx.Limits(max_connections=clients * len(paths), max_keepalive_connections=clients * len(paths))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        # Warm the connection pools on both sides before timing
+        await asyncio.gather(*(client.get(path) for path in paths), return_exceptions=True)
+        
+        started = time.monotonic()
+        deadline = started + duration
+        await asyncio.gather(*(
+            dashboard_client(client, paths, deadline, think_time, results) for _ in range(clients)
+        ))
+        elapsed = time.monotonic() - started
+    
+    latencies = results['latencies']
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [float('nan')] * 99
+    return {
+        'clients': clients,
+        'refreshes_per_s': len(latencies) / elapsed,
+        'requests_per_s': results['requests'] / elapsed,
+        'p50_ms': percentiles[49] * 1000,
+        'p95_ms': percentiles[94] * 1000,
+        'p99_ms': percentiles[98] * 1000,
+        'errors': results['errors']
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API throughput at increasing numbers of concurrent dashboard clients")
+    parser.add_argument("--base-url", default=os.getenv("API_URL", "http://localhost:8000"), help="API to benchmark")
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 100, 250, 500], help="concurrent client counts to run")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per client count")
+    parser.add_argument("--think-time", type=float, default=0.0, help="pause between a client's refreshes in seconds")
+    parser.add_argument("--zone-id", type=int, default=1, help="zone shown in the zone panel")
+    args = parser.parse_args()
+    
+    paths = [path.format(zone_id=args.zone_id) for path in DASHBOARD]
+    print(f"Benchmarking {args.base_url}: {len(paths)} requests per dashboard refresh, {args.duration:.0f}s per level")
+    print(f"\n{'clients':>8} {'refresh/s':>10} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for clients in args.clients:
+        r = asyncio.run(run_level(args.base_url, paths, clients, args.duration, args.think_time))
+        print(f"{r['clients']:>8} {r['refreshes_per_s']:>10.1f} {r['requests_per_s']:>9.1f} "
+              f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['errors']:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Storage layout benchmark for City Pulse application
+Seeds the NUMERIC and compact REAL layouts of emotion_analysis and
+environmental_data side by side and reports row width, table size,
+aggregate scan time and Python decode time for each
+"""
+
+import sys
+import os
+import time
+import argparse
+import statistics
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine
+from sqlalchemy import text
+
+EMOTIONS = ['joy', 'sadness', 'anger', 'fear', 'surprise', 'disgust', 'neutral']
+
+LAYOUTS = {
+    'numeric': {'score': 'DECIMAL(5,4)', 'mood': 'DECIMAL(5,2)', 'value': 'DECIMAL(10,4)'},
+    'compact': {'score': 'REAL', 'mood': 'REAL', 'value': 'REAL'},
+}
+
+def create_tables(conn, layout: str, types: dict, rows: int):
+    """Create and seed temporary copies of both measurement tables"""
+    score_columns = ',\n'.join(f"{e} {types['score']} NOT NULL" for e in EMOTIONS)
+    conn.execute(text(f"""
+        CREATE TEMP TABLE bench_emotion_{layout} (
+            id SERIAL PRIMARY KEY,
+            post_id INTEGER,
+            zone_id INTEGER,
+            {score_columns},
+            dominant_emotion VARCHAR(20) NOT NULL,
+            mood_index {types['mood']} NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE
+        )
+    """))
+    conn.execute(text(f"""
+        CREATE TEMP TABLE bench_env_{layout} (
+            id SERIAL PRIMARY KEY,
+            zone_id INTEGER,
+            data_type VARCHAR(50) NOT NULL,
+            value {types['value']} NOT NULL,
+            unit VARCHAR(20) NOT NULL,
+            source VARCHAR(50) NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE
+        )
+    """))
+    
+    # setseed() makes both layouts hold the same values
+    conn.execute(text("SELECT setseed(0.42)"))
+    score_values = ', '.join(f"round(random()::numeric, 4)" for _ in EMOTIONS)
+    conn.execute(text(f"""
+        INSERT INTO bench_emotion_{layout} (post_id, zone_id, {', '.join(EMOTIONS)}, dominant_emotion, mood_index, created_at)
+        SELECT g, (g % 5) + 1, {score_values}, 'joy', round((random() * 100)::numeric, 2),
+               NOW() - make_interval(secs => g * 10)
+        FROM generate_series(1, :rows) g
+    """), {'rows': rows})
+    
+    conn.execute(text("SELECT setseed(0.42)"))
+    conn.execute(text(f"""
+        INSERT INTO bench_env_{layout} (zone_id, data_type, value, unit, source, created_at)
+        SELECT (g % 5) + 1, (ARRAY['air_quality', 'temperature', 'humidity', 'pressure'])[(g % 4) + 1],
+               round((random() * 1000)::numeric, 4), 'x', 'weather_station',
+               NOW() - make_interval(secs => g * 10)
+        FROM generate_series(1, :rows) g
+    """), {'rows': rows})
+    
+    conn.execute(text(f"ANALYZE bench_emotion_{layout}"))
+    conn.execute(text(f"ANALYZE bench_env_{layout}"))
+
+def time_query(conn, query: str, repeats: int, fetch_python: bool = False) -> float:
+    """Median wall time in milliseconds of ``query``"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = conn.execute(text(query))
+        if fetch_python:
+            # Touch every value the way the API read paths do
+            total = 0.0
+            for row in result:
+                total += sum(float(v) for v in row)
+        else:
+            result.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def measure(conn, layout: str, repeats: int) -> dict:
+    emotion_table = f"bench_emotion_{layout}"
+    env_table = f"bench_env_{layout}"
+    avg_scores = ', '.join(f"AVG({e})" for e in EMOTIONS)
+    
+    return {
+        'emotion_row_bytes': float(conn.execute(text(f"SELECT AVG(pg_column_size(t.*)) FROM {emotion_table} t")).scalar()),
+        'emotion_table_bytes': conn.execute(text(f"SELECT pg_table_size('{emotion_table}')")).scalar(),
+        'env_row_bytes': float(conn.execute(text(f"SELECT AVG(pg_column_size(t.*)) FROM {env_table} t")).scalar()),
+        'env_table_bytes': conn.execute(text(f"SELECT pg_table_size('{env_table}')")).scalar(),
+        'emotion_scan_ms': time_query(conn, f"""
+            SELECT zone_id, date_trunc('hour', created_at), AVG(mood_index), {avg_scores}
+            FROM {emotion_table} GROUP BY 1, 2
+        """, repeats),
+        'env_scan_ms': time_query(conn, f"""
+            SELECT zone_id, data_type, date_trunc('hour', created_at), AVG(value), MIN(value), MAX(value)
+            FROM {env_table} GROUP BY 1, 2, 3
+        """, repeats),
+        'emotion_decode_ms': time_query(conn, f"SELECT mood_index, {', '.join(EMOTIONS)} FROM {emotion_table}", repeats, fetch_python=True),
+        'env_decode_ms': time_query(conn, f"SELECT value FROM {env_table}", repeats, fetch_python=True),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare NUMERIC and compact REAL storage layouts")
+    parser.add_argument("--rows", type=int, default=200000, help="rows seeded per table")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per query (median reported)")
+    args = parser.parse_args()
+    
+    print(f"Seeding {args.rows} rows per table and layout...")
+    results = {}
+    with engine.connect() as conn:
+        for layout, types in LAYOUTS.items():
+            create_tables(conn, layout, types, args.rows)
+            results[layout] = measure(conn, layout, args.repeats)
+        conn.rollback()
+    
+    print(f"{'metric':<22} {'numeric':>12} {'compact':>12} {'change':>9}")
+    for metric in results['numeric']:
+        before = results['numeric'][metric]
+        after = results['compact'][metric]
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{metric:<22} {before:>12.1f} {after:>12.1f} {change:>8.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Query count check for City Pulse application
+Calls the post feed endpoints at several page sizes and fails if any of
+them issues more SQL statements than its budget, which catches N+1 lazy
+loads. Seeds its own rows inside a transaction that is rolled back.
+"""
+
+import sys
+import os
+import asyncio
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import pytz
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import create_tables
+from app.async_database import async_engine, get_async_db, get_async_read_db
+from app.models import CityZone, SocialPost, EmotionAnalysis
+from api.routers import now, zone
+
+# Statements each endpoint may issue, independent of the page size
+QUERY_BUDGETS = {
+    "/api/recent-posts": 1,
+    "/api/zone/{zone_id}/posts": 2,  # zone lookup + page
+}
+
+PAGE_SIZES = [1, 10, 50]
+
+async def seed_posts(session: AsyncSession, count: int) -> int:
+    """Add a zone with ``count`` analysed posts; returns the zone id"""
+    city_zone = CityZone(name='Query count check', geometry='POINT(-73.9 40.7)',
+                         center_lat=Decimal('40.7'), center_lon=Decimal('-73.9'))
+    session.add(city_zone)
+    await session.flush()
+    
+    start = datetime.now(pytz.UTC)
+    for i in range(count):
+        created_at = start - timedelta(minutes=i)
+        post = SocialPost(zone_id=city_zone.id, content=f'Query count post {i}', source='twitter',
+                          lat=Decimal('40.7'), lon=Decimal('-73.9'), created_at=created_at)
+        session.add(post)
+        await session.flush()
+        session.add(EmotionAnalysis(
+            post_id=post.id, zone_id=city_zone.id, joy=0.4, sadness=0.1, anger=0.1, fear=0.1,
+            surprise=0.1, disgust=0.1, neutral=0.1, dominant_emotion='joy', mood_index=70.0,
+            created_at=created_at
+        ))
+    await session.flush()
+    return city_zone.id
+
+async def count_statements(connection, client: httpx.AsyncClient, path: str, params: dict) -> tuple:
+    """Call ``path`` and return (statements executed, posts returned)"""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    # Async connections emit cursor events from the sync connection they wrap
+    event.listen(connection.sync_connection, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = await client.get(path, params=params)
+    finally:
+        event.remove(connection.sync_connection, "before_cursor_execute", before_cursor_execute)
+    
+    if response.status_code != 200:
+        raise RuntimeError(f"{path} returned {response.status_code}: {response.text[:200]}")
+    return len(statements), response.json()['count']
+
+async def run_checks() -> int:
+    """Seed, call every endpoint at every page size and return the number of failures"""
+    connection = await async_engine.connect()
+    transaction = await connection.begin()
+    session = AsyncSession(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        zone_id = await seed_posts(session, max(PAGE_SIZES) + 1)
+        
+        app = FastAPI()
+        app.include_router(now.router, prefix="/api")
+        app.include_router(zone.router, prefix="/api/zone")
+        app.dependency_overrides[get_async_db] = lambda: session
+        app.dependency_overrides[get_async_read_db] = lambda: session
+        # Serve the app on this event loop so it can use the seeded connection
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check")
+        
+        failures = 0
+        print(f"{'endpoint':<30} {'limit':>6} {'posts':>6} {'queries':>8} {'budget':>7}")
+        for template, budget in QUERY_BUDGETS.items():
+            path = template.format(zone_id=zone_id)
+            for limit in PAGE_SIZES:
+                queries, posts = await count_statements(connection, client, path, {'limit': limit})
+                ok = queries <= budget and posts == limit
+                failures += not ok
+                print(f"{template:<30} {limit:>6} {posts:>6} {queries:>8} {budget:>7}  {'ok' if ok else 'FAIL'}")
+        await client.aclose()
+    finally:
+        await session.close()
+        await transaction.rollback()
+        await connection.close()
+        await async_engine.dispose()
+    return failures
+
+def main():
+    create_tables()
+    
+    failures = asyncio.run(run_checks())
+    if failures:
+        print(f"{failures} check(s) exceeded their query budget")
+        sys.exit(1)
+    print("All endpoints within their query budgets")
+
+if __name__ == "__main__":
+    main()
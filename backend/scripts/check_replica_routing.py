@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Read replica routing check for City Pulse application
+Needs DATABASE_URL pointing at a primary and DATABASE_REPLICA_URL at a
+streaming standby of it. Checks that read endpoints use the replica while
+it is caught up, fall back to the primary when replay is paused past the
+lag limit, and return once it catches up. Pausing replay needs a superuser
+on the replica; a throwaway row is written to the primary and removed.
+"""
+
+import sys
+import os
+import time
+import asyncio
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, event, text
+from app.database import engine, DATABASE_REPLICA_URL, read_router
+from app.async_database import async_engine, async_replica_engine, get_database_stats
+from app.services.response_cache import response_cache
+from api.routers import now
+
+# Lag limit for the check, so a paused replica crosses it quickly
+MAX_LAG_SECONDS = 1.0
+
+def touch_primary():
+    """Commit a throwaway write so the standby has WAL left to replay"""
+    with engine.begin() as conn:
+        zone_id = conn.execute(text(
+            "INSERT INTO city_zones (name, geometry, center_lat, center_lon) "
+            "VALUES ('Replica routing check', 'POINT(0 0)', 0, 0) RETURNING id"
+        )).scalar()
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM city_zones WHERE id = :id"), {'id': zone_id})
+
+async def served_by(client: httpx.AsyncClient) -> str:
+    """Call a read endpoint and return which database answered it"""
+    targets = []
+    
+    # The routing policy's lag and caught-up probes are not part of the request
+    def on_primary(conn, cursor, statement, *args):
+        if 'pg_current_wal_lsn' not in statement:
+            targets.append('primary')
+    
+    def on_replica(conn, cursor, statement, *args):
+        if 'pg_is_in_recovery' not in statement:
+            targets.append('replica')
+    
+    event.listen(async_engine.sync_engine, "before_cursor_execute", on_primary)
+    event.listen(async_replica_engine.sync_engine, "before_cursor_execute", on_replica)
+    try:
+        response = await client.get("/api/now")
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", on_primary)
+        event.remove(async_replica_engine.sync_engine, "before_cursor_execute", on_replica)
+    
+    if response.status_code != 200:
+        raise RuntimeError(f"/api/now returned {response.status_code}: {response.text[:200]}")
+    return ','.join(sorted(set(targets))) or 'none'
+
+async def run_checks(replica_admin) -> int:
+    """Walk the replica through caught up, lagging and recovered; returns the number of failures"""
+    app = FastAPI()
+    app.include_router(now.router, prefix="/api")
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check")
+    
+    failures = 0
+    
+    async def expect(step: str, target: str):
+        nonlocal failures
+        actual = await served_by(client)
+        lag = read_router.get_stats()['replica_lag_seconds']
+        ok = actual == target
+        failures += not ok
+        print(f"{step:<28} lag {lag if lag is not None else '-':>8}s  served by {actual:<8} {'ok' if ok else f'FAIL (expected {target})'}")
+    
+    try:
+        await expect("caught up", "replica")
+        
+        with replica_admin.connect() as conn:
+            conn.execute(text("SELECT pg_wal_replay_pause()"))
+            # The pause takes hold at the next record, which may still be replayed
+            for _ in range(10):
+                touch_primary()
+                time.sleep(0.2)
+                if conn.execute(text("SELECT pg_last_wal_receive_lsn() <> pg_last_wal_replay_lsn()")).scalar():
+                    break
+        time.sleep(MAX_LAG_SECONDS + 1)
+        await expect("replay paused", "primary")
+        
+        with replica_admin.connect() as conn:
+            conn.execute(text("SELECT pg_wal_replay_resume()"))
+        time.sleep(1)
+        await expect("replay resumed", "replica")
+    finally:
+        with replica_admin.connect() as conn:
+            conn.execute(text("SELECT pg_wal_replay_resume()"))
+        await client.aclose()
+    
+    stats = get_database_stats()
+    print(f"\nSessions: {stats['routing']['sessions']}")
+    for target, pool in stats['pools'].items():
+        print(f"Pool {target:<14} {pool}")
+    
+    await async_engine.dispose()
+    await async_replica_engine.dispose()
+    return failures
+
+def main():
+    if not DATABASE_REPLICA_URL:
+        print("Set DATABASE_REPLICA_URL to a streaming standby of DATABASE_URL")
+        sys.exit(2)
+    
+    # Every request must reach a database, measure lag and fall back quickly
+    response_cache.enabled = False
+    read_router.check_interval = 0
+    read_router.max_lag = MAX_LAG_SECONDS
+    replica_admin = create_engine(DATABASE_REPLICA_URL, isolation_level="AUTOCOMMIT")
+    
+    failures = asyncio.run(run_checks(replica_admin))
+    replica_admin.dispose()
+    if failures:
+        print(f"{failures} routing check(s) failed")
+        sys.exit(1)
+    print("Read routing follows replica lag")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Query plan benchmark for City Pulse application
+Seeds a dataset, calls every read endpoint, captures the SQL each one
+issues and records EXPLAIN ANALYZE for it under the original index set
+(before) and the tuned one from sql/migrations/002_query_indexes.sql and
+004_keyset_indexes.sql (after)
+
+Writes to the database in DATABASE_URL; point it at a scratch database.
+"""
+
+import sys
+import os
+import re
+import argparse
+from collections import OrderedDict
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+from app.database import engine, create_tables
+from app.async_database import async_engine
+from api.routers import now, zone, forecast, alerts
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'sql', 'migrations')
+
+ENDPOINTS = [
+    "/api/now",
+    "/api/recent-posts",
+    "/api/environmental-overview",
+    "/api/zone/{zone_id}",
+    "/api/zone/{zone_id}/series",
+    "/api/zone/{zone_id}/posts",
+    "/api/forecast/zone/{zone_id}",
+    "/api/forecast/city",
+    "/api/alerts/mood-anomalies",
+    "/api/alerts/environmental-anomalies",
+    "/api/alerts/summary",
+]
+
+def build_app() -> FastAPI:
+    """The API routers without the background collectors and ML model"""
+    app = FastAPI()
+    app.include_router(now.router, prefix="/api")
+    app.include_router(zone.router, prefix="/api/zone")
+    app.include_router(forecast.router, prefix="/api/forecast")
+    app.include_router(alerts.router, prefix="/api/alerts")
+    return app
+
+def seed_dataset(rows: int, days: int):
+    """Insert ``rows`` posts with emotion analysis and environmental readings spread over ``days``"""
+    with engine.begin() as conn:
+        if not conn.execute(text("SELECT COUNT(*) FROM city_zones")).scalar():
+            conn.execute(text("""
+                INSERT INTO city_zones (name, geometry, center_lat, center_lon)
+                SELECT 'Zone ' || g, 'POINT(-73.9 40.7)', 40.7, -73.9 FROM generate_series(1, 5) g
+            """))
+        
+        conn.execute(text("""
+            WITH zone_ids AS (SELECT array_agg(id) AS ids FROM city_zones),
+            posts AS (
+                INSERT INTO social_posts (zone_id, content, source, lat, lon, location, created_at)
+                SELECT ids[1 + g % array_length(ids, 1)], 'Benchmark post ' || g, 'twitter',
+                       40.7, -73.9, 'POINT(-73.9 40.7)',
+                       NOW() - random() * make_interval(days => :days)
+                FROM generate_series(1, :rows) g, zone_ids
+                RETURNING id, zone_id, created_at
+            )
+            INSERT INTO emotion_analysis (post_id, zone_id, joy, sadness, anger, fear, surprise, disgust, neutral,
+                                          dominant_emotion, mood_index, created_at)
+            SELECT id, zone_id, 0.3, 0.1, 0.1, 0.1, 0.1, 0.1, 0.2,
+                   (ARRAY['joy', 'neutral', 'anger', 'sadness'])[1 + (id % 4)],
+                   round((random() * 100)::numeric, 2), created_at
+            FROM posts
+        """), {'rows': rows, 'days': days})
+        
+        conn.execute(text("""
+            WITH zone_ids AS (SELECT array_agg(id) AS ids FROM city_zones)
+            INSERT INTO environmental_data (zone_id, data_type, value, unit, source, lat, lon, location, created_at)
+            SELECT ids[1 + g % array_length(ids, 1)],
+                   (ARRAY['air_quality', 'temperature', 'humidity', 'noise_level'])[1 + g % 4],
+                   round((random() * 200)::numeric, 2), 'x', 'weather_station',
+                   40.7, -73.9, 'POINT(-73.9 40.7)',
+                   NOW() - random() * make_interval(days => :days)
+            FROM generate_series(1, :rows) g, zone_ids
+        """), {'rows': rows, 'days': days})
+
+def run_autocommit(sql: str):
+    """Run SQL outside a transaction block (migrations, VACUUM)"""
+    raw = engine.raw_connection()
+    try:
+        raw.rollback()
+        raw.dbapi_connection.autocommit = True
+        with raw.cursor() as cursor:
+            cursor.execute(sql)
+    finally:
+        raw.dbapi_connection.autocommit = False
+        raw.close()
+
+def apply_migration(filename: str):
+    """Run a migration file as-is (it manages its own transaction)"""
+    with open(os.path.join(MIGRATIONS_DIR, filename)) as f:
+        run_autocommit(f.read())
+
+def capture_statements(client: TestClient, path: str) -> list:
+    """Call ``path`` and return each distinct SELECT it issued with its parameters"""
+    captured = OrderedDict()
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("SELECT"):
+            return
+        # The routers run on asyncpg; recompile for the psycopg2 connection that EXPLAINs it
+        compiled = context.compiled.statement.compile(dialect=engine.dialect)
+        if str(compiled) not in captured:
+            captured[str(compiled)] = compiled.params
+    
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(path)
+        if response.status_code != 200:
+            print(f"  {path} returned {response.status_code}: {response.text[:200]}")
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return list(captured.items())
+
+def explain(statement: str, parameters) -> tuple:
+    """EXPLAIN ANALYZE a captured statement; returns (execution ms, plan text)"""
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        raw.rollback()
+    finally:
+        raw.close()
+    match = re.search(r"Execution Time: ([\d.]+) ms", plan)
+    return (float(match.group(1)) if match else 0.0), plan
+
+def scan_nodes(plan: str) -> str:
+    """Compact list of the scan nodes in a plan, e.g. 'Index Only Scan idx_x'"""
+    nodes = re.findall(r"((?:Parallel )?(?:Seq|Index Only|Index|Bitmap Heap|Bitmap Index) Scan(?: Backward)?(?: using| on)? \S+)", plan)
+    return ", ".join(OrderedDict.fromkeys(nodes)) or "-"
+
+def run_pass(client: TestClient, zone_id: int, label: str, output_dir: str) -> dict:
+    """EXPLAIN every statement of every endpoint; returns {(path, index): (ms, scans)}"""
+    results = OrderedDict()
+    with open(os.path.join(output_dir, f"{label}.txt"), "w") as report:
+        for template in ENDPOINTS:
+            path = template.format(zone_id=zone_id)
+            for i, (statement, parameters) in enumerate(capture_statements(client, path)):
+                execution_ms, plan = explain(statement, parameters)
+                results[(template, i)] = (execution_ms, scan_nodes(plan))
+                report.write(f"=== {path} [query {i}] ({execution_ms:.3f} ms)\n{statement}\n{parameters}\n\n{plan}\n\n")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE every router query before and after the index migration")
+    parser.add_argument("--rows", type=int, default=200000, help="posts and environmental readings to seed (0 to skip seeding)")
+    parser.add_argument("--days", type=int, default=7, help="time span the seeded rows are spread over")
+    parser.add_argument("--zone-id", type=int, default=None, help="zone used for the zone endpoints (default: first zone)")
+    parser.add_argument("--output", default="explain_reports", help="directory for the full before/after plans")
+    args = parser.parse_args()
+    
+    create_tables()
+    if args.rows > 0:
+        print(f"Seeding {args.rows} posts and environmental readings over {args.days} days...")
+        seed_dataset(args.rows, args.days)
+        # Set the visibility map so index-only scans are possible, as they
+        # would be on a table autovacuum has already visited
+        run_autocommit("VACUUM ANALYZE social_posts, emotion_analysis, environmental_data")
+    
+    with engine.connect() as conn:
+        zone_id = args.zone_id or conn.execute(text("SELECT MIN(id) FROM city_zones")).scalar()
+    
+    os.makedirs(args.output, exist_ok=True)
+    # One client session keeps one event loop, which the pooled async connections belong to
+    with TestClient(build_app()) as client:
+        print("Capturing plans with the original index set...")
+        apply_migration("004_keyset_indexes_down.sql")
+        apply_migration("002_query_indexes_down.sql")
+        before = run_pass(client, zone_id, "before", args.output)
+        
+        print("Capturing plans with the tuned index set...")
+        apply_migration("002_query_indexes.sql")
+        apply_migration("004_keyset_indexes.sql")
+        after = run_pass(client, zone_id, "after", args.output)
+    
+    print(f"\n{'endpoint':<38} {'q':>2} {'before ms':>10} {'after ms':>10}  scans (after)")
+    for key, (before_ms, _) in before.items():
+        after_ms, after_scans = after.get(key, (float('nan'), '-'))
+        template, i = key
+        print(f"{template:<38} {i:>2} {before_ms:>10.3f} {after_ms:>10.3f}  {after_scans}")
+    
+    print(f"\nTotal: {sum(ms for ms, _ in before.values()):.1f} ms before, {sum(ms for ms, _ in after.values()):.1f} ms after")
+    print(f"Full plans written to {args.output}/before.txt and {args.output}/after.txt")
+
+if __name__ == "__main__":
+    main()
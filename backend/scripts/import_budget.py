@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Startup import budget for City Pulse application
+Imports the API (or another module) in fresh interpreters under
+``python -X importtime`` and reports where startup time goes: the total,
+the self time per top-level package and the slowest modules by cumulative
+time. Fails if any deferred heavy module (pandas, scikit-learn, torch,
+transformers) is imported at startup, or if the total is over --budget-ms.
+With --serve it also starts uvicorn and times how long until the API
+answers and until the background warm-up finishes.
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import subprocess
+import statistics
+import urllib.request
+from collections import defaultdict
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.warm_up import DEFERRED_MODULES
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def import_times(module: str) -> dict:
+    """Self and cumulative import time in ms per module, from one fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us) / 1000, int(cumulative_us) / 1000)
+    return times
+
+def report_imports(module: str, runs: int, top: int) -> tuple:
+    """Print the median startup budget over ``runs``; returns (total ms, deferred modules imported)"""
+    samples = [import_times(module) for _ in range(runs)]
+    modules = set().union(*samples)
+    self_ms = {name: statistics.median(s[name][0] for s in samples if name in s) for name in modules}
+    cumulative_ms = {name: statistics.median(s[name][1] for s in samples if name in s) for name in modules}
+    total = cumulative_ms[module]
+    
+    packages = defaultdict(float)
+    for name, ms in self_ms.items():
+        packages[name.split('.')[0]] += ms
+    
+    print(f"import {module}: {total:.0f} ms (median of {runs}, {len(modules)} modules)")
+    print(f"\n{'package':<32} {'self ms':>9} {'share':>7}")
+    for package, ms in sorted(packages.items(), key=lambda p: -p[1])[:top]:
+        print(f"{package:<32} {ms:>9.1f} {ms / total:>7.1%}")
+    
+    print(f"\n{'module':<48} {'cumulative ms':>14}")
+    for name, ms in sorted(cumulative_ms.items(), key=lambda m: -m[1])[:top]:
+        print(f"{name[:48]:<48} {ms:>14.1f}")
+    
+    deferred = sorted(name for name in modules if name.split('.')[0] in DEFERRED_MODULES)
+    return total, deferred
+
+def get_json(url: str):
+    with urllib.request.urlopen(url, timeout=2) as response:
+        return json.loads(response.read())
+
+def report_serving(port: int, timeout: float):
+    """Start uvicorn and time until the API answers and until warm-up is done"""
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'api.main:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=BACKEND_DIR
+    )
+    base = f"http://127.0.0.1:{port}"
+    serving = warm = None
+    try:
+        while time.perf_counter() - started < timeout and warm is None:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {server.returncode}")
+            try:
+                if serving is None:
+                    get_json(f"{base}/")
+                    serving = time.perf_counter() - started
+                status = get_json(f"{base}/health").get('warm_up', {})
+                if status.get('state') in ('done', 'disabled'):
+                    warm = time.perf_counter() - started
+            except OSError:
+                pass
+            time.sleep(0.05)
+    finally:
+        server.terminate()
+        server.wait()
+    
+    print(f"\nserving after {serving:.2f}s" if serving is not None else f"\nnot serving after {timeout:.0f}s")
+    if warm is not None:
+        print(f"warm-up done after {warm:.2f}s: {status.get('seconds')}")
+        if status.get('errors'):
+            print(f"warm-up errors: {status['errors']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the API's startup import budget")
+    parser.add_argument("--module", default="api.main", help="module to import")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to take the median over")
+    parser.add_argument("--top", type=int, default=15, help="rows per table")
+    parser.add_argument("--budget-ms", type=float, help="fail if the total import time is over this")
+    parser.add_argument("--serve", action="store_true", help="also time uvicorn until serving and warm")
+    parser.add_argument("--port", type=int, default=8765, help="port for --serve")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for --serve")
+    args = parser.parse_args()
+    
+    total, deferred = report_imports(args.module, args.runs, args.top)
+    if args.serve:
+        report_serving(args.port, args.timeout)
+    
+    failed = False
+    if deferred:
+        print(f"\nFAIL: deferred modules imported at startup: {', '.join(deferred[:10])}")
+        failed = True
+    if args.budget_ms is not None and total > args.budget_ms:
+        print(f"\nFAIL: {total:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    if not failed:
+        print("\nOK")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
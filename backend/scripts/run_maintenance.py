@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Data lifecycle maintenance script for City Pulse application
+Applies compression policies, runs rollups and retention once and
+prints the space reclaimed per table
+"""
+
+import sys
+import os
+import json
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.data_lifecycle import data_lifecycle
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def format_bytes(num_bytes: int) -> str:
+    """Human readable byte count"""
+    sign = '-' if num_bytes < 0 else ''
+    value = float(abs(num_bytes))
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if value < 1024:
+            return f"{sign}{value:.1f} {unit}"
+        value /= 1024
+    return f"{sign}{value:.1f} TB"
+
+def main():
+    """Main maintenance function"""
+    logger.info("Applying data lifecycle policies...")
+    data_lifecycle.apply_policies()
+    
+    logger.info("Running data lifecycle maintenance...")
+    report = data_lifecycle.run_maintenance()
+    
+    print(f"{'table':<28} {'before':>12} {'after':>12} {'reclaimed':>12}")
+    for table, reclaimed in report['reclaimed_bytes'].items():
+        print(
+            f"{table:<28} {format_bytes(report['size_before_bytes'][table]):>12} "
+            f"{format_bytes(report['size_after_bytes'][table]):>12} {format_bytes(reclaimed):>12}"
+        )
+    print(f"Total reclaimed: {format_bytes(report['total_reclaimed_bytes'])}")
+    print(json.dumps({k: report[k] for k in ('rolled_up_rows', 'expired', 'post_contents_expired')}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Trace collector for City Pulse application
+A local stand-in for an OTLP/HTTP collector plus a span summary.
+  
+  serve    accept OTLP/JSON exports on POST /v1/traces (TRACE_EXPORTER=otlp)
+           and append them to a file
+  summary  read a span file (from TRACE_EXPORTER=file or from serve) and
+           report duration percentiles per span name, and where ingested
+           posts spend their time before they become visible
+"""
+
+import sys
+import os
+import json
+import argparse
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Stage offsets recorded on each ingest.post span, in pipeline order
+POST_STAGES = ['ingest.analyzed_ms', 'ingest.flushed_ms', 'ingest.visible_ms']
+
+def serve(port: int, output: str):
+    """Append every OTLP/JSON export request to ``output``, one per line"""
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != '/v1/traces':
+                self.send_error(404)
+                return
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            spans = sum(len(scope['spans']) for resource in payload.get('resourceSpans', []) for scope in resource.get('scopeSpans', []))
+            with open(output, 'a') as f:
+                f.write(json.dumps(payload) + '\n')
+            print(f"Received {spans} spans")
+            
+            body = b'{}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    print(f"Collecting spans on http://127.0.0.1:{port}/v1/traces into {output}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+def attribute(value: dict):
+    """Python value of an OTLP AnyValue"""
+    if 'intValue' in value:
+        return int(value['intValue'])
+    for key in ('doubleValue', 'boolValue', 'stringValue'):
+        if key in value:
+            return value[key]
+    return None
+
+def load_spans(path: str):
+    with open(path) as f:
+        for line in f:
+            for resource in json.loads(line).get('resourceSpans', []):
+                for scope in resource.get('scopeSpans', []):
+                    for span in scope['spans']:
+                        span['attributes'] = {a['key']: attribute(a['value']) for a in span.get('attributes', [])}
+                        span['duration_ms'] = (int(span['endTimeUnixNano']) - int(span['startTimeUnixNano'])) / 1e6
+                        yield span
+
+def percentiles(values) -> str:
+    values = np.array(values)
+    return f"{len(values):>7} {np.percentile(values, 50):>10.1f} {np.percentile(values, 95):>10.1f} {values.max():>10.1f}"
+
+def summary(path: str):
+    """Print duration percentiles per span name and the ingest-to-visible breakdown"""
+    durations = defaultdict(list)
+    errors = defaultdict(int)
+    stages = defaultdict(list)
+    for span in load_spans(path):
+        durations[span['name']].append(span['duration_ms'])
+        if span.get('status', {}).get('code') == 2:
+            errors[span['name']] += 1
+        if span['name'] == 'ingest.post':
+            for stage in POST_STAGES:
+                if stage in span['attributes']:
+                    stages[stage].append(span['attributes'][stage])
+    
+    if not durations:
+        print(f"No spans in {path}")
+        return
+    
+    print(f"{'span':<40} {'count':>7} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10} {'errors':>7}")
+    for name in sorted(durations, key=lambda n: -sum(durations[n])):
+        print(f"{name[:40]:<40} {percentiles(durations[name])} {errors[name]:>7}")
+    
+    if stages:
+        print("\nIngested posts, time since collection when each stage finished:")
+        print(f"{'stage':<40} {'count':>7} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+        for stage in POST_STAGES:
+            if stages[stage]:
+                print(f"{stage:<40} {percentiles(stages[stage])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect OTLP/JSON spans locally and summarize span files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    serve_parser = commands.add_parser("serve", help="accept OTLP/JSON exports over HTTP")
+    serve_parser.add_argument("--port", type=int, default=4318, help="port to listen on")
+    serve_parser.add_argument("--output", default="traces/collected.jsonl", help="file the exports are appended to")
+    
+    summary_parser = commands.add_parser("summary", help="summarize a span file")
+    summary_parser.add_argument("path", nargs="?", default=os.getenv("TRACE_FILE", "traces/spans.jsonl"), help="span file")
+    
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args.port, args.output)
+    else:
+        summary(args.path)
+
+if __name__ == "__main__":
+    main()
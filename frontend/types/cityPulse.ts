@@ -37,6 +37,15 @@ export interface SocialPost {
   }
 }
 
+export interface PostsPage {
+  posts: SocialPost[]
+  count: number
+  next_cursor: string | null
+  prev_cursor: string | null
+  has_more: boolean
+  timestamp: string
+}
+
 export interface ZoneDetailsData {
   zone: {
     id: number
@@ -100,15 +109,20 @@ export interface ZoneForecast {
 }
 
 export interface Anomaly {
+  id: number
   zone_id: number
   zone_name: string
   timestamp: string
+  first_seen: string
   mood_index?: number
-  average_value?: number
+  value?: number
   data_type?: string
   data_points: number
   anomaly_type: string
   severity: 'low' | 'medium' | 'high'
+  score: number | null
+  baseline_mean: number | null
+  baseline_std: number | null
 }
 
 export interface AnomalyData {
@@ -134,3 +148,25 @@ export interface AlertsSummary {
   period_hours: number
   timestamp: string
 }
+
+export interface EnvironmentalOverview {
+  environmental_data: {
+    [dataType: string]: {
+      average_value: number
+      count: number
+      last_updated: string
+    }
+  }
+  timestamp: string
+}
+
+export type DashboardSection = 'now' | 'posts' | 'environment' | 'alerts'
+
+export interface DashboardBundle {
+  sections: DashboardSection[]
+  now?: CityPulseData
+  posts?: PostsPage
+  environment?: EnvironmentalOverview
+  alerts?: AlertsSummary
+  timestamp: string
+}
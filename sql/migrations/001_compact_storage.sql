@@ -0,0 +1,71 @@
+-- Compact storage for emotion scores and environmental values
+--
+-- Converts the NUMERIC measurement columns to 4-byte REAL. Run together with
+-- COMPACT_STORAGE=true for the backend so the ORM issues matching DDL.
+--
+--   docker-compose exec -T postgres psql -U city_pulse_user -d city_pulse < sql/migrations/001_compact_storage.sql
+--
+-- REAL keeps ~7 significant digits, which covers the 4-decimal emotion
+-- scores, the 2-decimal mood index and every environmental reading we
+-- collect. TimescaleDB rejects column type changes while compression is
+-- enabled, so the compression policy is removed, compressed chunks are
+-- decompressed and compression is switched off first. Both are restored
+-- afterwards, and the policy recompresses the chunks on its next run.
+
+BEGIN;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'timescaledb') THEN
+        -- Remember which tables compress and their policy's compress_after
+        CREATE TEMP TABLE compact_storage_compression ON COMMIT DROP AS
+        SELECT h.hypertable_name::TEXT AS table_name, j.config->>'compress_after' AS compress_after
+        FROM timescaledb_information.hypertables h
+        LEFT JOIN timescaledb_information.jobs j
+            ON j.hypertable_name = h.hypertable_name AND j.proc_name = 'policy_compression'
+        WHERE h.hypertable_name IN ('emotion_analysis', 'environmental_data') AND h.compression_enabled;
+        
+        FOR t IN SELECT table_name FROM compact_storage_compression LOOP
+            PERFORM remove_compression_policy(t::REGCLASS, if_exists => TRUE);
+            PERFORM decompress_chunk(c, if_compressed => TRUE) FROM show_chunks(t::REGCLASS) c;
+            EXECUTE format('ALTER TABLE %I SET (timescaledb.compress = false)', t);
+        END LOOP;
+    END IF;
+END $$;
+
+ALTER TABLE emotion_analysis
+    ALTER COLUMN joy TYPE REAL USING joy::REAL,
+    ALTER COLUMN sadness TYPE REAL USING sadness::REAL,
+    ALTER COLUMN anger TYPE REAL USING anger::REAL,
+    ALTER COLUMN fear TYPE REAL USING fear::REAL,
+    ALTER COLUMN surprise TYPE REAL USING surprise::REAL,
+    ALTER COLUMN disgust TYPE REAL USING disgust::REAL,
+    ALTER COLUMN neutral TYPE REAL USING neutral::REAL,
+    ALTER COLUMN mood_index TYPE REAL USING mood_index::REAL;
+
+ALTER TABLE environmental_data
+    ALTER COLUMN value TYPE REAL USING value::REAL;
+
+
+DO $$
+DECLARE
+    r RECORD;
+BEGIN
+    IF to_regclass('pg_temp.compact_storage_compression') IS NOT NULL THEN
+        -- Same settings as DataLifecycleManager.COMPRESSED_TABLES
+        FOR r IN SELECT * FROM compact_storage_compression LOOP
+            EXECUTE format(
+                'ALTER TABLE %I SET (timescaledb.compress, timescaledb.compress_segmentby = %L, timescaledb.compress_orderby = %L)',
+                r.table_name,
+                CASE r.table_name WHEN 'environmental_data' THEN 'zone_id, data_type' ELSE 'zone_id' END,
+                'created_at DESC'
+            );
+            IF r.compress_after IS NOT NULL THEN
+                PERFORM add_compression_policy(r.table_name::REGCLASS, r.compress_after::INTERVAL);
+            END IF;
+        END LOOP;
+    END IF;
+END $$;
+COMMIT;
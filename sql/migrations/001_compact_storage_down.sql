@@ -0,0 +1,61 @@
+-- Revert 001_compact_storage.sql back to the NUMERIC layout
+-- Run together with COMPACT_STORAGE=false (the default).
+-- Compression is switched off around the type change as in 001_compact_storage.sql.
+
+BEGIN;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'timescaledb') THEN
+        -- Remember which tables compress and their policy's compress_after
+        CREATE TEMP TABLE compact_storage_compression ON COMMIT DROP AS
+        SELECT h.hypertable_name::TEXT AS table_name, j.config->>'compress_after' AS compress_after
+        FROM timescaledb_information.hypertables h
+        LEFT JOIN timescaledb_information.jobs j
+            ON j.hypertable_name = h.hypertable_name AND j.proc_name = 'policy_compression'
+        WHERE h.hypertable_name IN ('emotion_analysis', 'environmental_data') AND h.compression_enabled;
+        
+        FOR t IN SELECT table_name FROM compact_storage_compression LOOP
+            PERFORM remove_compression_policy(t::REGCLASS, if_exists => TRUE);
+            PERFORM decompress_chunk(c, if_compressed => TRUE) FROM show_chunks(t::REGCLASS) c;
+            EXECUTE format('ALTER TABLE %I SET (timescaledb.compress = false)', t);
+        END LOOP;
+    END IF;
+END $$;
+
+ALTER TABLE emotion_analysis
+    ALTER COLUMN joy TYPE DECIMAL(5,4) USING round(joy::NUMERIC, 4),
+    ALTER COLUMN sadness TYPE DECIMAL(5,4) USING round(sadness::NUMERIC, 4),
+    ALTER COLUMN anger TYPE DECIMAL(5,4) USING round(anger::NUMERIC, 4),
+    ALTER COLUMN fear TYPE DECIMAL(5,4) USING round(fear::NUMERIC, 4),
+    ALTER COLUMN surprise TYPE DECIMAL(5,4) USING round(surprise::NUMERIC, 4),
+    ALTER COLUMN disgust TYPE DECIMAL(5,4) USING round(disgust::NUMERIC, 4),
+    ALTER COLUMN neutral TYPE DECIMAL(5,4) USING round(neutral::NUMERIC, 4),
+    ALTER COLUMN mood_index TYPE DECIMAL(5,2) USING round(mood_index::NUMERIC, 2);
+
+ALTER TABLE environmental_data
+    ALTER COLUMN value TYPE DECIMAL(10,4) USING round(value::NUMERIC, 4);
+
+
+DO $$
+DECLARE
+    r RECORD;
+BEGIN
+    IF to_regclass('pg_temp.compact_storage_compression') IS NOT NULL THEN
+        -- Same settings as DataLifecycleManager.COMPRESSED_TABLES
+        FOR r IN SELECT * FROM compact_storage_compression LOOP
+            EXECUTE format(
+                'ALTER TABLE %I SET (timescaledb.compress, timescaledb.compress_segmentby = %L, timescaledb.compress_orderby = %L)',
+                r.table_name,
+                CASE r.table_name WHEN 'environmental_data' THEN 'zone_id, data_type' ELSE 'zone_id' END,
+                'created_at DESC'
+            );
+            IF r.compress_after IS NOT NULL THEN
+                PERFORM add_compression_policy(r.table_name::REGCLASS, r.compress_after::INTERVAL);
+            END IF;
+        END LOOP;
+    END IF;
+END $$;
+COMMIT;
@@ -0,0 +1,35 @@
+-- Composite and covering indexes for the API query patterns
+--
+-- Every hot query filters on zone_id plus a created_at range, or on a
+-- created_at range alone. The single-column zone_id indexes are replaced by
+-- (zone_id, created_at DESC) composites whose prefix serves the same
+-- lookups, and INCLUDE columns let the aggregates run as index-only scans.
+-- Dropped outright: btrees on WKT text (social_posts.location,
+-- city_zones.geometry), which no query filters on, plus the
+-- emotion_analysis.mood_index and environmental_data.data_type indexes,
+-- which are never used as predicates.
+--
+-- Compare plans before/after with: python scripts/explain_queries.py
+
+BEGIN;
+
+DROP INDEX IF EXISTS idx_city_zones_geometry;
+DROP INDEX IF EXISTS idx_social_posts_location;
+
+DROP INDEX IF EXISTS idx_emotion_analysis_zone_id;
+DROP INDEX IF EXISTS idx_emotion_analysis_created_at;
+DROP INDEX IF EXISTS idx_emotion_analysis_mood_index;
+CREATE INDEX IF NOT EXISTS idx_emotion_analysis_zone_created ON emotion_analysis(zone_id, created_at DESC) INCLUDE (mood_index, dominant_emotion);
+CREATE INDEX IF NOT EXISTS idx_emotion_analysis_created_covering ON emotion_analysis(created_at) INCLUDE (zone_id, mood_index);
+CREATE INDEX IF NOT EXISTS idx_emotion_analysis_post_id ON emotion_analysis(post_id);
+
+DROP INDEX IF EXISTS idx_environmental_data_zone_id;
+DROP INDEX IF EXISTS idx_environmental_data_created_at;
+DROP INDEX IF EXISTS idx_environmental_data_type;
+CREATE INDEX IF NOT EXISTS idx_environmental_data_zone_created ON environmental_data(zone_id, created_at DESC) INCLUDE (data_type, value, unit);
+CREATE INDEX IF NOT EXISTS idx_environmental_data_created_covering ON environmental_data(created_at) INCLUDE (zone_id, data_type, value);
+
+COMMIT;
+
+ANALYZE emotion_analysis;
+ANALYZE environmental_data;
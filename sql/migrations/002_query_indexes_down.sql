@@ -0,0 +1,24 @@
+-- Revert 002_query_indexes.sql back to the original single-column index set
+
+BEGIN;
+
+DROP INDEX IF EXISTS idx_emotion_analysis_zone_created;
+DROP INDEX IF EXISTS idx_emotion_analysis_created_covering;
+DROP INDEX IF EXISTS idx_emotion_analysis_post_id;
+CREATE INDEX IF NOT EXISTS idx_emotion_analysis_zone_id ON emotion_analysis(zone_id);
+CREATE INDEX IF NOT EXISTS idx_emotion_analysis_created_at ON emotion_analysis(created_at);
+CREATE INDEX IF NOT EXISTS idx_emotion_analysis_mood_index ON emotion_analysis(mood_index);
+
+DROP INDEX IF EXISTS idx_environmental_data_zone_created;
+DROP INDEX IF EXISTS idx_environmental_data_created_covering;
+CREATE INDEX IF NOT EXISTS idx_environmental_data_zone_id ON environmental_data(zone_id);
+CREATE INDEX IF NOT EXISTS idx_environmental_data_created_at ON environmental_data(created_at);
+CREATE INDEX IF NOT EXISTS idx_environmental_data_type ON environmental_data(data_type);
+
+CREATE INDEX IF NOT EXISTS idx_social_posts_location ON social_posts(location);
+CREATE INDEX IF NOT EXISTS idx_city_zones_geometry ON city_zones(geometry);
+
+COMMIT;
+
+ANALYZE emotion_analysis;
+ANALYZE environmental_data;
@@ -0,0 +1,90 @@
+-- Partition social_posts by day on created_at
+--
+-- Rebuilds social_posts as a range-partitioned table with one partition per
+-- day covering the existing data, plus a default partition. The primary key
+-- becomes (id, created_at) because a partitioned table's unique keys must
+-- include the partition column. emotion_analysis therefore references
+-- (post_id, created_at); every writer stores an analysis with its post's
+-- created_at. Existing ids and the id sequence are preserved.
+--
+-- Stop the backend (collectors) while this runs. Compressed emotion_analysis
+-- chunks are decompressed so the new foreign key can be added.
+
+BEGIN;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'timescaledb') THEN
+        PERFORM decompress_chunk(c, if_compressed => TRUE)
+        FROM show_chunks('emotion_analysis') c;
+    END IF;
+END $$;
+
+ALTER TABLE emotion_analysis DROP CONSTRAINT IF EXISTS emotion_analysis_post_id_fkey;
+
+ALTER TABLE social_posts RENAME TO social_posts_legacy;
+
+CREATE TABLE social_posts (
+    id INTEGER NOT NULL DEFAULT nextval('social_posts_id_seq'),
+    zone_id INTEGER REFERENCES city_zones(id),
+    content TEXT NOT NULL,
+    source VARCHAR(50) NOT NULL,
+    lat DECIMAL(10, 8),
+    lon DECIMAL(11, 8),
+    location TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE social_posts_default PARTITION OF social_posts DEFAULT;
+
+-- One partition per day from the oldest post to a week ahead
+DO $$
+DECLARE
+    day DATE;
+    last_day DATE := (NOW() AT TIME ZONE 'UTC')::DATE + 7;
+BEGIN
+    day := COALESCE(
+        (SELECT MIN(created_at AT TIME ZONE 'UTC')::DATE FROM social_posts_legacy),
+        (NOW() AT TIME ZONE 'UTC')::DATE - 1
+    );
+    WHILE day <= last_day LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF social_posts FOR VALUES FROM (%L) TO (%L)',
+            'social_posts_p' || to_char(day, 'YYYYMMDD'),
+            day::TEXT || ' 00:00:00+00',
+            (day + 1)::TEXT || ' 00:00:00+00'
+        );
+        day := day + 1;
+    END LOOP;
+END $$;
+
+INSERT INTO social_posts (id, zone_id, content, source, lat, lon, location, created_at)
+SELECT id, zone_id, content, source, lat, lon, location, COALESCE(created_at, NOW())
+FROM social_posts_legacy;
+
+-- Keep the sequence when the legacy table (its current owner) is dropped
+ALTER SEQUENCE social_posts_id_seq OWNED BY social_posts.id;
+DROP TABLE social_posts_legacy;
+
+CREATE INDEX idx_social_posts_zone_id ON social_posts(zone_id);
+CREATE INDEX idx_social_posts_created_at ON social_posts(created_at);
+
+-- NOT VALID skips checking existing rows inside this transaction; new rows
+-- are enforced immediately
+ALTER TABLE emotion_analysis
+    ADD CONSTRAINT emotion_analysis_post_id_created_at_fkey
+    FOREIGN KEY (post_id, created_at) REFERENCES social_posts(id, created_at) NOT VALID;
+
+COMMIT;
+
+-- Validate existing rows; analyses whose created_at differs from their
+-- post's are reported and leave the constraint NOT VALID
+DO $$
+BEGIN
+    ALTER TABLE emotion_analysis VALIDATE CONSTRAINT emotion_analysis_post_id_created_at_fkey;
+EXCEPTION WHEN foreign_key_violation THEN
+    RAISE NOTICE 'emotion_analysis_post_id_created_at_fkey left NOT VALID: %', SQLERRM;
+END $$;
+
+ANALYZE social_posts;
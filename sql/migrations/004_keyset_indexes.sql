@@ -0,0 +1,18 @@
+-- Extend the emotion_analysis indexes with post_id for keyset pagination
+--
+-- /api/recent-posts and /api/zone/{id}/posts page on (created_at, post_id).
+-- With post_id in the index key, each page (including the row comparison
+-- against the cursor) is a single index range scan in the order the
+-- endpoints return, at any depth. The aggregate queries use the same
+-- indexes through their (zone_id, created_at) / created_at prefixes.
+
+BEGIN;
+
+DROP INDEX IF EXISTS idx_emotion_analysis_zone_created;
+DROP INDEX IF EXISTS idx_emotion_analysis_created_covering;
+CREATE INDEX idx_emotion_analysis_zone_created ON emotion_analysis(zone_id, created_at DESC, post_id DESC) INCLUDE (mood_index, dominant_emotion);
+CREATE INDEX idx_emotion_analysis_created_covering ON emotion_analysis(created_at, post_id) INCLUDE (zone_id, mood_index);
+
+COMMIT;
+
+ANALYZE emotion_analysis;
@@ -0,0 +1,12 @@
+-- Revert 004_keyset_indexes.sql to the 002_query_indexes.sql definitions
+
+BEGIN;
+
+DROP INDEX IF EXISTS idx_emotion_analysis_zone_created;
+DROP INDEX IF EXISTS idx_emotion_analysis_created_covering;
+CREATE INDEX idx_emotion_analysis_zone_created ON emotion_analysis(zone_id, created_at DESC) INCLUDE (mood_index, dominant_emotion);
+CREATE INDEX idx_emotion_analysis_created_covering ON emotion_analysis(created_at) INCLUDE (zone_id, mood_index);
+
+COMMIT;
+
+ANALYZE emotion_analysis;
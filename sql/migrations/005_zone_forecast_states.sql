@@ -0,0 +1,21 @@
+-- Add the per-zone state table for the online Holt-Winters forecaster
+--
+-- The forecast_precompute job folds each closed hour into one row per zone
+-- and model version, so forecasts are read from this state instead of
+-- refitting on a week of history, and the state survives restarts.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS zone_forecast_states (
+    zone_id INTEGER REFERENCES city_zones(id),
+    model_version VARCHAR(50) NOT NULL,
+    level DOUBLE PRECISION NOT NULL,
+    trend DOUBLE PRECISION NOT NULL,
+    seasonal DOUBLE PRECISION[] NOT NULL,
+    hours_seen INTEGER NOT NULL,
+    last_hour TIMESTAMP WITH TIME ZONE NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (zone_id, model_version)
+);
+
+COMMIT;
@@ -0,0 +1,3 @@
+-- Revert 005_zone_forecast_states.sql
+
+DROP TABLE IF EXISTS zone_forecast_states;
@@ -0,0 +1,45 @@
+-- Add the materialized forecast tables
+--
+-- The forecast_precompute job writes each zone's forecast into
+-- zone_forecasts/zone_forecast_points when its inputs change, and records
+-- the closed hours it has covered per model in forecast_runs. The forecast
+-- endpoints read from these tables, and the rows are kept as history for
+-- accuracy tracking.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS zone_forecasts (
+    zone_id INTEGER REFERENCES city_zones(id),
+    model_version VARCHAR(50) NOT NULL,
+    inputs_until TIMESTAMP WITH TIME ZONE NOT NULL,
+    input_hours INTEGER NOT NULL,
+    inputs_signature VARCHAR(100) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (zone_id, model_version, inputs_until)
+);
+
+CREATE TABLE IF NOT EXISTS zone_forecast_points (
+    zone_id INTEGER NOT NULL,
+    model_version VARCHAR(50) NOT NULL,
+    inputs_until TIMESTAMP WITH TIME ZONE NOT NULL,
+    horizon INTEGER NOT NULL,
+    target_hour TIMESTAMP WITH TIME ZONE NOT NULL,
+    predicted_mood_index DECIMAL(5,2) NOT NULL,
+    confidence DECIMAL(3,2) NOT NULL,
+    PRIMARY KEY (zone_id, model_version, inputs_until, horizon),
+    FOREIGN KEY (zone_id, model_version, inputs_until)
+        REFERENCES zone_forecasts(zone_id, model_version, inputs_until) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_zone_forecast_points_model_target ON zone_forecast_points(model_version, target_hour);
+
+CREATE TABLE IF NOT EXISTS forecast_runs (
+    model_version VARCHAR(50) NOT NULL,
+    inputs_until TIMESTAMP WITH TIME ZONE NOT NULL,
+    zones_forecast INTEGER NOT NULL,
+    zones_unchanged INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (model_version, inputs_until)
+);
+
+COMMIT;
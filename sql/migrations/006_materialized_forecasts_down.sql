@@ -0,0 +1,9 @@
+-- Revert 006_materialized_forecasts.sql
+
+BEGIN;
+
+DROP TABLE IF EXISTS forecast_runs;
+DROP TABLE IF EXISTS zone_forecast_points;
+DROP TABLE IF EXISTS zone_forecasts;
+
+COMMIT;
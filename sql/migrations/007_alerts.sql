@@ -0,0 +1,30 @@
+-- Add the alerts table
+--
+-- The collectors pass every committed post and reading through the
+-- streaming anomaly detector (app/services/alert_stream.py), which writes
+-- the alerts it raises here. The alerts endpoints read this table instead
+-- of recomputing anomalies over the raw data.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS alerts (
+    id BIGSERIAL PRIMARY KEY,
+    zone_id INTEGER NOT NULL REFERENCES city_zones(id),
+    metric VARCHAR(50) NOT NULL,
+    anomaly_type VARCHAR(50) NOT NULL,
+    severity VARCHAR(10) NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
+    score DOUBLE PRECISION,
+    baseline_mean DOUBLE PRECISION,
+    baseline_std DOUBLE PRECISION,
+    occurrences INTEGER NOT NULL DEFAULT 1,
+    first_seen_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    last_seen_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_alerts_last_seen ON alerts(last_seen_at DESC);
+CREATE INDEX IF NOT EXISTS idx_alerts_zone_last_seen ON alerts(zone_id, last_seen_at DESC);
+
+COMMIT;
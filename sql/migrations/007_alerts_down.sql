@@ -0,0 +1,7 @@
+-- Revert 007_alerts.sql
+
+BEGIN;
+
+DROP TABLE IF EXISTS alerts;
+
+COMMIT;
@@ -0,0 +1,22 @@
+-- Add the multivariate anomaly score table
+--
+-- The anomaly_scoring job scores every closed zone-hour with an Isolation
+-- Forest over its mood statistics and environmental means, and stores the
+-- scores here for /api/alerts/multivariate-anomalies to read.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS zone_anomaly_scores (
+    zone_id INTEGER REFERENCES city_zones(id),
+    hour TIMESTAMP WITH TIME ZONE NOT NULL,
+    score DOUBLE PRECISION NOT NULL,
+    is_anomaly BOOLEAN NOT NULL,
+    features JSONB NOT NULL,
+    model_version VARCHAR(50) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (zone_id, hour)
+);
+
+CREATE INDEX IF NOT EXISTS idx_zone_anomaly_scores_hour ON zone_anomaly_scores(hour DESC);
+
+COMMIT;
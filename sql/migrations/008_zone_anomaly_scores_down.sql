@@ -0,0 +1,7 @@
+-- Revert 008_zone_anomaly_scores.sql
+
+BEGIN;
+
+DROP TABLE IF EXISTS zone_anomaly_scores;
+
+COMMIT;
@@ -14,30 +14,32 @@ CREATE TABLE city_zones (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
--- Create index on zones (no spatial index without PostGIS)
-CREATE INDEX idx_city_zones_geometry ON city_zones (geometry);
-
 -- Social media posts table
+-- Range-partitioned by day; the daily partitions are created ahead of time
+-- and dropped after retention by app/services/data_lifecycle.py
 CREATE TABLE social_posts (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     zone_id INTEGER REFERENCES city_zones(id),
     content TEXT NOT NULL,
     source VARCHAR(50) NOT NULL,
     lat DECIMAL(10, 8),
     lon DECIMAL(11, 8),
     location TEXT, -- Store as WKT text instead of PostGIS geometry
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-);
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
 
--- Create index on posts (no spatial index without PostGIS)
-CREATE INDEX idx_social_posts_location ON social_posts (location);
+-- Catches rows outside every daily partition so inserts never fail
+CREATE TABLE social_posts_default PARTITION OF social_posts DEFAULT;
+
+-- Create indexes on posts (no spatial index without PostGIS)
 CREATE INDEX idx_social_posts_zone_id ON social_posts(zone_id);
 CREATE INDEX idx_social_posts_created_at ON social_posts(created_at);
 
 -- Emotion analysis results table
 CREATE TABLE emotion_analysis (
     id SERIAL PRIMARY KEY,
-    post_id INTEGER REFERENCES social_posts(id),
+    post_id INTEGER,
     zone_id INTEGER REFERENCES city_zones(id),
     joy DECIMAL(5,4) NOT NULL,
     sadness DECIMAL(5,4) NOT NULL,
@@ -48,13 +50,16 @@ CREATE TABLE emotion_analysis (
     neutral DECIMAL(5,4) NOT NULL,
     dominant_emotion VARCHAR(20) NOT NULL,
     mood_index DECIMAL(5,2) NOT NULL,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    -- An analysis shares its post's created_at, completing the partitioned key
+    FOREIGN KEY (post_id, created_at) REFERENCES social_posts(id, created_at)
 );
 
 -- Create indexes on emotion analysis
-CREATE INDEX idx_emotion_analysis_zone_id ON emotion_analysis(zone_id);
-CREATE INDEX idx_emotion_analysis_created_at ON emotion_analysis(created_at);
-CREATE INDEX idx_emotion_analysis_mood_index ON emotion_analysis(mood_index);
+-- Covering indexes for the zone + time-window and time-window-only queries
+CREATE INDEX idx_emotion_analysis_zone_created ON emotion_analysis(zone_id, created_at DESC, post_id DESC) INCLUDE (mood_index, dominant_emotion);
+CREATE INDEX idx_emotion_analysis_created_covering ON emotion_analysis(created_at, post_id) INCLUDE (zone_id, mood_index);
+CREATE INDEX idx_emotion_analysis_post_id ON emotion_analysis(post_id);
 
 -- Environmental data table
 CREATE TABLE environmental_data (
@@ -71,9 +76,9 @@ CREATE TABLE environmental_data (
 );
 
 -- Create indexes on environmental data
-CREATE INDEX idx_environmental_data_zone_id ON environmental_data(zone_id);
-CREATE INDEX idx_environmental_data_created_at ON environmental_data(created_at);
-CREATE INDEX idx_environmental_data_type ON environmental_data(data_type);
+-- Covering indexes for the zone + time-window and time-window-only queries
+CREATE INDEX idx_environmental_data_zone_created ON environmental_data(zone_id, created_at DESC) INCLUDE (data_type, value, unit);
+CREATE INDEX idx_environmental_data_created_covering ON environmental_data(created_at) INCLUDE (zone_id, data_type, value);
 
 -- Zone mood aggregations table (for caching)
 CREATE TABLE zone_mood_aggregations (
@@ -100,9 +105,113 @@ CREATE INDEX idx_zone_mood_aggregations_zone_id ON zone_mood_aggregations(zone_i
 CREATE INDEX idx_zone_mood_aggregations_period ON zone_mood_aggregations(aggregation_period);
 CREATE INDEX idx_zone_mood_aggregations_period_start ON zone_mood_aggregations(period_start);
 
+-- Environmental aggregations table (hourly rollups kept after raw rows expire)
+CREATE TABLE environmental_aggregations (
+    id SERIAL PRIMARY KEY,
+    zone_id INTEGER REFERENCES city_zones(id),
+    data_type VARCHAR(50) NOT NULL,
+    value_avg DECIMAL(10,4) NOT NULL,
+    value_min DECIMAL(10,4) NOT NULL,
+    value_max DECIMAL(10,4) NOT NULL,
+    sample_count INTEGER NOT NULL,
+    aggregation_period VARCHAR(20) NOT NULL, -- 'hourly'
+    period_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    period_end TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Create indexes on environmental aggregations
+CREATE INDEX idx_environmental_aggregations_zone_id ON environmental_aggregations(zone_id);
+CREATE INDEX idx_environmental_aggregations_period_start ON environmental_aggregations(period_start);
+
+-- Per-zone state of the online forecasting model (app/ml/online_forecasting.py)
+CREATE TABLE zone_forecast_states (
+    zone_id INTEGER REFERENCES city_zones(id),
+    model_version VARCHAR(50) NOT NULL,
+    level DOUBLE PRECISION NOT NULL,
+    trend DOUBLE PRECISION NOT NULL,
+    seasonal DOUBLE PRECISION[] NOT NULL, -- one term per hour of the day (UTC)
+    hours_seen INTEGER NOT NULL,
+    last_hour TIMESTAMP WITH TIME ZONE NOT NULL, -- start of the last hour folded in
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (zone_id, model_version)
+);
+
+-- Materialized forecasts, kept as history for accuracy tracking
+CREATE TABLE zone_forecasts (
+    zone_id INTEGER REFERENCES city_zones(id),
+    model_version VARCHAR(50) NOT NULL,
+    inputs_until TIMESTAMP WITH TIME ZONE NOT NULL, -- end of the closed hours it was made from
+    input_hours INTEGER NOT NULL,
+    inputs_signature VARCHAR(100) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (zone_id, model_version, inputs_until)
+);
+
+CREATE TABLE zone_forecast_points (
+    zone_id INTEGER NOT NULL,
+    model_version VARCHAR(50) NOT NULL,
+    inputs_until TIMESTAMP WITH TIME ZONE NOT NULL,
+    horizon INTEGER NOT NULL, -- hours after the zone's last input hour
+    target_hour TIMESTAMP WITH TIME ZONE NOT NULL,
+    predicted_mood_index DECIMAL(5,2) NOT NULL,
+    confidence DECIMAL(3,2) NOT NULL,
+    PRIMARY KEY (zone_id, model_version, inputs_until, horizon),
+    FOREIGN KEY (zone_id, model_version, inputs_until)
+        REFERENCES zone_forecasts(zone_id, model_version, inputs_until) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_zone_forecast_points_model_target ON zone_forecast_points(model_version, target_hour);
+
+CREATE TABLE forecast_runs (
+    model_version VARCHAR(50) NOT NULL,
+    inputs_until TIMESTAMP WITH TIME ZONE NOT NULL,
+    zones_forecast INTEGER NOT NULL,
+    zones_unchanged INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (model_version, inputs_until)
+);
+
+-- Alerts raised by the streaming anomaly detector (app/services/alert_stream.py)
+CREATE TABLE alerts (
+    id BIGSERIAL PRIMARY KEY,
+    zone_id INTEGER NOT NULL REFERENCES city_zones(id),
+    metric VARCHAR(50) NOT NULL, -- 'mood_index' or an environmental data type
+    anomaly_type VARCHAR(50) NOT NULL,
+    severity VARCHAR(10) NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
+    score DOUBLE PRECISION,
+    baseline_mean DOUBLE PRECISION,
+    baseline_std DOUBLE PRECISION,
+    occurrences INTEGER NOT NULL DEFAULT 1,
+    first_seen_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    last_seen_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX idx_alerts_last_seen ON alerts(last_seen_at DESC);
+CREATE INDEX idx_alerts_zone_last_seen ON alerts(zone_id, last_seen_at DESC);
+
+-- Multivariate anomaly scores per closed zone-hour (app/services/anomaly_scoring.py)
+CREATE TABLE zone_anomaly_scores (
+    zone_id INTEGER REFERENCES city_zones(id),
+    hour TIMESTAMP WITH TIME ZONE NOT NULL, -- start of the hour scored
+    score DOUBLE PRECISION NOT NULL, -- higher is more anomalous
+    is_anomaly BOOLEAN NOT NULL,
+    features JSONB NOT NULL,
+    model_version VARCHAR(50) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (zone_id, hour)
+);
+
+CREATE INDEX idx_zone_anomaly_scores_hour ON zone_anomaly_scores(hour DESC);
+
 -- Convert to TimescaleDB hypertables (simplified approach)
-SELECT create_hypertable('emotion_analysis', 'created_at', if_not_exists => TRUE);
-SELECT create_hypertable('environmental_data', 'created_at', if_not_exists => TRUE);
+-- Daily chunks keep the last-hour dashboard queries on a single recent chunk;
+-- compression and retention are applied by app/services/data_lifecycle.py
+SELECT create_hypertable('emotion_analysis', 'created_at', chunk_time_interval => INTERVAL '1 day', if_not_exists => TRUE);
+SELECT create_hypertable('environmental_data', 'created_at', chunk_time_interval => INTERVAL '1 day', if_not_exists => TRUE);
 SELECT create_hypertable('zone_mood_aggregations', 'created_at', if_not_exists => TRUE);
 
 -- Insert sample city zones (New York City boroughs as example)